@@ -0,0 +1,77 @@
+"""
+feature_store의 rolling mean deviation(CCI) 계산 벤치마크
+
+    python -m benchmarks.bench_feature_store --n-markets 400 --n-days 730
+
+기존 `.rolling().apply(lambda ...)` 방식과 `rolling_mean_abs_deviation` 커널을
+market별 loop / 전체 패널 기준으로 비교한다.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv_panel
+from src.feature_store import FeatureStoreByPanel, rolling_mean_abs_deviation
+
+
+def _lambda_mad(tp: pd.Series, window: int) -> pd.Series:
+    return tp.rolling(window=window).apply(lambda x: abs(x - x.mean()).mean(), raw=True)
+
+
+def _timeit(func, repeat: int) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        strt_time = time.perf_counter()
+        func()
+        elapsed += [time.perf_counter() - strt_time]
+    return min(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CCI mean deviation 벤치마크")
+    parser.add_argument("--n-markets", type=int, default=400)
+    parser.add_argument("--n-days", type=int, default=730)
+    parser.add_argument("--window", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = make_ohlcv_panel(n_markets=args.n_markets, n_days=args.n_days)
+    raw["TP"] = (raw["high"] + raw["low"] + raw["close"]) / 3
+    tp_by_market = [_df["TP"] for _, _df in raw.groupby(by=["market"])]
+    panel = FeatureStoreByPanel(raw, "reg_date")
+    tp_panel = panel.to_panel("TP")
+
+    # 결과 검증: 두 방식이 같은 값을 내는지 먼저 확인
+    expected = np.concatenate([_lambda_mad(tp, args.window) for tp in tp_by_market])
+    actual = panel.from_panel(rolling_mean_abs_deviation(tp_panel, args.window))
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, equal_nan=True)
+
+    results = {
+        "lambda (market loop)": _timeit(
+            lambda: [_lambda_mad(tp, args.window) for tp in tp_by_market], 1
+        ),
+        "kernel (market loop)": _timeit(
+            lambda: [
+                rolling_mean_abs_deviation(tp.to_numpy(), args.window)
+                for tp in tp_by_market
+            ],
+            args.repeat,
+        ),
+        "kernel (panel)": _timeit(
+            lambda: rolling_mean_abs_deviation(tp_panel, args.window), args.repeat
+        ),
+    }
+    baseline = results["lambda (market loop)"]
+    print(
+        f"markets={args.n_markets}, days={args.n_days}, window={args.window}, "
+        f"rows={len(raw)}"
+    )
+    for name, elapsed in results.items():
+        print(f"{name:<22} {elapsed * 1000:>10.1f} ms  (x{baseline / elapsed:,.1f})")
+
+
+if __name__ == "__main__":
+    main()
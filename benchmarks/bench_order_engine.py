@@ -0,0 +1,107 @@
+"""
+주문 실행 경로(BithumbClient → OrderExecutionEngine) 처리량 벤치마크
+
+    python -m benchmarks.bench_order_engine --n-orders 200 --latency-ms 30
+
+로컬 거래소 시뮬레이터(src/exchange_sim.py)를 같은 프로세스에 띄우고
+1) 시장가 매수 주문 일괄 제출(submit_orders)과 2) 매도→매수 리밸런싱(rebalance)의
+처리량과 endpoint별 latency를 측정한다. 실제 거래소는 호출하지 않는다.
+"""
+
+import argparse
+import logging
+import time
+
+from benchmarks.synthetic import make_ohlcv_panel
+from src.bithumb import BithumbClient
+from src.connection.http import get_http_transport
+from src.exchange_sim import SimulatedExchange, start_simulator
+from src.metrics import get_metrics_registry
+from src.order_engine import OrderExecutionEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="주문 실행 경로 처리량 벤치마크 (로컬 거래소 시뮬레이터)"
+    )
+    parser.add_argument("--n-markets", type=int, default=200)
+    parser.add_argument("--n-orders", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--fill-delay", type=float, default=0.2)
+    args = parser.parse_args()
+    # 주문마다 남는 log_method_call 로그는 끈다.
+    logging.getLogger("src.config.helper").setLevel(logging.WARNING)
+
+    raw = make_ohlcv_panel(n_markets=args.n_markets, n_days=30)
+    markets = sorted(raw["market"].unique())
+    last = raw.loc[raw["reg_date"] == raw["reg_date"].max()].set_index("market")
+    markets = [x for x in markets if x in last.index]
+    n_sell = len(markets) // 2
+    sells = [
+        (market, 20_000 / last.loc[market, "close"]) for market in markets[:n_sell]
+    ]
+    buys = markets[n_sell:]
+
+    exchange = SimulatedExchange(
+        raw,
+        balances={"KRW": 1e12, **{m.split("-")[-1]: v for m, v in sells}},
+        fill_delay=args.fill_delay,
+    )
+    server = start_simulator(
+        exchange, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms
+    )
+    get_http_transport().mount(server.url, pool_size=args.workers)
+
+    client = BithumbClient(base_url=server.url, max_workers=args.workers, journal=False)
+    client.bithumb_key = client.bithumb_key or "sim"
+    client.bithumb_secret = client.bithumb_secret or "sim"
+    engine = OrderExecutionEngine(client, max_workers=args.workers, poll_interval=0.05)
+
+    # 1) 시장가 매수 일괄 제출 + 체결 확인
+    orders = [
+        dict(type="buy", market=buys[i % len(buys)], price=10_000, ord_type="price")
+        for i in range(args.n_orders)
+    ]
+    strt_time = time.perf_counter()
+    results = engine.submit_orders(orders)
+    submit_elapsed = time.perf_counter() - strt_time
+    settled = engine.wait_settled([x["uuid"] for x in results if x])
+    settle_elapsed = time.perf_counter() - strt_time
+    # 결과 검증: 모든 주문이 제출·체결되어야 한다.
+    assert all(results), "제출 실패한 주문이 있습니다."
+    assert len(settled) == args.n_orders, f"체결 {len(settled)}/{args.n_orders}"
+
+    # 2) 리밸런싱: 매도 체결 대금이 들어오는 대로 매수
+    krw = 1_000_000  # 매수 예산이 매도 대금에 묶이도록 KRW를 줄여 둔다.
+    exchange.balances["KRW"] = krw
+    strt_time = time.perf_counter()
+    summary = engine.rebalance(sells=sells, buys=buys, krw_balance=krw)
+    rebalance_elapsed = time.perf_counter() - strt_time
+    assert summary["n_sell"] == len(sells), summary
+
+    print(
+        f"markets={len(markets)}, workers={args.workers}, "
+        f"latency={args.latency_ms}±{args.jitter_ms} ms, fill_delay={args.fill_delay}s"
+    )
+    print(
+        f"submit_orders  {args.n_orders} orders  {submit_elapsed:>7.2f} s  "
+        f"({args.n_orders / submit_elapsed:,.1f} orders/s, 체결 확인까지 {settle_elapsed:.2f} s)"
+    )
+    print(
+        f"rebalance      {summary['n_sell']} sell + {summary['n_buy']}/{len(buys)} buy  "
+        f"{rebalance_elapsed:>7.2f} s  (budget={summary['each_budget']:,})"
+    )
+    latency = get_metrics_registry().summary("http_request_duration_seconds")
+    print(
+        latency[["endpoint", "count", "mean", "p50", "p90", "p99"]].to_string(
+            index=False
+        )
+    )
+    print(f"simulator requests: {dict(server.stats)}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,562 @@
+"""
+일일 파이프라인(run_strategy) 단계별 벤치마크
+
+    python -m benchmarks.bench_pipeline                      # 전체 단계 실행 + baseline 비교
+    python -m benchmarks.bench_pipeline --stages features lgbm_fit
+    python -m benchmarks.bench_pipeline --update-baseline    # 현재 결과를 baseline으로 저장
+
+합성 패널(기본 500 market × 1000일) 위에서 run_strategy의 각 단계를 별도 프로세스로 실행해
+단계별 wall time, CPU time, peak RSS를 잰다. (프로세스를 나눠야 단계별 peak RSS가 섞이지 않는다)
+benchmarks/baseline.json과 비교해 wall time이 --max-slowdown배, 측정 중 늘어난 RSS(peak - setup)가
+--max-rss-growth배를 넘는 단계가 있으면 종료 코드 1로 끝난다.
+baseline을 기록한 Python/라이브러리 버전(machine)이 현재와 다르면 비교하지 않고, platform만 다르면 경고한다.
+(baseline은 uv.lock 환경에서 기록한다)
+
+- bq_fetch / bq_cache_hit: 로컬 stand-in fetch를 붙인 BigQueryCache의 cold 조회 / 캐시 적중 조회
+- features: FeatureStoreByPanel.set_features (regime 제외)
+- features_incremental: 전날까지 계산해 둔 IncrementalFeatureStore로 하루치 캔들만 반영 (regime 제외)
+- markov_refit / markov_cached: regime 피처 (EM 전체 재적합 / 캐시된 파라미터로 smoothing만)
+- lgbm_fit / lgbm_predict: 학습 구간 fit, 추론일 predict
+- quantile_long_short: 롱/숏 후보 분리
+- orders: 로컬 거래소 시뮬레이터 상대로 OrderExecutionEngine.rebalance
+
+단계 간 중간 결과(패널, 피처 행렬, 모델)는 --workdir에 저장해 다음 단계의 준비(setup)에 쓰며,
+준비 시간은 측정에 포함하지 않는다.
+"""
+
+import argparse
+import importlib.metadata
+import json
+import os
+import pickle
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv_panel
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# 측정값에 영향을 주는 라이브러리 (baseline과 버전이 같아야 비교한다)
+LIBRARIES = ("numpy", "pandas", "pyarrow", "lightgbm", "statsmodels", "scikit-learn")
+STAGES = (
+    "bq_fetch",
+    "bq_cache_hit",
+    "features",
+    "features_incremental",
+    "markov_refit",
+    "markov_cached",
+    "lgbm_fit",
+    "lgbm_predict",
+    "quantile_long_short",
+    "orders",
+)
+
+
+def _peak_rss_mb() -> float:
+    """현재 프로세스와 (종료된) 자식 프로세스 중 가장 큰 peak RSS(MB)"""
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Linux는 KB, macOS는 byte 단위
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _machine() -> dict:
+    libraries = {}
+    for name in LIBRARIES:
+        try:
+            libraries[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            libraries[name] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "libraries": libraries,
+    }
+
+
+def _rss_growth_mb(result: dict) -> float:
+    """측정 중 늘어난 peak RSS(MB). peak_rss_mb는 프로세스 전체 peak라 준비(setup) 비용을 뺀다."""
+    return max(result["peak_rss_mb"] - result["setup_rss_mb"], 0.0)
+
+
+def _cpu_sec() -> float:
+    usage = [
+        resource.getrusage(x) for x in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    ]
+    return sum(x.ru_utime + x.ru_stime for x in usage)
+
+
+class Workdir:
+    """단계 간 중간 결과 저장소. 없으면 build로 만들어 저장한다."""
+
+    def __init__(self, path: str, args: argparse.Namespace) -> None:
+        self.path = path
+        self.args = args
+
+    def load(self, name: str, build):
+        path = os.path.join(self.path, f"{name}.pkl")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        result = build()
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        return result
+
+    def raw(self) -> pd.DataFrame:
+        return self.load(
+            "raw",
+            lambda: make_ohlcv_panel(
+                n_markets=self.args.n_markets,
+                n_days=self.args.n_days,
+                seed=self.args.seed,
+            ),
+        )
+
+    def features(self) -> pd.DataFrame:
+        """CTRENDAllocator.get_features와 같은 형식의 학습/추론 표 (fear & greed 제외)"""
+
+        def build():
+            from src.feature_store import FeatureStoreByPanel
+
+            panel = FeatureStoreByPanel(self.raw(), "reg_date")
+            panel.set_features(dtype=np.float32, markov_cache=self.markov_cache())
+            rows = np.flatnonzero(panel.data.notna().all(axis=1).to_numpy())
+            close = panel.data["close"].to_numpy(dtype=np.float64)[rows]
+            market_code = panel._cols[rows]
+            future_close = np.full(len(rows), np.nan)
+            same_market = market_code[7:] == market_code[:-7]
+            future_close[:-7][same_market] = close[7:][same_market]
+            data = panel.data.iloc[rows].drop(
+                columns=["symbol", "open", "close", "high", "low", "volume"]
+            )
+            data["y"] = ((future_close - close) / close * 100).astype(np.float32)
+            return data.reset_index()
+
+        return self.load("features", build)
+
+    def markov_cache(self):
+        from src.feature_store import FeatureStoreByPanel, MarkovRegimeCache
+
+        def build():
+            cache = MarkovRegimeCache()
+            FeatureStoreByPanel(self.raw(), "reg_date").set_markov_regime_switching(
+                cache=cache
+            )
+            return cache
+
+        return self.load("markov_cache", build)
+
+    def split(self):
+        """(feature 컬럼, 학습 행, 추론 행) - ctrend_model.run과 같은 기준"""
+        data = self.features()
+        feature_cols = [x for x in data.columns if x not in ("reg_date", "market", "y")]
+        inference_date = data["reg_date"].max()
+        train_rows = np.flatnonzero(
+            (data["reg_date"] < inference_date).to_numpy()
+            & ~np.isnan(data["y"].to_numpy())
+        )
+        inference_rows = np.flatnonzero((data["reg_date"] == inference_date).to_numpy())
+        return feature_cols, train_rows, inference_rows
+
+    def model(self):
+        def build():
+            from lightgbm import LGBMRegressor
+
+            from src.ctrend_model import RANDOM_STATE
+
+            data = self.features()
+            feature_cols, train_rows, _ = self.split()
+            model = LGBMRegressor(random_state=RANDOM_STATE, verbose=-1)
+            model.fit(
+                data[feature_cols].to_numpy(dtype=np.float32)[train_rows],
+                data["y"].to_numpy()[train_rows],
+                feature_name=feature_cols,
+            )
+            return model.booster_
+
+        return self.load("model", build)
+
+    def pred_result(self) -> pd.DataFrame:
+        def build():
+            data = self.features()
+            feature_cols, _, inference_rows = self.split()
+            result = (
+                data[["reg_date", "market"]].iloc[inference_rows].reset_index(drop=True)
+            )
+            result["pred"] = self.model().predict(
+                data[feature_cols].to_numpy(dtype=np.float32)[inference_rows]
+            )
+            return result
+
+        return self.load("pred_result", build)
+
+
+# ----------------------------------------------------------------------
+# 단계별 준비: 측정할 함수를 반환한다.
+# ----------------------------------------------------------------------
+def setup_bq_fetch(work: Workdir, warm: bool = False):
+    import pyarrow as pa
+
+    from src.connection.bq_cache import BigQueryCache
+
+    raw = work.raw()
+    table = pa.Table.from_pandas(raw, preserve_index=False)
+    reg_date = pd.to_datetime(raw["reg_date"]).dt.date.to_numpy()
+
+    def fetch(sql: str) -> pa.Table:
+        # BigQuery stand-in: DECLARE로 치환된 구간만 잘라 Arrow 테이블로 돌려준다.
+        start, end = [
+            date.fromisoformat(x) for x in re.findall(r"'(\d{4}-\d{2}-\d{2})'", sql)[:2]
+        ]
+        return table.filter(pa.array((reg_date >= start) & (reg_date <= end)))
+
+    cache_dir = tempfile.mkdtemp(dir=work.path)
+    cache = BigQueryCache(fetch=fetch, cache_dir=cache_dir)
+    end_date = raw["reg_date"].max()
+    start_date = end_date - timedelta(days=work.args.n_days)
+    sql = """
+    DECLARE start_date DATETIME DEFAULT '<start_date>';
+    DECLARE   end_date DATETIME DEFAULT '<end_date>';
+    SELECT * FROM bithumb_crypto_1d WHERE reg_date BETWEEN start_date AND end_date
+    """
+
+    def run():
+        return cache.query("bithumb_crypto_1d", sql, "reg_date", start_date, end_date)
+
+    if warm:
+        run()
+    return run
+
+
+def setup_features(work: Workdir):
+    from src.feature_store import DEFAULT_FEATURES, MARKOV_FEATURE, FeatureStoreByPanel
+
+    raw = work.raw()
+    features = [x for x in DEFAULT_FEATURES if x != MARKOV_FEATURE]
+    return lambda: FeatureStoreByPanel(raw, "reg_date").set_features(
+        dtype=np.float32, features=features
+    )
+
+
+def setup_features_incremental(work: Workdir):
+    from src.feature_store import (
+        DEFAULT_FEATURES,
+        MARKOV_FEATURE,
+        FeatureStoreByPanel,
+        IncrementalFeatureStore,
+    )
+
+    raw = work.raw()
+    features = [x for x in DEFAULT_FEATURES if x != MARKOV_FEATURE]
+    cache = IncrementalFeatureStore()
+    FeatureStoreByPanel(
+        raw.loc[raw["reg_date"] < raw["reg_date"].max()], "reg_date"
+    ).set_features(dtype=np.float32, features=features, feature_cache=cache)
+    return lambda: FeatureStoreByPanel(raw, "reg_date").set_features(
+        dtype=np.float32, features=features, feature_cache=cache
+    )
+
+
+def setup_markov(work: Workdir, cached: bool = False):
+    from src.feature_store import FeatureStoreByPanel, MarkovRegimeCache
+
+    raw = work.raw()
+    cache = work.markov_cache() if cached else MarkovRegimeCache()
+    panel = FeatureStoreByPanel(raw, "reg_date")
+    return lambda: panel.set_markov_regime_switching(dtype=np.float32, cache=cache)
+
+
+def setup_lgbm_fit(work: Workdir):
+    from lightgbm import LGBMRegressor
+
+    from src.ctrend_model import RANDOM_STATE
+
+    data = work.features()
+    feature_cols, train_rows, _ = work.split()
+    X = data[feature_cols].to_numpy(dtype=np.float32)[train_rows]
+    y = data["y"].to_numpy()[train_rows]
+    model = LGBMRegressor(random_state=RANDOM_STATE, verbose=-1)
+    return lambda: model.fit(X, y, feature_name=feature_cols)
+
+
+def setup_lgbm_predict(work: Workdir):
+    data = work.features()
+    feature_cols, _, inference_rows = work.split()
+    X = data[feature_cols].to_numpy(dtype=np.float32)[inference_rows]
+    booster = work.model()
+    # 추론 행(하루치)은 너무 적어 잡음이 크므로 같은 행렬을 여러 번 예측한다.
+    return lambda: [booster.predict(X) for _ in range(50)]
+
+
+def setup_quantile_long_short(work: Workdir):
+    from src.ctrend_model import quantile_long_short
+
+    pred_result = work.pred_result()
+    return lambda: [quantile_long_short(pred_result, col="pred") for _ in range(1000)]
+
+
+def setup_orders(work: Workdir):
+    import logging
+
+    from src.bithumb import BithumbClient
+    from src.connection.http import get_http_transport
+    from src.ctrend_model import quantile_long_short
+    from src.exchange_sim import SimulatedExchange, start_simulator
+    from src.order_engine import OrderExecutionEngine
+
+    logging.getLogger("src.config.helper").setLevel(logging.WARNING)
+    raw = work.raw()
+    long, short = quantile_long_short(work.pred_result(), col="pred")
+    last = raw.loc[raw["reg_date"] == raw["reg_date"].max()].set_index("market")[
+        "close"
+    ]
+    sells = [(market, 20_000 / last[market]) for market in short["market"]]
+    krw = 1_000_000
+    exchange = SimulatedExchange(
+        raw,
+        balances={"KRW": krw, **{m.split("-")[-1]: v for m, v in sells}},
+        fill_delay=work.args.fill_delay,
+    )
+    server = start_simulator(exchange, latency_ms=work.args.latency_ms)
+    get_http_transport().mount(server.url, pool_size=8)
+    client = BithumbClient(base_url=server.url, journal=False)
+    client.bithumb_key = client.bithumb_key or "sim"
+    client.bithumb_secret = client.bithumb_secret or "sim"
+    engine = OrderExecutionEngine(client, poll_interval=0.05)
+    buys = list(long["market"])
+
+    def run():
+        summary = engine.rebalance(sells=sells, buys=buys, krw_balance=krw)
+        # 결과 검증: 모든 매도가 제출되어야 한다.
+        assert summary["n_sell"] == len(sells), summary
+        return summary
+
+    return run
+
+
+def setup_prepare(work: Workdir):
+    """측정 전에 중간 결과를 모두 만들어 둔다. (각 단계의 peak RSS에 준비 비용이 섞이지 않도록)"""
+    work.pred_result()
+    return lambda: None
+
+
+SETUPS = {
+    "prepare": setup_prepare,
+    "bq_fetch": setup_bq_fetch,
+    "bq_cache_hit": lambda work: setup_bq_fetch(work, warm=True),
+    "features": setup_features,
+    "features_incremental": setup_features_incremental,
+    "markov_refit": setup_markov,
+    "markov_cached": lambda work: setup_markov(work, cached=True),
+    "lgbm_fit": setup_lgbm_fit,
+    "lgbm_predict": setup_lgbm_predict,
+    "quantile_long_short": setup_quantile_long_short,
+    "orders": setup_orders,
+}
+
+
+def run_stage(args: argparse.Namespace) -> dict:
+    """(자식 프로세스) 단계 하나를 준비 후 측정한다."""
+    run = SETUPS[args.run_stage](Workdir(args.workdir, args))
+    setup_rss = _peak_rss_mb()
+    cpu_time = _cpu_sec()
+    strt_time = time.perf_counter()
+    run()
+    return {
+        "wall_sec": round(time.perf_counter() - strt_time, 4),
+        "cpu_sec": round(_cpu_sec() - cpu_time, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "setup_rss_mb": round(setup_rss, 1),
+    }
+
+
+def spawn_stage(stage: str, args: argparse.Namespace) -> dict:
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.bench_pipeline",
+        "--run-stage",
+        stage,
+        "--workdir",
+        args.workdir,
+        "--n-markets",
+        str(args.n_markets),
+        "--n-days",
+        str(args.n_days),
+        "--seed",
+        str(args.seed),
+        "--latency-ms",
+        str(args.latency_ms),
+        "--fill-delay",
+        str(args.fill_delay),
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise RuntimeError(f"{stage} 단계 실행 실패 (exit {result.returncode})")
+    # 마지막 줄이 측정 결과(JSON)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    max_slowdown: float,
+    max_rss_growth: float,
+    min_delta: float,
+    min_rss_delta: float,
+) -> list:
+    """
+    baseline 대비 결과 표를 출력하고, 허용치를 넘은 (단계, 항목) 목록을 반환한다.
+    짧은 단계의 측정 잡음을 거르기 위해 wall time은 min_delta초, RSS 증가분은 min_rss_delta MB
+    이상 늘어난 경우에만 회귀로 본다.
+    """
+    regressions = []
+    print(
+        f"{'stage':<20} {'wall(s)':>9} {'base':>9} {'ratio':>6}  {'+rss(MB)':>8} {'base':>8} {'ratio':>6}"
+    )
+    for stage, result in results.items():
+        base = baseline.get(stage)
+        wall_ratio = (
+            result["wall_sec"] / base["wall_sec"]
+            if base and base["wall_sec"]
+            else np.nan
+        )
+        rss = _rss_growth_mb(result)
+        base_rss = _rss_growth_mb(base) if base else np.nan
+        rss_ratio = rss / base_rss if base and base_rss else np.nan
+        flags = []
+        if (
+            wall_ratio > max_slowdown
+            and result["wall_sec"] - base["wall_sec"] >= min_delta
+        ):
+            flags += ["SLOWER"]
+            regressions += [(stage, "wall_sec")]
+        if base and rss > max_rss_growth * base_rss and rss - base_rss >= min_rss_delta:
+            flags += ["MORE MEMORY"]
+            regressions += [(stage, "peak_rss_mb")]
+        print(
+            f"{stage:<20} {result['wall_sec']:>9.3f} {base['wall_sec'] if base else np.nan:>9.3f} {wall_ratio:>6.2f}"
+            f"  {rss:>8.1f} {base_rss:>8.1f} {rss_ratio:>6.2f}"
+            f"  {' '.join(flags)}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="일일 파이프라인 단계별 벤치마크")
+    parser.add_argument(
+        "--stages", type=str, nargs="*", default=list(STAGES), choices=STAGES
+    )
+    parser.add_argument("--n-markets", type=int, default=500)
+    parser.add_argument("--n-days", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--fill-delay", type=float, default=0.1)
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH)
+    parser.add_argument("--max-slowdown", type=float, default=1.5)
+    parser.add_argument("--max-rss-growth", type=float, default=1.25)
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.05,
+        help="회귀로 볼 최소 wall time 증가(초)",
+    )
+    parser.add_argument(
+        "--min-rss-delta",
+        type=float,
+        default=20,
+        help="회귀로 볼 최소 RSS 증가분 차이(MB)",
+    )
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--workdir", type=str, default=None)
+    parser.add_argument("--run-stage", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.workdir = args.workdir or tmp
+        os.makedirs(args.workdir, exist_ok=True)
+        config = {"n_markets": args.n_markets, "n_days": args.n_days, "seed": args.seed}
+        machine = _machine()
+        print(f"config={config}, workdir={args.workdir}")
+        spawn_stage("prepare", args)
+        results = {}
+        for stage in args.stages:
+            results[stage] = spawn_stage(stage, args)
+            print(f"  {stage:<20} {json.dumps(results[stage])}", flush=True)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = None
+
+    if args.update_baseline:
+        stages = {**(baseline or {}).get("stages", {}), **results}
+        if baseline and (
+            baseline.get("config") != config or baseline.get("machine") != machine
+        ):
+            stages = results
+        with open(args.baseline + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "config": config,
+                    "machine": machine,
+                    "stages": stages,
+                },
+                f,
+                indent=2,
+            )
+        os.replace(args.baseline + ".tmp", args.baseline)
+        print(f"baseline 저장: {args.baseline}")
+        return
+
+    if baseline is None:
+        print(f"baseline이 없습니다: {args.baseline} (--update-baseline으로 생성)")
+        return
+    if baseline.get("config") != config:
+        print(f"baseline 설정이 달라 비교하지 않습니다: {baseline.get('config')}")
+        return
+    base_machine = baseline.get("machine", {})
+    versions = ("python", "libraries")
+    if any(base_machine.get(x) != machine[x] for x in versions):
+        print(
+            "baseline과 Python/라이브러리 버전이 달라 비교하지 않습니다: "
+            f"{ {x: base_machine.get(x) for x in versions} } (현재: { {x: machine[x] for x in versions} })"
+        )
+        return
+    if base_machine.get("platform") != machine["platform"]:
+        print(
+            f"경고: baseline과 platform이 다릅니다: {base_machine.get('platform')} (현재: {machine['platform']})"
+        )
+    regressions = compare(
+        results,
+        baseline["stages"],
+        args.max_slowdown,
+        args.max_rss_growth,
+        args.min_delta,
+        args.min_rss_delta,
+    )
+    if regressions:
+        print(f"성능 회귀: {regressions}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
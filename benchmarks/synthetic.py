@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+def make_ohlcv_panel(
+    n_markets: int = 400, n_days: int = 730, seed: int = 0
+) -> pd.DataFrame:
+    """벤치마크용 합성 빗썸 일봉 데이터(bithumb_crypto_1d 조회 결과와 같은 컬럼)."""
+    rng = np.random.default_rng(seed)
+    end_date = date.today()
+    result = []
+    for i in range(n_markets):
+        # 신규 상장 market을 흉내내기 위해 이력 길이를 다르게 준다.
+        n_rows = int(rng.integers(n_days // 2, n_days + 1))
+        reg_date = [end_date - timedelta(days=n_rows - j) for j in range(n_rows)]
+        close = 10 ** rng.uniform(0, 6) * np.exp(np.cumsum(rng.normal(0, 0.04, n_rows)))
+        spread = rng.uniform(0, 0.08, (2, n_rows))
+        symbol = f"SYM{i:04d}"
+        result += [
+            pd.DataFrame(
+                {
+                    "reg_date": reg_date,
+                    "market": f"KRW-{symbol}",
+                    "symbol": symbol,
+                    "open": close * (1 + rng.normal(0, 0.01, n_rows)),
+                    "close": close,
+                    "high": close * (1 + spread[0]),
+                    "low": close * (1 - spread[1]),
+                    "volume": rng.lognormal(12, 2, n_rows),
+                }
+            )
+        ]
+    result = pd.concat(result)
+    return result.sort_values(by=["reg_date", "market"]).reset_index(drop=True)
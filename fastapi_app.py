@@ -1,33 +1,81 @@
 # fastapi_app.py
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 
 from main import run, test
+from src.jobs import get_job_manager
+from src.metrics import (
+    OPENMETRICS_CONTENT_TYPE,
+    PROMETHEUS_CONTENT_TYPE,
+    get_metrics_registry,
+)
 
 app = FastAPI(title="Crypto Auto Trader API", version="1.0.0")
 
+# job 종류별 실행 함수 (같은 종류는 동시에 하나만 실행된다)
+JOB_FUNCS = {"run": run, "test": test}
+
 
 @app.get("/")
 def health():
     return {"status": "ok"}
 
 
-@app.get("/run")
+@app.post("/jobs/{kind}", status_code=202)
+def submit_job(kind: str):
+    """
+    run/test를 백그라운드 job으로 제출하고 바로 job 정보를 반환한다.
+    같은 종류의 job이 대기/실행 중이면 새로 실행하지 않고 그 job을 반환한다. (created=False)
+    """
+    if kind not in JOB_FUNCS:
+        raise HTTPException(status_code=404, detail=f"unknown job: {kind}")
+    job, created = get_job_manager().submit(kind, JOB_FUNCS[kind])
+    return {**job.to_dict(), "created": created}
+
+
+@app.get("/jobs")
+def list_jobs():
+    return [x.to_dict() for x in get_job_manager().list()]
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """job 상태(queued/running/succeeded/failed), 단계별 진행 상황, 결과"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job not found: {job_id}")
+    return job.to_dict()
+
+
+@app.get("/run", status_code=202)
 def run_endpoint():
-    try:
-        run()  # run()은 반환값이 없으므로 Slack/로그로 확인
-        return {"status": "ok", "message": "run() executed"}
-    except Exception as e:
-        return {"status": "error", "detail": str(e)}
+    """기존 트리거 호환용: POST /jobs/run과 같다."""
+    return submit_job("run")
 
 
-@app.get("/test")
+@app.get("/test", status_code=202)
 def test_endpoint():
-    try:
-        result = test()  # {'result': 'ok', ...} 형태
-        return {"status": "ok", "result": result}
-    except Exception as e:
-        return {"status": "error", "detail": str(e)}
+    """기존 트리거 호환용: POST /jobs/test와 같다."""
+    return submit_job("test")
+
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    """
+    Prometheus scrape endpoint (Accept에 application/openmetrics-text가 있으면 OpenMetrics 형식)
+    - pipeline_stage_duration_seconds, method_call_*: 파이프라인 단계/함수별 소요 시간
+    - http_*: 거래소 등 외부 API endpoint별 latency, 상태별 요청 수, 재시도 수
+    - exchange_order_errors_total: 거래소 주문 오류 응답 수
+    - bigquery_*: BigQuery 처리/과금 바이트, job 실행 시간
+    - order_fill_latency_seconds: 주문 제출부터 체결 확인까지 걸린 시간
+    - feature_matrix_*: 마지막 학습/추론 피처 행렬 크기
+    - jobs_*: 제출/종료된 job 수
+    """
+    openmetrics = "application/openmetrics-text" in request.headers.get("accept", "")
+    return Response(
+        content=get_metrics_registry().render(openmetrics=openmetrics),
+        media_type=OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE,
+    )
 
 
 if __name__ == "__main__":
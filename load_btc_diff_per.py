@@ -2,9 +2,9 @@ from datetime import datetime
 
 import pandas as pd
 import pytz
-import requests
 
 from src.connection.bigquery import BigQueryConn
+from src.connection.http import EndpointPolicy, get_http_transport
 from src.connection.slack import SlackClient
 
 kst = pytz.timezone("Asia/Seoul")
@@ -13,8 +13,13 @@ reg_date = cur.date()
 reg_hour = cur.hour
 
 target_slug = "bitcoin"
-response = requests.get(
-    f"https://api.coinmarketcap.com/data-api/v3/cryptocurrency/market-pairs/latest?slug={target_slug}&start=1&limit=100&category=spot&centerType=all&sort=cmc_rank_advanced&direction=desc&spotUntracked=true"
+http = get_http_transport()
+http.set_policy(
+    "coinmarketcap.market-pairs", EndpointPolicy(timeout=(3.05, 15), retries=2)
+)
+response = http.get(
+    f"https://api.coinmarketcap.com/data-api/v3/cryptocurrency/market-pairs/latest?slug={target_slug}&start=1&limit=100&category=spot&centerType=all&sort=cmc_rank_advanced&direction=desc&spotUntracked=true",
+    endpoint="coinmarketcap.market-pairs",
 )
 response.raise_for_status()
 
@@ -48,9 +53,10 @@ if abs(diff_per) >= 3:
     contents = f"*CRYPTO*: `{target_slug.upper()}`"
     SlackClient().chat_postMessage(title, contents)
 
-BigQueryConn().upsert(
+BigQueryConn().merge_upsert(
     result_df,
     table_id="btc_diff_per",
     data_set="crypto_fluxor",
-    target_dict={"reg_date": reg_date, "reg_hour": reg_hour},
+    key_cols=["reg_date", "reg_hour"],
+    replace_cols=["reg_date", "reg_hour"],
 )
@@ -9,4 +9,10 @@ kst = pytz.timezone('Asia/Seoul')
 cur = datetime.now(tz=kst)
 reg_date = cur.date()
 result = CoinMarketCapClient().get_fear_and_greed_latest()
-BigQueryConn().upsert(result, table_id='fear_and_greed', data_set='crypto_fluxor', target_dict={'reg_date': reg_date})
\ No newline at end of file
+BigQueryConn().merge_upsert(
+    result,
+    table_id='fear_and_greed',
+    data_set='crypto_fluxor',
+    key_cols=['reg_date'],
+    replace_cols=['reg_date'],
+)
@@ -1,10 +1,8 @@
 # 모든 경고 무시
 import argparse
 import os
-import time
 import warnings
 from datetime import datetime, timedelta
-from typing import Tuple
 
 import pandas as pd
 import pytz
@@ -12,9 +10,14 @@ from dotenv import load_dotenv
 
 from src.config.helper import log_method_call
 from src.connection.slack import SlackClient
-from src.ctrend_model import CTRENDAllocator
+from src.ctrend_model import LONG_Q, SHORT_Q, CTRENDAllocator, quantile_long_short
 from src.logger import get_logger
-from src.trader import execute_buy_logic, execute_sell_logic, sell_expired_crypto
+from src.metrics import time_stage
+from src.trader import (
+    execute_rebalance,
+    flush_trade_journal,
+    sell_expired_crypto,
+)
 from src.upbit import get_accounts, post_market_buy_order
 
 # -----------------------------------------------------------------------------
@@ -26,10 +29,6 @@ warnings.filterwarnings("ignore")
 # KST 기준 로깅 설정
 KST = pytz.timezone("Asia/Seoul")
 
-SLEEP_SEC: int = 30
-LONG_Q: float = 0.8  # 상위 20%
-SHORT_Q: float = 0.2  # 하위 20%
-
 # "오늘 00:00 KST" 기준일
 TODAY = datetime.combine(datetime.now(tz=KST).date(), datetime.min.time())
 
@@ -39,29 +38,6 @@ load_dotenv()
 BTC_TRADE_UNIT = int(os.getenv("BTC_TRADE_UNIT"))
 
 
-def _quantile_long_short(
-    df: pd.DataFrame,
-    col: str = "pred",
-    long_q: float = LONG_Q,
-    short_q: float = SHORT_Q,
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """예측 점수 기준으로 롱/숏 후보를 분리한다.
-    - long: 상위 (1 - short_q) 이상
-    - short: 하위 short_q 이하
-    빈 DF에 대해서는 빈 DF를 반환.
-    """
-    if df is None or df.empty:
-        return df, df
-
-    # 경계값 계산
-    long_thr = df[col].quantile(long_q)
-    short_thr = df[col].quantile(short_q)
-
-    long = df.loc[df[col] >= long_thr]
-    short = df.loc[df[col] <= short_thr]
-    return long, short
-
-
 def _slack_notify(title: str, contents: str) -> None:
     """슬랙 메시지 전송 래퍼."""
     try:
@@ -93,21 +69,25 @@ def run_strategy() -> dict:
     obj = CTRENDAllocator(**args)
 
     # 실거래 모드에서만 만기 청산
-    sell_expired_crypto(target_date=TODAY, expire_range=40)
+    with time_stage("sell_expired"):
+        sell_expired_crypto(target_date=TODAY, expire_range=40)
 
     # 예측 수행
-    pred_result = obj.run()
+    with time_stage("model"):
+        pred_result = obj.run()
 
     # 롱/숏 후보 분리
-    long, short = _quantile_long_short(
+    long, short = quantile_long_short(
         pred_result, col="pred", long_q=LONG_Q, short_q=SHORT_Q
     )
 
-    # 실거래 모드에서는 매도 → 대기 → 매수
-    execute_sell_logic(cand_short=short, except_cryptos=args["except_cryptos"])
-    logger.info(f"WAIT {SLEEP_SEC} sec FOR SELLING SETTLEMENT")
-    time.sleep(SLEEP_SEC)
-    execute_buy_logic(cand_long=long, except_cryptos=args["except_cryptos"])
+    # 실거래 모드에서는 매도 체결을 확인하며 매수
+    with time_stage("rebalance"):
+        execute_rebalance(
+            cand_long=long, cand_short=short, except_cryptos=args["except_cryptos"]
+        )
+    with time_stage("trade_journal"):
+        flush_trade_journal()
 
     # 결과 요약 슬랙 전송
     title = "🟠[BITHUMB-ML기반 자동 투자: 완료]🟠"
@@ -177,16 +157,22 @@ def accumulate_btc() -> None:
 
 
 @log_method_call
-def run() -> None:
-    """메인 런북: 전략 실행 → BTC 적립식."""
+def run() -> dict:
+    """메인 런북: 전략 실행 → BTC 적립식.
+
+    실패한 단계가 있어도 다음 단계는 진행하고, 단계별 결과를 반환한다.
+    실패한 단계는 {"result": "error", "detail": ...}로 남으며 job은 failed로 기록된다. (src.jobs.step_errors)
+    """
     current_time = datetime.now(tz=KST).strftime("%Y-%m-%d %H:%M:%S")
     logger.info(f"현재 시점을 로깅합니다.: {current_time}")
+    result = {}
 
     # 1) 전략 실행
     try:
-        run_strategy()
+        result["run_strategy"] = run_strategy()
         logger.info("run_strategy() 성공")
     except Exception as e:
+        result["run_strategy"] = {"result": "error", "detail": str(e)}
         logger.error(f"run_strategy() 실패: {e}")
         _slack_notify(
             "🚨[BITHUMB-ML기반 자동 투자: 실패]🚨",
@@ -195,15 +181,19 @@ def run() -> None:
 
     # 2) BTC 적립식
     try:
-        accumulate_btc()
+        with time_stage("accumulate_btc"):
+            accumulate_btc()
+        result["accumulate_btc"] = {"result": "ok"}
         logger.info("accumulate_btc() 성공")
     except Exception as e:
+        result["accumulate_btc"] = {"result": "error", "detail": str(e)}
         logger.error(f"accumulate_btc() 실패: {e}")
         _slack_notify(
             "🚨[UPBIT-BTC 적립식 매수: 실패]🚨",
             f"*에러 메시지*: ```{str(e)}```\n*시간*: `{current_time}`",
         )
     logger.info("전체 실행 완료")
+    return result
 
 
 def test():
@@ -214,9 +204,10 @@ def test():
     obj = CTRENDAllocator(**args)
 
     title = "🟡[BITHUMB-ML기반 자동 투자: 테스트]🟡"
-    pred_result = obj.run()
+    with time_stage("model"):
+        pred_result = obj.run()
     # 롱/숏 후보 분리
-    long, short = _quantile_long_short(
+    long, short = quantile_long_short(
         pred_result, col="pred", long_q=LONG_Q, short_q=SHORT_Q
     )
 
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Set, Tuple
+
+import pandas as pd
+
+from src.bithumb import get_bithumb_client
+from src.config.env import PROJECT_ROOT
+from src.config.helper import atomic_path, log_method_call
+from src.connection.bigquery import get_bq_conn
+from src.connection.bq_cache import BigQueryCache
+
+logger = logging.getLogger(__name__)
+
+
+class BithumbBackfillEngine:
+    """
+    bithumb_crypto_1d 테이블의 누락 구간을 채우는 backfill 엔진.
+
+    1) 이미 적재된 날짜를 한 번에 조회해 market별 누락 구간을 계획하고
+    2) 누락 구간을 캔들 페이지 단위로 나눠 전체 market에 걸쳐 동시에 조회한 뒤
+    3) 겹치는 페이지를 중복 제거하고, 누락된 날짜만 단일 MERGE로 적재한다.
+
+    조회 결과로 확인한 market별 첫 캔들 날짜(상장일)와 거래소가 캔들을 주지 않은 날짜(거래 정지 등)는
+    state_path에 기억해, 다음 실행부터는 상장일 이후의 새 누락 날짜만 조회한다. (채울 구간이 없으면 조회 없이 끝남)
+    이 기록은 MARKER_TTL_DAYS가 지나면 버려, 짧거나 빈 응답이 일시적이었어도 나중에 다시 조회한다.
+    """
+
+    PAGE_SIZE = 200  # 캔들 API 1회 최대 조회 개수
+    MARKER_TTL_DAYS = 7  # 첫 캔들 / 캔들 없음 기록의 유효 기간
+    state_path = os.path.join(PROJECT_ROOT, ".cache", "backfill_state.json")
+
+    def __init__(
+        self, table_id: str = "bithumb_crypto_1d", data_set: str = "crypto_fluxor"
+    ) -> None:
+        self.table_id = table_id
+        self.data_set = data_set
+        self.bq_conn = get_bq_conn()
+        self.client = get_bithumb_client()
+        # market -> (첫 캔들 날짜, 확인한 날) / {거래소에 캔들이 없다고 확인된 날짜: 확인한 날}
+        self.first_candle: Dict[str, Tuple[date, date]] = {}
+        self.no_candle: Dict[str, Dict[date, date]] = {}
+        self.load_state()
+
+    @log_method_call
+    def run(
+        self, markets: list, target_date: date, threshold: int = 600
+    ) -> pd.DataFrame:
+        """target_date 이전 threshold일 중 적재되지 않은 캔들을 채우고, 적재한 행을 반환한다."""
+        target_date = pd.Timestamp(target_date).date()
+        start_date = target_date - timedelta(days=threshold)
+        plan = self.plan(markets, target_date, threshold)
+        if not plan:
+            logger.info("backfill 대상 구간이 없습니다.")
+            return pd.DataFrame()
+
+        result, first_candle, no_candle = self.fetch(plan)
+        if result.empty:
+            logger.info("backfill 구간에 조회된 캔들이 없습니다.")
+        else:
+            self.bq_conn.merge_upsert(
+                result,
+                table_id=self.table_id,
+                data_set=self.data_set,
+                key_cols=["market", "reg_date"],
+            )
+            # 과거 파티션이 바뀌었으므로 로컬 조회 캐시를 만료시킨다.
+            self.bq_conn.cache.invalidate(self.table_id)
+            logger.info(f"backfill 적재 완료: {len(plan)}개 market, {len(result)}행")
+        # 적재가 끝난 뒤에만 기록한다. (적재 실패 시 다음 실행에서 같은 구간을 다시 조회)
+        today = date.today()
+        for market, first_date in first_candle.items():
+            self.first_candle[market] = (first_date, today)
+        for market, dates in no_candle.items():
+            self.no_candle.setdefault(market, {}).update(dict.fromkeys(dates, today))
+        self.save_state(start_date)
+        return result
+
+    def get_stored_dates(
+        self, start_date: date, end_date: date
+    ) -> Dict[str, Set[date]]:
+        stored = self.bq_conn.query(f"""
+        DECLARE start_date DATETIME DEFAULT '{start_date.strftime("%Y-%m-%d")}';
+        DECLARE   end_date DATETIME DEFAULT '{end_date.strftime("%Y-%m-%d")}';
+        SELECT market, DATE(reg_date) AS reg_date
+        FROM `{self.bq_conn.project_id}.{self.data_set}.{self.table_id}`
+        WHERE reg_date BETWEEN start_date AND end_date
+        GROUP BY 1, 2
+        """)
+        stored["reg_date"] = pd.to_datetime(stored["reg_date"]).dt.date
+        return stored.groupby("market")["reg_date"].agg(set).to_dict()
+
+    def load_state(self):
+        """저장된 기록 중 MARKER_TTL_DAYS가 지나지 않은 것만 읽는다. (없거나 형식이 다르면 빈 상태)"""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            first_candle = {
+                market: (date.fromisoformat(x), date.fromisoformat(checked))
+                for market, (x, checked) in state["first_candle"].items()
+            }
+            no_candle = {
+                market: {
+                    date.fromisoformat(x): date.fromisoformat(checked)
+                    for x, checked in dates.items()
+                }
+                for market, dates in state["no_candle"].items()
+            }
+        # json.JSONDecodeError도 ValueError다.
+        except (FileNotFoundError, KeyError, TypeError, ValueError):
+            return
+        expired = date.today() - timedelta(days=self.MARKER_TTL_DAYS)
+        self.first_candle = {
+            market: x for market, x in first_candle.items() if x[1] > expired
+        }
+        self.no_candle = {
+            market: {x: checked for x, checked in dates.items() if checked > expired}
+            for market, dates in no_candle.items()
+        }
+
+    def save_state(self, start_date: date):
+        """backfill 기간(start_date) 이전의 날짜는 더 이상 필요 없으므로 버리고 저장한다."""
+        self.first_candle = {
+            m: x for m, x in self.first_candle.items() if x[0] > start_date
+        }
+        self.no_candle = {
+            market: {x: checked for x, checked in dates.items() if x >= start_date}
+            for market, dates in self.no_candle.items()
+        }
+        self.no_candle = {
+            market: dates for market, dates in self.no_candle.items() if dates
+        }
+        state = {
+            "first_candle": {
+                market: list(map(str, x)) for market, x in self.first_candle.items()
+            },
+            "no_candle": {
+                market: {str(x): str(checked) for x, checked in sorted(dates.items())}
+                for market, dates in self.no_candle.items()
+            },
+        }
+        with atomic_path(self.state_path) as tmp, open(tmp, "w") as f:
+            json.dump(state, f)
+
+    def plan(
+        self, markets: list, target_date: date, threshold: int
+    ) -> Dict[str, List[Tuple[date, date]]]:
+        """market별 누락 날짜를 연속 구간 [(시작, 끝), ...]으로 묶는다. (당일 캔들은 제외)
+
+        대상은 markets와, 이미 적재된 market 중 현재 상장되어 있는 market이다.
+        첫 캔들 날짜 이전과 거래소에 캔들이 없다고 확인된 날짜는 누락으로 보지 않는다.
+        """
+        start_date = target_date - timedelta(days=threshold)
+        end_date = target_date - timedelta(days=1)
+        stored = self.get_stored_dates(start_date, end_date)
+
+        listed = set(self.client.crypto_markets["market"])
+        result = {}
+        for market in sorted(set(markets) | (set(stored) & listed)):
+            known = stored.get(market, set()) | self.no_candle.get(market, {}).keys()
+            first_date = max(
+                start_date, self.first_candle.get(market, (start_date,))[0]
+            )
+            missing = [
+                first_date + timedelta(days=i)
+                for i in range((end_date - first_date).days + 1)
+                if first_date + timedelta(days=i) not in known
+            ]
+            if missing:
+                result[market] = BigQueryCache.group_ranges(missing)
+        return result
+
+    def get_pages(
+        self, plan: Dict[str, List[Tuple[date, date]]]
+    ) -> List[Tuple[str, int, date]]:
+        """누락 구간을 (market, count, end_date) 캔들 요청 페이지로 나눈다.
+
+        캔들 API는 end_date 미만의 캔들을 주므로, 경계의 날짜 해석 차이에 대비해
+        구간마다 1개를 더 요청하고 결과는 fetch()에서 누락 날짜로 거른다.
+        """
+        pages = []
+        for market, ranges in plan.items():
+            for range_start, range_end in ranges:
+                end_date = range_end + timedelta(days=1)
+                remaining = (range_end - range_start).days + 2
+                while remaining > 0:
+                    count = min(self.PAGE_SIZE, remaining)
+                    pages += [(market, count, end_date)]
+                    end_date -= timedelta(days=count)
+                    remaining -= count
+        return pages
+
+    def fetch(
+        self, plan: Dict[str, List[Tuple[date, date]]]
+    ) -> Tuple[pd.DataFrame, Dict[str, date], Dict[str, Set[date]]]:
+        """
+        (누락 날짜의 캔들, market별 첫 캔들 날짜, market별 캔들이 없다고 확인된 날짜)
+
+        - 캔들이 없다고 확인하는 날짜는 온전한 페이지가 덮는 구간 안의 날짜뿐이다.
+          요청한 개수를 다 받았거나, 덜 받았어도 end_date 직전 날짜까지 이어진 페이지만 온전하다고 본다.
+        - 온전한 페이지가 요청한 개수보다 적게 오면 그보다 이전 캔들은 없는 것이므로 첫 캔들 날짜를 기록한다.
+        - 빈 페이지(상장 이전 구간 등)는 그 market에서 end_date 이전 캔들을 하나도 받지 못했을 때만
+          end_date를 첫 캔들 날짜로 기록한다. 일시적인 빈 응답일 수도 있으므로 이 기록도 MARKER_TTL_DAYS가 지나면 다시 조회한다.
+        - 페이지가 하나라도 실패한 market은 아무것도 확정하지 않는다. (다음 실행에서 다시 조회)
+        """
+        pages = self.get_pages(plan)
+        logger.info(f"backfill 페이지 {len(pages)}개 조회 ({len(plan)}개 market)")
+        fetched = self.client.get_candle_data_bulk(pages, ignore_errors=True)
+        failed = {page[0] for page, x in zip(pages, fetched) if x is None}
+        first_candle = {}
+        checked = {}  # market -> 온전한 페이지가 덮는 [(시작, 끝)]
+        empty = {}  # market -> 빈 페이지의 end_date 중 가장 늦은 날
+        for (market, count, end_date), x in zip(pages, fetched):
+            if x is not None and x.empty:
+                empty[market] = max(empty.get(market, date.min), end_date)
+            if x is None or x.empty:
+                continue
+            days = set(pd.to_datetime(x["candle_date_time_kst"]).dt.date)
+            latest = end_date - timedelta(days=1)
+            if len(days) != len(x) or max(days) > latest:
+                continue
+            if len(x) < count:
+                if max(days) != latest:
+                    continue
+                first_candle[market] = min(first_candle.get(market, date.max), *days)
+            checked.setdefault(market, []).append((min(days), latest))
+
+        fetched = [x for x in fetched if x is not None and not x.empty]
+        if fetched:
+            result = self.client.format_candle_data(pd.concat(fetched))
+            result = result.drop_duplicates(subset=["market", "reg_date"])
+        else:
+            result = pd.DataFrame(columns=["market", "reg_date"])
+        keys = list(zip(result["market"], pd.to_datetime(result["reg_date"]).dt.date))
+        returned = {}
+        for market, reg_date in keys:
+            returned.setdefault(market, set()).add(reg_date)
+
+        missing, no_candle = {}, {}
+        for market, ranges in plan.items():
+            missing[market] = {
+                range_start + timedelta(days=i)
+                for range_start, range_end in ranges
+                for i in range((range_end - range_start).days + 1)
+            }
+            if market in failed:
+                first_candle.pop(market, None)
+                continue
+            if market in empty and not any(
+                x < empty[market] for x in returned.get(market, ())
+            ):
+                first_candle[market] = max(
+                    first_candle.get(market, date.min), empty[market]
+                )
+            no_candle[market] = {
+                x
+                for x in missing[market] - returned.get(market, set())
+                if any(start <= x <= end for start, end in checked.get(market, ()))
+            }
+
+        # 계획된 누락 날짜만 남긴다. (이미 적재된 날짜와 겹치는 페이지 제거)
+        result = result.loc[[x in missing.get(market, ()) for market, x in keys]]
+        return result.reset_index(drop=True), first_candle, no_candle
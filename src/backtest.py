@@ -0,0 +1,455 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMRegressor
+
+from src.ctrend_model import (
+    LONG_Q,
+    RANDOM_STATE,
+    SHORT_Q,
+    CTRENDAllocator,
+    quantile_long_short,
+)
+from src.feature_store import DEFAULT_FEATURES, MARKOV_FEATURE
+
+logger = logging.getLogger(__name__)
+
+LABEL_COLS = ["reg_date", "market", "symbol"]
+# 목표값 y는 7행 뒤 종가로 계산하므로 label_date는 reg_date보다 최소 7일 뒤다. (학습 구간을 먼저 좁히는 데 쓴다)
+LABEL_HORIZON = 7
+# 거래 수수료(빗썸 원화 마켓 0.04%)
+FEE_RATE = 0.0004
+# regime은 전체 구간의 smoothed 확률과 전체 평균 cutoff로 정해지므로(미래 시세 사용) 백테스트에서는 뺀다.
+BACKTEST_FEATURES = tuple(x for x in DEFAULT_FEATURES if x != MARKOV_FEATURE)
+
+# 워커 프로세스가 memory map으로 여는 feature 행렬 (initializer에서 한 번만 연다)
+_matrix = None
+# /dev/shm이 있으면 feature 행렬 파일을 메모리(tmpfs)에 둔다.
+SHM_DIR = "/dev/shm"
+
+
+class FeatureMatrix:
+    """
+    get_features 결과를 학습용 연속 배열(X, y, 날짜, y의 종가 날짜, symbol/market 코드)로 바꾼 것.
+    X, y는 float32로 둔다. (LightGBM이 학습 시 float32로 변환하므로 결과는 같고 메모리는 절반)
+
+    save()한 .npy 파일을 워커 프로세스가 load(mmap_mode="r")로 열면
+    pickle 복사 없이 같은 페이지 캐시를 공유한다.
+    """
+
+    arrays = ("X", "y", "reg_date", "label_date", "symbol", "market", "complete")
+
+    def __init__(
+        self, X, y, reg_date, label_date, symbol, market, complete, meta: dict
+    ) -> None:
+        self.X = X
+        self.y = y
+        self.reg_date = reg_date  # datetime64[D]
+        self.label_date = (
+            label_date  # y에 쓴 종가의 날짜, datetime64[D] (y가 없으면 NaT)
+        )
+        self.symbol = symbol  # meta["symbols"]의 코드
+        self.market = market  # meta["markets"]의 코드
+        self.complete = complete  # feature와 y가 모두 있는 행 (학습 가능)
+        self.meta = meta
+        self.symbol_codes = {x: i for i, x in enumerate(meta["symbols"])}
+
+    @classmethod
+    def from_features(cls, features: pd.DataFrame) -> "FeatureMatrix":
+        feature_cols = [
+            x for x in features.columns if x not in LABEL_COLS + ["y", "label_date"]
+        ]
+        symbol = pd.Categorical(features["symbol"])
+        market = pd.Categorical(features["market"])
+        X = np.ascontiguousarray(features[feature_cols].to_numpy(dtype=np.float32))
+        y = features["y"].to_numpy(dtype=np.float32)
+        return cls(
+            X=X,
+            y=y,
+            reg_date=pd.to_datetime(features["reg_date"])
+            .to_numpy()
+            .astype("datetime64[D]"),
+            label_date=pd.to_datetime(features["label_date"])
+            .to_numpy()
+            .astype("datetime64[D]"),
+            symbol=symbol.codes.astype(np.int32),
+            market=market.codes.astype(np.int32),
+            complete=~np.isnan(X).any(axis=1) & ~np.isnan(y),
+            meta={
+                "feature_cols": feature_cols,
+                "symbols": list(symbol.categories),
+                "markets": list(market.categories),
+            },
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in self.arrays:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r") -> "FeatureMatrix":
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in cls.arrays
+        }
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(**arrays, meta=meta)
+
+    @contextmanager
+    def shared(self):
+        """행렬을 임시 디렉토리(가능하면 /dev/shm)에 저장하고 그 경로를 넘긴다. 끝나면 삭제한다."""
+        path = tempfile.mkdtemp(
+            prefix="feature_matrix_", dir=SHM_DIR if os.path.isdir(SHM_DIR) else None
+        )
+        try:
+            self.save(path)
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def get_rows(self, start: date, end: date, symbols: set) -> np.ndarray:
+        """reg_date가 [start, end]이고 symbol이 symbols에 속하는 행 번호"""
+        codes = [self.symbol_codes[x] for x in symbols if x in self.symbol_codes]
+        mask = (
+            (self.reg_date >= np.datetime64(start, "D"))
+            & (self.reg_date <= np.datetime64(end, "D"))
+            & np.isin(self.symbol, codes)
+        )
+        return np.flatnonzero(mask)
+
+    def get_train_rows(
+        self, train_date: date, train_size: int, symbols: set
+    ) -> np.ndarray:
+        """
+        train_date 시점에 y까지 확정된 학습 행 번호.
+        행이 빠진 market은 7행 뒤가 7일보다 뒤이므로 reg_date가 아니라 label_date로 거른다.
+        """
+        rows = self.get_rows(
+            start=train_date - timedelta(days=train_size + 1),
+            end=train_date - timedelta(days=LABEL_HORIZON),
+            symbols=symbols,
+        )
+        known = self.label_date[rows] <= np.datetime64(train_date, "D")
+        return rows[self.complete[rows] & known]
+
+
+def _init_worker(path: str):
+    global _matrix
+    _matrix = FeatureMatrix.load(path)
+
+
+def _fit_predict(
+    train_date: date,
+    inference_dates: List[date],
+    universes: List[set],
+    train_size: int,
+    params: dict,
+    n_jobs: int,
+) -> pd.DataFrame:
+    """train_date 시점에 알 수 있는 데이터로 학습하고 inference_dates 각각을 예측한다."""
+    train_rows = _matrix.get_train_rows(train_date, train_size, universes[0])
+
+    model = LGBMRegressor(
+        **{"random_state": RANDOM_STATE, "verbose": -1, **params, "n_jobs": n_jobs}
+    )
+    model.fit(_matrix.X[train_rows], _matrix.y[train_rows])
+
+    result = []
+    for inference_date, universe in zip(inference_dates, universes):
+        rows = _matrix.get_rows(inference_date, inference_date, universe)
+        if len(rows) == 0:
+            continue
+        result += [
+            pd.DataFrame(
+                {
+                    "reg_date": inference_date,
+                    "market": np.asarray(_matrix.meta["markets"])[_matrix.market[rows]],
+                    "symbol": np.asarray(_matrix.meta["symbols"])[_matrix.symbol[rows]],
+                    "real": _matrix.y[rows],
+                    "pred": model.predict(_matrix.X[rows]),
+                }
+            )
+        ]
+    return pd.concat(result) if result else pd.DataFrame()
+
+
+def get_thread_layout(n_tasks: int, max_workers: int = None) -> Tuple[int, int]:
+    """
+    (프로세스 수, 프로세스당 LightGBM 스레드 수)를 정한다.
+    프로세스 수 × 스레드 수가 코어 수를 넘지 않도록 해 oversubscription을 막는다.
+    """
+    n_cpus = os.cpu_count() or 1
+    n_workers = max(1, min(max_workers or n_cpus, n_tasks, n_cpus))
+    return n_workers, max(1, n_cpus // n_workers)
+
+
+def run_fit_tasks(matrix_path: str, tasks: List[dict], max_workers: int = None) -> list:
+    """_fit_predict 인자 목록을 프로세스 풀에서 실행하고 같은 순서로 결과를 반환한다."""
+    n_workers, n_jobs = get_thread_layout(len(tasks), max_workers)
+    logger.info(f"학습 {len(tasks)}회 (workers={n_workers}, n_jobs={n_jobs})")
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_worker, initargs=(matrix_path,)
+    ) as executor:
+        futures = [executor.submit(_fit_predict, **x, n_jobs=n_jobs) for x in tasks]
+        return [x.result() for x in futures]
+
+
+class WalkForwardBacktest:
+    """
+    CTRENDAllocator 전략의 walk-forward 백테스트.
+
+    - 시세/시가총액/공포탐욕지수는 로컬 BigQuery 캐시에서 한 번만 읽고(offline), feature도 한 번만 계산한다.
+      전체 구간을 보고 정해지는 regime 피처는 look-ahead bias가 생기므로 쓰지 않는다. (BACKTEST_FEATURES)
+    - retrain_every일마다 그 시점까지 확정된 데이터로 모델을 다시 학습하고,
+      다음 학습 시점 전까지의 날짜를 같은 모델로 예측한다. 학습은 프로세스 풀로 병렬 처리한다.
+    - 예측 결과에 quantile_long_short를 적용해 매일 종가에 숏 후보 전량 매도,
+      expire_range일이 지난 lot 매도, 롱 후보 균등 매수를 시뮬레이션한다.
+    """
+
+    def __init__(
+        self,
+        start_date: date,
+        end_date: date,
+        train_size: int = 365 * 2,
+        retrain_every: int = 7,
+        expire_range: int = 40,
+        long_q: float = LONG_Q,
+        short_q: float = SHORT_Q,
+        except_cryptos: tuple = ("KRW-BTC",),
+        initial_cash: float = 10_000_000,
+        fee_rate: float = FEE_RATE,
+        max_workers: int = None,
+        params: dict = None,
+    ) -> None:
+        self.start_date = start_date
+        self.end_date = end_date
+        self.train_size = train_size
+        self.retrain_every = retrain_every
+        self.expire_range = expire_range
+        self.long_q = long_q
+        self.short_q = short_q
+        self.except_cryptos = except_cryptos
+        self.initial_cash = initial_cash
+        self.fee_rate = fee_rate
+        self.max_workers = max_workers
+        self.params = params or {}  # LGBMRegressor 파라미터
+        self.allocator = CTRENDAllocator(
+            train_size=train_size,
+            offline=True,
+            features=BACKTEST_FEATURES,
+            feature_cache=False,  # 일일 파이프라인의 피처 캐시를 건드리지 않는다.
+        )
+
+    def load_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """백테스트 전 구간의 시세와 날짜별 시가총액 universe를 캐시에서 읽는다."""
+        raw_start = self.start_date - timedelta(days=self.train_size + 1)
+        raw_bithumb = self.allocator.get_bithumb_raw_from_bq(
+            start_date=raw_start, end_date=self.end_date
+        )
+        raw_marketcap = self.allocator.get_marketcaps_from_bq(
+            start_date=self.start_date, target_date=self.end_date, lower_bound=1000000
+        )
+        if raw_bithumb.empty or raw_marketcap.empty:
+            raise ValueError(
+                "로컬 캐시에 백테스트 구간 데이터가 없습니다. 먼저 온라인으로 한 번 조회해 주세요."
+            )
+        raw_marketcap["reg_date"] = pd.to_datetime(raw_marketcap["reg_date"]).dt.date
+        return raw_bithumb, raw_marketcap
+
+    def get_schedule(self, dates: List[date]) -> List[List[date]]:
+        """예측 날짜를 retrain_every일 단위로 묶는다. 각 묶음의 첫 날이 학습 시점이다."""
+        schedule = []
+        for _date in dates:
+            if schedule and (_date - schedule[-1][0]).days < self.retrain_every:
+                schedule[-1] += [_date]
+            else:
+                schedule += [[_date]]
+        return schedule
+
+    def get_fit_tasks(self, universe_by_date: dict, params: dict = None) -> List[dict]:
+        dates = sorted(
+            x for x in universe_by_date if self.start_date <= x <= self.end_date
+        )
+        return [
+            dict(
+                train_date=chunk[0],
+                inference_dates=chunk,
+                universes=[universe_by_date[x] for x in chunk],
+                train_size=self.train_size,
+                params=params or {},
+            )
+            for chunk in self.get_schedule(dates)
+        ]
+
+    def get_predictions(
+        self, features: pd.DataFrame, universe_by_date: dict
+    ) -> pd.DataFrame:
+        tasks = self.get_fit_tasks(universe_by_date, self.params)
+        with FeatureMatrix.from_features(features).shared() as path:
+            result = run_fit_tasks(path, tasks, self.max_workers)
+        return pd.concat(result).reset_index(drop=True)
+
+    def simulate(
+        self, predictions: pd.DataFrame, closes: pd.DataFrame
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        매 예측일 종가에 (1) 숏 후보 전량 매도 (2) 만기 lot 매도 (3) 남은 현금으로 롱 후보 균등 매수를 한다.
+        closes는 reg_date × market 종가 표이며, 가격이 없는 날은 직전 종가로 평가한다.
+        """
+        closes = closes.ffill()
+        cash = self.initial_cash
+        lots = defaultdict(list)  # market -> [[매수일, 수량], ...]
+        pred_by_date = dict(tuple(predictions.groupby("reg_date")))
+
+        history, trades = [], []
+        for _date in closes.index[closes.index >= self.start_date]:
+            prices = closes.loc[_date]
+            traded = 0.0
+            pred = pred_by_date.get(_date)
+            if pred is not None:
+                long, short = quantile_long_short(
+                    pred, col="pred", long_q=self.long_q, short_q=self.short_q
+                )
+                cutoff = _date - timedelta(days=self.expire_range)
+                short_markets = set(short["market"])
+                for market in list(lots):
+                    price = prices.get(market, np.nan)
+                    if np.isnan(price):
+                        continue
+                    if market in short_markets:
+                        sold = lots.pop(market)
+                    else:
+                        sold = [x for x in lots[market] if x[0] <= cutoff]
+                        lots[market] = [x for x in lots[market] if x[0] > cutoff]
+                        if not lots[market]:
+                            del lots[market]
+                    volume = sum(x[1] for x in sold)
+                    if volume > 0:
+                        cash += volume * price * (1 - self.fee_rate)
+                        traded += volume * price
+                        trades += [(_date, market, "sell", volume * price)]
+
+                buys = [
+                    x
+                    for x in long["market"]
+                    if x not in self.except_cryptos
+                    and not np.isnan(prices.get(x, np.nan))
+                ]
+                if buys:
+                    budget = cash / len(buys)
+                    for market in buys:
+                        lots[market] += [
+                            [_date, budget * (1 - self.fee_rate) / prices[market]]
+                        ]
+                        trades += [(_date, market, "buy", budget)]
+                    traded += cash
+                    cash = 0.0
+
+            holdings = sum(
+                sum(x[1] for x in market_lots) * prices.get(market, 0)
+                for market, market_lots in lots.items()
+            )
+            nav = cash + holdings
+            history += [(_date, nav, cash, traded / nav if nav else 0.0)]
+
+        history = pd.DataFrame(
+            history, columns=["reg_date", "nav", "cash", "turnover"]
+        ).set_index("reg_date")
+        history["return"] = (
+            history["nav"]
+            .pct_change()
+            .fillna(history["nav"].iloc[0] / self.initial_cash - 1)
+        )
+        trades = pd.DataFrame(trades, columns=["reg_date", "market", "side", "amount"])
+        return history, trades
+
+    def get_report(self, history: pd.DataFrame, predictions: pd.DataFrame) -> dict:
+        returns = history["return"]
+        drawdown = history["nav"] / history["nav"].cummax() - 1
+        n_days = len(history)
+
+        hits = defaultdict(list)
+        for _, pred in predictions.dropna(subset=["real"]).groupby("reg_date"):
+            long, short = quantile_long_short(
+                pred, col="pred", long_q=self.long_q, short_q=self.short_q
+            )
+            hits["long"] += (long["real"] > 0).tolist()
+            hits["short"] += (short["real"] < 0).tolist()
+
+        return {
+            "total_return": history["nav"].iloc[-1] / self.initial_cash - 1,
+            "cagr": (history["nav"].iloc[-1] / self.initial_cash) ** (365 / n_days) - 1,
+            "volatility": returns.std() * np.sqrt(365),
+            "sharpe": returns.mean() / returns.std() * np.sqrt(365)
+            if returns.std()
+            else np.nan,
+            "max_drawdown": drawdown.min(),
+            "avg_turnover": history["turnover"].mean(),
+            "long_hit_rate": np.mean(hits["long"]) if hits["long"] else np.nan,
+            "short_hit_rate": np.mean(hits["short"]) if hits["short"] else np.nan,
+            "n_days": n_days,
+        }
+
+    def run(self) -> dict:
+        raw_bithumb, raw_marketcap = self.load_data()
+        # feature는 백테스트 전 구간에 대해 한 번만 계산한다.
+        features = self.allocator.get_features(raw_bithumb)
+        universe_by_date = (
+            raw_marketcap.groupby("reg_date")["symbol"].agg(set).to_dict()
+        )
+
+        predictions = self.get_predictions(features, universe_by_date)
+        closes = raw_bithumb.pivot(index="reg_date", columns="market", values="close")
+        closes = closes.loc[closes.index <= self.end_date]
+        history, trades = self.simulate(predictions, closes)
+        return {
+            "report": self.get_report(history, predictions),
+            "history": history,
+            "trades": trades,
+            "predictions": predictions,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="CTREND 전략 walk-forward 백테스트 (로컬 캐시 사용)"
+    )
+    parser.add_argument("--start-date", required=True, type=date.fromisoformat)
+    parser.add_argument("--end-date", required=True, type=date.fromisoformat)
+    parser.add_argument("--train-size", type=int, default=365 * 2)
+    parser.add_argument("--retrain-every", type=int, default=7)
+    parser.add_argument("--expire-range", type=int, default=40)
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    backtest = WalkForwardBacktest(
+        start_date=args.start_date,
+        end_date=args.end_date,
+        train_size=args.train_size,
+        retrain_every=args.retrain_every,
+        expire_range=args.expire_range,
+        max_workers=args.max_workers,
+    )
+    result = backtest.run()
+    print(f"[{datetime.now()}] 백테스트 결과")
+    for key, value in result["report"].items():
+        print(
+            f"{key:>16}: {value:.4f}"
+            if isinstance(value, float)
+            else f"{key:>16}: {value}"
+        )
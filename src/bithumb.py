@@ -3,36 +3,98 @@ import json
 import logging
 import time
 import uuid
-from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
 from urllib.parse import urlencode, urljoin
 
 import jwt
 import pandas as pd
-import requests
 
-from src.config.env import BITHUMB_KEY, BITHUMB_SECRET
+from src.config.env import (
+    BITHUMB_API_URL,
+    BITHUMB_FETCH_WORKERS,
+    BITHUMB_KEY,
+    BITHUMB_SECRET,
+    TRADE_JOURNAL_ENABLED,
+)
 from src.config.helper import log_method_call
-from src.connection.bigquery import get_bq_conn
+from src.connection.http import EndpointPolicy, TokenBucket, get_http_transport
+from src.metrics import get_metrics_registry
+from src.trade_journal import TradeJournal
 
 logger = logging.getLogger(__name__)
 headers = {"accept": "application/json"}
-bq_conn = get_bq_conn()
 bithumb_client = None  # 전역 BithumbClient 객체
+# 빗썸 Public API 호출 제한(초당 150회)에 여유를 둔 값
+PUBLIC_API_RATE = 135
+PUBLIC_API_BURST = 15
+# 빗썸 Private API(주문/조회) 호출 제한(초당 140회)에 여유를 둔 값
+PRIVATE_API_RATE = 120
+PRIVATE_API_BURST = 10
+# endpoint별 timeout(connect, read)/재시도 정책 (주문은 중복 체결을 막기 위해 재시도하지 않는다)
+ENDPOINT_POLICIES = {
+    "bithumb.markets": EndpointPolicy(timeout=(3.05, 10), retries=3),
+    "bithumb.candles": EndpointPolicy(timeout=(3.05, 10), retries=3),
+    "bithumb.ticker": EndpointPolicy(timeout=(3.05, 5), retries=2),
+    "bithumb.accounts": EndpointPolicy(timeout=(3.05, 10), retries=2),
+    "bithumb.orders.chance": EndpointPolicy(timeout=(3.05, 10), retries=2),
+    "bithumb.orders": EndpointPolicy(timeout=(3.05, 10), retries=0),
+    "bithumb.order": EndpointPolicy(timeout=(3.05, 90), retries=3),
+}
 
 
 class BithumbClient:
-    def __init__(self) -> None:
-        self.base_url = "https://api.bithumb.com"
+    def __init__(
+        self,
+        base_url: str = BITHUMB_API_URL,
+        max_workers: int = BITHUMB_FETCH_WORKERS,
+        journal: bool = TRADE_JOURNAL_ENABLED,
+    ) -> None:
+        self.base_url = base_url
         self.bithumb_key = BITHUMB_KEY
         self.bithumb_secret = BITHUMB_SECRET
+        # 캔들 조회 등 Public API는 커넥션 풀과 호출 제한을 스레드 간에 공유한다.
+        self.max_workers = max_workers
+        self.http = get_http_transport()
+        self.http.mount(base_url, pool_size=max_workers)
+        for endpoint, policy in ENDPOINT_POLICIES.items():
+            self.http.set_policy(endpoint, policy)
+        self.public_limiter = TokenBucket(
+            rate=PUBLIC_API_RATE, capacity=PUBLIC_API_BURST
+        )
+        self.private_limiter = TokenBucket(
+            rate=PRIVATE_API_RATE, capacity=PRIVATE_API_BURST
+        )
+        self.trade_journal = (
+            TradeJournal(fetch_order=lambda x: self.get_trade_history_by_uuid(id=x))
+            if journal
+            else None
+        )
         self.crypto_markets = self.get_crypto_markets()
 
+    def get_auth_header(self, params: dict = None) -> dict:
+        """Private API용 Authorization 헤더. 재시도마다 새 nonce/timestamp로 서명해야 하므로 요청 시도마다 만든다."""
+        payload = {
+            "access_key": self.bithumb_key,
+            "nonce": str(uuid.uuid4()),
+            "timestamp": round(time.time() * 1000),
+        }
+        if params:
+            query = urlencode(params).encode()
+            hash = hashlib.sha512()
+            hash.update(query)
+            payload["query_hash"] = hash.hexdigest()
+            payload["query_hash_alg"] = "SHA512"
+        jwt_token = jwt.encode(payload, self.bithumb_secret)
+        return {"Authorization": "Bearer {}".format(jwt_token)}
+
     @log_method_call
     def get_crypto_markets(self) -> pd.DataFrame:
         end_point = "v1/market/all"
         url = urljoin(self.base_url, end_point)
-        response = requests.get(url, headers=headers).json()
-        return pd.DataFrame(response)
+        response = self.http.get(url, endpoint="bithumb.markets", headers=headers)
+        return pd.DataFrame(response.json())
 
     def get_candle_data(self, market: list, count: int, end_date: date):
         """
@@ -46,9 +108,52 @@ class BithumbClient:
             "count": count,
             "to": end_date.strftime("%Y-%m-%d 00:00:00"),
         }
-        response = requests.get(url, headers=headers, params=params).json()
+        self.public_limiter.acquire()
+        response = self.http.get(
+            url, endpoint="bithumb.candles", headers=headers, params=params
+        ).json()
+        return pd.DataFrame(response)
+
+    def get_minute_candle_data(
+        self, market: str, count: int, end_time: datetime, unit: int = 1
+    ) -> pd.DataFrame:
+        """
+        분봉 데이터 정보(end_time(KST) 미만으로 count 만큼 출력)
+        캔들 개수(최대 200개까지 요청 가능)
+        """
+        end_point = f"v1/candles/minutes/{unit}"
+        url = urljoin(self.base_url, end_point)
+        params = {
+            "market": market,
+            "count": count,
+            "to": end_time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.public_limiter.acquire()
+        response = self.http.get(
+            url, endpoint="bithumb.candles", headers=headers, params=params
+        ).json()
         return pd.DataFrame(response)
 
+    def get_candle_data_bulk(
+        self, targets: List[Tuple[str, int, date]], ignore_errors: bool = False
+    ) -> List[pd.DataFrame]:
+        """
+        여러 (market, count, end_date) 요청을 스레드 풀로 동시에 조회한다.
+        결과는 targets 순서와 같으며, ignore_errors=True면 실패한 요청은 None으로 채운다.
+        """
+
+        def fetch(target):
+            try:
+                return self.get_candle_data(*target)
+            except Exception as e:
+                if not ignore_errors:
+                    raise
+                logger.warning(f"캔들 조회 실패: {target[0]} ({e})")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(fetch, targets))
+
     @log_method_call
     def get_current_price(self, market_list: list) -> pd.DataFrame:
         """현재가 정보
@@ -58,7 +163,10 @@ class BithumbClient:
         end_point = "v1/ticker"
         url = urljoin(self.base_url, end_point)
         markets = ", ".join(market_list)
-        response = requests.get(url, headers=headers, params={"markets": markets})
+        self.public_limiter.acquire()
+        response = self.http.get(
+            url, endpoint="bithumb.ticker", headers=headers, params={"markets": markets}
+        )
         return pd.DataFrame(response.json())
 
     @log_method_call
@@ -66,26 +174,25 @@ class BithumbClient:
         """전체 계좌 조회"""
         end_point = "v1/accounts"
         url = urljoin(self.base_url, end_point)
-        # Generate access token
-        payload = {
-            "access_key": self.bithumb_key,
-            "nonce": str(uuid.uuid4()),
-            "timestamp": round(time.time() * 1000),
-        }
-        jwt_token = jwt.encode(payload, self.bithumb_secret)
-        authorization_token = "Bearer {}".format(jwt_token)
-        auth_headers = {"Authorization": authorization_token}
         # Call API
-        response = requests.get(url=url, headers=auth_headers)
+        self.private_limiter.acquire()
+        response = self.http.get(
+            url, endpoint="bithumb.accounts", auth=lambda: self.get_auth_header()
+        )
         response.raise_for_status()
         result = pd.DataFrame(response.json())
         result["balance"] = result["balance"].astype("Float64")
         result["avg_buy_price"] = result["avg_buy_price"].astype("Float64")
-        result["locked"] = result["locked"].astype("Int64")
+        result["locked"] = result["locked"].astype("Float64")
         result["avg_buy_price_modified"] = result["avg_buy_price_modified"].astype(bool)
         except_elements = ["P", "LUNA2", "LUNC"]
         return result.loc[~result["currency"].isin(except_elements)]
 
+    def get_krw_balance(self) -> float:
+        """주문 가능한 KRW 잔고"""
+        account = self.get_account_info()
+        return float(account.loc[account["currency"] == "KRW", "balance"].sum())
+
     @log_method_call
     def get_orderable_info(self, market) -> dict:
         """가상화폐 주문 가능 정보
@@ -96,27 +203,15 @@ class BithumbClient:
         param = {"market": market}
 
         end_point = "/v1/orders/chance"
-        # Generate access token
-        query = urlencode(param).encode()
-        hash = hashlib.sha512()
-        hash.update(query)
-        query_hash = hash.hexdigest()
-        payload = {
-            "access_key": self.bithumb_key,
-            "nonce": str(uuid.uuid4()),
-            "timestamp": round(time.time() * 1000),
-            "query_hash": query_hash,
-            "query_hash_alg": "SHA512",
-        }
-        jwt_token = jwt.encode(payload, self.bithumb_secret)
-        authorization_token = "Bearer {}".format(jwt_token)
-        headers = {
-            "Authorization": authorization_token,
-            "Content-Type": "application/json",
-        }
         url = urljoin(self.base_url, end_point)
         # Call API
-        return requests.get(url, params=param, headers=headers).json()
+        return self.http.get(
+            url,
+            endpoint="bithumb.orders.chance",
+            params=param,
+            headers={"Content-Type": "application/json"},
+            auth=lambda: self.get_auth_header(param),
+        ).json()
 
     @log_method_call
     def exceute_order(
@@ -147,45 +242,34 @@ class BithumbClient:
         if price:
             requestBody["price"] = price
 
-        # Generate access token
-        query = urlencode(requestBody).encode()
-        hash = hashlib.sha512()
-        hash.update(query)
-        query_hash = hash.hexdigest()
-        payload = {
-            "access_key": self.bithumb_key,
-            "nonce": str(uuid.uuid4()),
-            "timestamp": round(time.time() * 1000),
-            "query_hash": query_hash,
-            "query_hash_alg": "SHA512",
-        }
-        jwt_token = jwt.encode(payload, self.bithumb_secret)
-        authorization_token = "Bearer {}".format(jwt_token)
-        auth_headers = {
-            "Authorization": authorization_token,
-            "Content-Type": "application/json",
-        }
         end_point = "v1/orders"
         url = urljoin(self.base_url, end_point)
-        # Call API
-        response = requests.post(
-            url, data=json.dumps(requestBody), headers=auth_headers
+        # Call API (주문은 중복 체결을 막기 위해 재시도하지 않는다)
+        self.private_limiter.acquire()
+        response = self.http.post(
+            url,
+            endpoint="bithumb.orders",
+            data=json.dumps(requestBody),
+            headers={"Content-Type": "application/json"},
+            auth=lambda: self.get_auth_header(requestBody),
         )
         data = response.json()
         if "error" in data:
             logger.error(
                 f"[ERROR] 주문 실패: {data['error']['message']} ({data['error']['name']})"
             )
+            get_metrics_registry().counter(
+                "exchange_order_errors_total",
+                "거래소 주문 오류 응답 수",
+                exchange="bithumb",
+                name=data["error"]["name"],
+            ).inc()
             if data["error"]["name"] == "under_min_total_ask":
                 return data
             response.raise_for_status()
-        trade_log = self.get_trade_history_by_uuid(id=data["uuid"])
-        df = pd.DataFrame(
-            [{"uuid": data["uuid"], "type": type, "market": market, "data": trade_log}]
-        )
-        bq_conn.insert_using_stream(
-            df, table_id="trade_history", data_set="crypto_fluxor"
-        )
+        # 체결 내역 조회·적재는 trade journal이 백그라운드에서 처리한다.
+        if self.trade_journal is not None:
+            self.trade_journal.submit(uuid=data["uuid"], type=type, market=market)
         return data
 
     @log_method_call
@@ -193,24 +277,24 @@ class BithumbClient:
         start_date = target_date - timedelta(days=threshold)
 
         # start_date 시점에 있는 ticker 확인
-        result = []
         raw_market_list = self.get_crypto_markets()["market"]
-        for _ticker in raw_market_list:
-            try:
-                tmp = self.get_candle_data(_ticker, 1, start_date)
-                result += [tmp]
-            except:
-                continue
-        result = pd.concat(result)
+        result = self.get_candle_data_bulk(
+            [(_ticker, 1, start_date) for _ticker in raw_market_list],
+            ignore_errors=True,
+        )
+        result = pd.concat([x for x in result if x is not None])
         return result
 
     @log_method_call
     def get_raw_data_1d(self, target_cryptos: list, target_date) -> pd.DataFrame:
-        raw = []
-        for _ticker in target_cryptos:
-            tmp = self.get_candle_data(_ticker, 1, target_date)
-            raw += [tmp]
-        raw = pd.concat(raw)
+        raw = self.get_candle_data_bulk(
+            [(_ticker, 1, target_date) for _ticker in target_cryptos]
+        )
+        return self.format_candle_data(pd.concat(raw))
+
+    def format_candle_data(self, raw: pd.DataFrame) -> pd.DataFrame:
+        """캔들 API 응답을 bithumb_crypto_1d 테이블 형식으로 변환한다."""
+        raw = raw.copy()
         raw["candle_date_time_kst"] = pd.to_datetime(raw["candle_date_time_kst"])
         raw["reg_date"] = raw["candle_date_time_kst"]
         raw = raw.drop(
@@ -234,65 +318,20 @@ class BithumbClient:
         raw = raw.sort_values(by=["reg_date", "market"]).reset_index(drop=True)
         return raw
 
-    @log_method_call
-    def backfill_data_1d(
-        self, target_market: str, target_date: date, threshold: int = 600
-    ):
-        divide = 100
-        result = []
-        for i in range(threshold // divide):
-            tmp = target_date - timedelta(days=i * divide)
-            result += [
-                self.get_candle_data([target_market], count=divide, end_date=tmp)
-            ]
-
-        result = pd.concat(result).reset_index(drop=True)
-        result["candle_date_time_kst"] = pd.to_datetime(result["candle_date_time_kst"])
-        result["reg_date"] = result["candle_date_time_kst"]
-        result = result.drop(
-            columns=[
-                "candle_date_time_kst",
-                "candle_date_time_utc",
-                "timestamp",
-                "prev_closing_price",
-            ]
-        )
-        result = result.rename(
-            columns={
-                "opening_price": "open",
-                "trade_price": "close",
-                "high_price": "high",
-                "low_price": "low",
-                "candle_acc_trade_volume": "volume",
-                "candle_acc_trade_price": "acc_trade_sum",
-            }
-        )
-        return result.sort_values(by=["reg_date", "market"]).reset_index(drop=True)
-
     def get_trade_history_by_uuid(self, id: str) -> dict:
         end_point = "v1/order"
         url = urljoin(self.base_url, end_point)
         # Set API parameters
         param = {"uuid": id}
 
-        # Generate access token
-        query = urlencode(param).encode()
-        hash = hashlib.sha512()
-        hash.update(query)
-        query_hash = hash.hexdigest()
-        payload = {
-            "access_key": self.bithumb_key,
-            "nonce": str(uuid.uuid4()),
-            "timestamp": round(time.time() * 1000),
-            "query_hash": query_hash,
-            "query_hash_alg": "SHA512",
-        }
-        jwt_token = jwt.encode(payload, self.bithumb_secret)
-        authorization_token = "Bearer {}".format(jwt_token)
-        headers = {"Authorization": authorization_token}
-
         # Call API
-        response = requests.get(url, params=param, headers=headers, timeout=90)
+        self.private_limiter.acquire()
+        response = self.http.get(
+            url,
+            endpoint="bithumb.order",
+            params=param,
+            auth=lambda: self.get_auth_header(param),
+        )
         response.raise_for_status()
         # handle to success or fail
         return response.json()
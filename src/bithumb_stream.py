@@ -0,0 +1,475 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import pandas as pd
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from src.config.env import BITHUMB_WS_URL
+
+logger = logging.getLogger(__name__)
+
+KST_OFFSET_MS = 9 * 60 * 60 * 1000
+INTERVAL_MS = {"1m": 60 * 1000, "1h": 60 * 60 * 1000, "1d": 24 * 60 * 60 * 1000}
+# bithumb_crypto_1d 적재 형식(format_candle_data)과 같은 컬럼 이름
+BAR_COLUMNS = [
+    "reg_date",
+    "market",
+    "open",
+    "close",
+    "high",
+    "low",
+    "volume",
+    "acc_trade_sum",
+]
+
+
+def floor_ms(ts_ms: int, interval: str) -> int:
+    """epoch ms를 KST 기준 봉 시작 시각(epoch ms)으로 내린다. (일봉은 KST 00:00 기준)"""
+    size = INTERVAL_MS[interval]
+    return (ts_ms + KST_OFFSET_MS) // size * size - KST_OFFSET_MS
+
+
+def to_kst(ts_ms: int) -> datetime:
+    """epoch ms → KST naive datetime (캔들 API의 candle_date_time_kst와 같은 형식)"""
+    return datetime(1970, 1, 1) + timedelta(milliseconds=ts_ms + KST_OFFSET_MS)
+
+
+class _Bar:
+    """OHLCV 봉 하나. first/last는 open/close 값이 나온 시각(ms)으로, 합치는 순서와 무관하게 open/close를 정한다."""
+
+    __slots__ = (
+        "start",
+        "open",
+        "high",
+        "low",
+        "close",
+        "volume",
+        "amount",
+        "first",
+        "last",
+    )
+
+    def __init__(self, start, open, high, low, close, volume, amount, first, last):
+        self.start = start
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.amount = amount
+        self.first = first
+        self.last = last
+
+    @classmethod
+    def from_trade(cls, start: int, ts_ms: int, price: float, volume: float) -> "_Bar":
+        return cls(
+            start, price, price, price, price, volume, price * volume, ts_ms, ts_ms
+        )
+
+    def merge(self, other: "_Bar"):
+        if other.first < self.first:
+            self.open, self.first = other.open, other.first
+        if other.last >= self.last:
+            self.close, self.last = other.close, other.last
+        self.high = max(self.high, other.high)
+        self.low = min(self.low, other.low)
+        self.volume += other.volume
+        self.amount += other.amount
+
+    def copy(self) -> "_Bar":
+        return _Bar(*(getattr(self, x) for x in self.__slots__))
+
+    def to_row(self, market: str) -> tuple:
+        return (
+            to_kst(self.start),
+            market,
+            self.open,
+            self.close,
+            self.high,
+            self.low,
+            self.volume,
+            self.amount,
+        )
+
+
+class BarAggregator:
+    """
+    체결을 market별 분봉으로 집계하고, 마감된 분봉을 상위 봉(시간봉/일봉)에 합친다.
+
+    - 상위 봉은 마감된 분봉으로만 만든다. 재연결 후 REST 분봉으로 끊긴 구간을 채워도
+      같은 체결이 상위 봉에 두 번 들어가지 않는다.
+    - 분봉은 다음 분의 체결이 오거나 close_until()의 시각이 지나면 마감된다.
+    - 마감된 봉은 drain()으로 꺼낼 때까지 interval별로 쌓인다.
+    """
+
+    def __init__(self, intervals: Iterable[str] = ("1m", "1h", "1d")) -> None:
+        self.intervals = ["1m"] + [x for x in intervals if x != "1m"]
+        self.higher = self.intervals[1:]
+        self.bars: Dict[Tuple[str, str], _Bar] = {}  # (interval, market) → 진행 중인 봉
+        self.closed: Dict[str, List[tuple]] = {x: [] for x in self.intervals}
+        # 이 시각 이전의 분봉은 모두 마감됨 (close_until 기준 / market별 다음 분 체결 기준)
+        self.watermark = 0
+        self.closed_until: Dict[str, int] = {}
+        self.dropped = 0  # 이미 마감된 분봉에 늦게 도착해 버린 체결 수
+
+    def is_closed(self, market: str, start: int) -> bool:
+        return start < max(self.watermark, self.closed_until.get(market, 0))
+
+    def add_trade(self, market: str, ts_ms: int, price: float, volume: float) -> bool:
+        start = floor_ms(ts_ms, "1m")
+        if self.is_closed(market, start):
+            self.dropped += 1
+            return False
+        self.add_minute(
+            market, _Bar.from_trade(start, ts_ms, price, volume), replace=False
+        )
+        return True
+
+    def add_candle(self, market: str, bar: _Bar) -> bool:
+        """REST로 받은 분봉을 반영한다. 진행 중인 같은 분의 봉은 REST 값으로 덮어쓴다."""
+        if self.is_closed(market, bar.start):
+            return False
+        self.add_minute(market, bar, replace=True)
+        return True
+
+    def add_minute(self, market: str, bar: _Bar, replace: bool):
+        current = self.bars.get(("1m", market))
+        if current is not None and current.start < bar.start:
+            self.close_minute(market)
+            current = None
+        if current is None or replace:
+            self.bars[("1m", market)] = bar
+        else:
+            current.merge(bar)
+
+    def close_minute(self, market: str):
+        bar = self.bars.pop(("1m", market))
+        self.closed["1m"].append(bar.to_row(market))
+        self.closed_until[market] = bar.start + INTERVAL_MS["1m"]
+        for interval in self.higher:
+            start = floor_ms(bar.start, interval)
+            current = self.bars.get((interval, market))
+            if current is not None and current.start < start:
+                self.closed[interval].append(
+                    self.bars.pop((interval, market)).to_row(market)
+                )
+                current = None
+            if current is None:
+                self.bars[(interval, market)] = bar.copy()
+                self.bars[(interval, market)].start = start
+            else:
+                current.merge(bar)
+
+    def close_until(self, ts_ms: int):
+        """ts_ms 이전에 끝난 봉을 모두 마감한다. (체결이 없는 market의 봉 마감용)"""
+        self.watermark = max(self.watermark, floor_ms(ts_ms, "1m"))
+        for interval, market in list(self.bars):
+            if (
+                interval == "1m"
+                and self.bars[("1m", market)].start + INTERVAL_MS["1m"] <= ts_ms
+            ):
+                self.close_minute(market)
+        for interval, market in list(self.bars):
+            bar = self.bars[(interval, market)]
+            if interval != "1m" and bar.start + INTERVAL_MS[interval] <= ts_ms:
+                self.closed[interval].append(
+                    self.bars.pop((interval, market)).to_row(market)
+                )
+
+    def drain(self, interval: str) -> List[tuple]:
+        rows, self.closed[interval] = self.closed[interval], []
+        return rows
+
+    def snapshot(self, interval: str) -> pd.DataFrame:
+        """진행 중인 봉(아직 마감 전인 분봉 포함)을 표로 돌려준다. (장중 신호 계산용)"""
+        rows = []
+        for (bar_interval, market), bar in self.bars.items():
+            if bar_interval != interval:
+                continue
+            bar = bar.copy()
+            minute = self.bars.get(("1m", market))
+            if (
+                interval != "1m"
+                and minute is not None
+                and floor_ms(minute.start, interval) == bar.start
+            ):
+                bar.merge(minute)
+            rows += [bar.to_row(market)]
+        if interval != "1m":
+            # 상위 봉이 아직 없는 market (첫 분봉이 진행 중)
+            for (bar_interval, market), minute in self.bars.items():
+                if bar_interval == "1m" and (interval, market) not in self.bars:
+                    bar = minute.copy()
+                    bar.start = floor_ms(minute.start, interval)
+                    rows += [bar.to_row(market)]
+        return pd.DataFrame(rows, columns=BAR_COLUMNS)
+
+
+class BithumbTradeStream:
+    """
+    빗썸 WebSocket 체결(trade) 스트림을 구독해 분봉/시간봉/일봉을 메모리에서 집계한다.
+
+    - 마감된 봉은 flush_interval초마다 interval별로 모아 sink(기본: BigQuery MERGE)에 한 번에 적재한다.
+    - 연결이 끊기면 backoff 후 재연결하고, 재구독 직후 끊긴 구간의 분봉을 REST 캔들 API로 채운 뒤
+      체결 처리를 재개한다. (시작할 때는 당일 00:00(KST)부터 채워 일봉/시간봉을 완성한다.)
+    - url/client/sink를 주입할 수 있어 로컬 가짜 WebSocket 서버로 돌려볼 수 있다.
+    """
+
+    def __init__(
+        self,
+        markets: List[str],
+        url: str = BITHUMB_WS_URL,
+        client=None,
+        sink: Callable[[str, pd.DataFrame], None] = None,
+        intervals: Iterable[str] = ("1m", "1h", "1d"),
+        flush_interval: float = 60,
+        grace_sec: float = 2,
+        max_reconnect_delay: float = 30,
+        data_set: str = "crypto_fluxor",
+    ) -> None:
+        self.markets = list(markets)
+        self.url = url
+        self.client = client
+        self.sink = sink or self.store_bars
+        self.aggregator = BarAggregator(intervals)
+        self.flush_interval = flush_interval
+        self.grace_ms = int(grace_sec * 1000)
+        self.max_reconnect_delay = max_reconnect_delay
+        self.data_set = data_set
+        self.connected = False
+        # 다음 연결 때 REST로 채울 구간의 시작 (None이면 채우지 않음)
+        self.gap_start = floor_ms(self.now_ms(), "1d")
+
+    @staticmethod
+    def now_ms() -> int:
+        return int(time.time() * 1000)
+
+    def get_subscribe_message(self) -> list:
+        return [
+            {"ticket": str(uuid.uuid4())},
+            {"type": "trade", "codes": self.markets, "isOnlyRealtime": True},
+            {"format": "DEFAULT"},
+        ]
+
+    def on_message(self, message):
+        data = json.loads(message)
+        if "error" in data:
+            logger.warning(f"WebSocket 오류 응답: {data['error']}")
+            return
+        if data.get("type") != "trade" or data.get("stream_type") == "SNAPSHOT":
+            return
+        self.aggregator.add_trade(
+            data["code"],
+            int(data["trade_timestamp"]),
+            float(data["trade_price"]),
+            float(data["trade_volume"]),
+        )
+
+    async def run(self, stop: asyncio.Event = None):
+        """stop이 set될 때까지 구독한다. 종료 시 마감된 봉은 모두 flush한다."""
+        stop = stop or asyncio.Event()
+        tasks = [
+            asyncio.create_task(self.close_loop(stop)),
+            asyncio.create_task(self.flush_loop(stop)),
+        ]
+        try:
+            await self.stream(stop)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.flush()
+
+    async def stream(self, stop: asyncio.Event):
+        delay = 1
+        while not stop.is_set():
+            try:
+                async with connect(self.url, ping_interval=20, ping_timeout=20) as ws:
+                    await ws.send(json.dumps(self.get_subscribe_message()))
+                    # 재구독 이후 체결은 소켓에 쌓아 두고, 끊긴 구간을 먼저 채운다.
+                    if self.gap_start is not None:
+                        await self.backfill(
+                            self.gap_start, floor_ms(self.now_ms(), "1m")
+                        )
+                        self.gap_start = None
+                    self.connected = True
+                    delay = 1
+                    logger.info(f"체결 스트림 연결: {len(self.markets)}개 market")
+                    await self.consume(ws, stop)
+                    if not stop.is_set():
+                        logger.warning("체결 스트림 연결이 서버에서 종료됨")
+            except (
+                OSError,
+                ConnectionClosed,
+                InvalidHandshake,
+                asyncio.TimeoutError,
+            ) as e:
+                logger.warning(f"체결 스트림 연결 끊김: {e!r}")
+            if self.connected:
+                self.connected = False
+                self.gap_start = self.aggregator.watermark or floor_ms(
+                    self.now_ms(), "1m"
+                )
+            if stop.is_set():
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def consume(self, ws, stop: asyncio.Event):
+        async def receive():
+            async for message in ws:
+                self.on_message(message)
+
+        receiver = asyncio.create_task(receive())
+        stopper = asyncio.create_task(stop.wait())
+        done, _ = await asyncio.wait(
+            {receiver, stopper}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in (receiver, stopper):
+            task.cancel()
+        # 서버가 연결을 닫은 경우 예외를 그대로 올려 재연결하게 한다.
+        if receiver in done and receiver.exception():
+            raise receiver.exception()
+
+    async def close_loop(self, stop: asyncio.Event):
+        """체결이 없는 market의 봉도 시간이 지나면 마감한다. (끊긴 동안에는 backfill을 위해 멈춘다)"""
+        while not stop.is_set():
+            if self.connected:
+                self.aggregator.close_until(self.now_ms() - self.grace_ms)
+            await asyncio.sleep(1)
+
+    async def flush_loop(self, stop: asyncio.Event):
+        while not stop.is_set():
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        for interval in self.aggregator.intervals:
+            rows = self.aggregator.drain(interval)
+            if not rows:
+                continue
+            try:
+                await asyncio.to_thread(
+                    self.sink, interval, pd.DataFrame(rows, columns=BAR_COLUMNS)
+                )
+            except Exception as e:
+                # 다음 flush에서 다시 시도
+                logger.warning(f"{interval} 봉 {len(rows)}개 적재 실패: {e}")
+                self.aggregator.closed[interval][:0] = rows
+
+    def store_bars(self, interval: str, df: pd.DataFrame):
+        from src.connection.bigquery import get_bq_conn
+
+        get_bq_conn().merge_upsert(
+            df,
+            table_id=f"bithumb_stream_{interval}",
+            data_set=self.data_set,
+            key_cols=["market", "reg_date"],
+        )
+
+    async def backfill(self, start_ms: int, end_ms: int):
+        """[start_ms, end_ms) 구간의 분봉을 REST 캔들 API로 받아 집계에 반영한다."""
+        if end_ms <= start_ms:
+            return
+        try:
+            candles = await asyncio.to_thread(self.fetch_candles, start_ms, end_ms)
+        except Exception as e:
+            logger.warning(f"REST 분봉 backfill 실패, 실시간 체결만 집계: {e}")
+            return
+        applied = 0
+        for market, bar in candles:
+            applied += self.aggregator.add_candle(market, bar)
+        # REST로 받은 구간은 완성된 분봉이므로 바로 마감한다.
+        self.aggregator.close_until(end_ms)
+        logger.info(
+            f"REST 분봉 backfill: {to_kst(start_ms)} ~ {to_kst(end_ms)}, {applied}개"
+        )
+
+    def fetch_candles(self, start_ms: int, end_ms: int) -> List[Tuple[str, _Bar]]:
+        if self.client is None:
+            from src.bithumb import get_bithumb_client
+
+            self.client = get_bithumb_client()
+        page_size = 200  # 캔들 API 1회 최대 조회 개수
+        page_ms = page_size * INTERVAL_MS["1m"]
+        targets = [
+            (market, page_end)
+            for market in self.markets
+            for page_end in range(end_ms, start_ms, -page_ms)
+        ]
+
+        def fetch(target):
+            market, page_end = target
+            try:
+                return market, self.client.get_minute_candle_data(
+                    market, page_size, to_kst(page_end)
+                )
+            except Exception as e:
+                logger.warning(f"분봉 조회 실패: {market} ({e})")
+                return market, None
+
+        with ThreadPoolExecutor(max_workers=self.client.max_workers) as executor:
+            pages = list(executor.map(fetch, targets))
+
+        result = []
+        for market, page in pages:
+            if page is None or page.empty:
+                continue
+            kst = pd.to_datetime(page["candle_date_time_kst"])
+            starts = (kst - pd.Timestamp("1970-01-01")) // pd.Timedelta(milliseconds=1)
+            starts = starts - KST_OFFSET_MS
+            for row, start in zip(page.itertuples(index=False), starts):
+                if start_ms <= start < end_ms:
+                    result += [
+                        (
+                            market,
+                            _Bar(
+                                int(start),
+                                float(row.opening_price),
+                                float(row.high_price),
+                                float(row.low_price),
+                                float(row.trade_price),
+                                float(row.candle_acc_trade_volume),
+                                float(row.candle_acc_trade_price),
+                                int(start),
+                                int(start),
+                            ),
+                        )
+                    ]
+        # market별 시각 순으로 반영 (페이지 경계 중복 제거)
+        result = list({(m, b.start): (m, b) for m, b in result}.values())
+        return sorted(result, key=lambda x: (x[0], x[1].start))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="빗썸 체결 스트림 → 분/시간/일봉 적재")
+    parser.add_argument(
+        "--markets", type=str, default=None, help="콤마 구분 (기본: 전체 KRW 마켓)"
+    )
+    parser.add_argument("--url", type=str, default=BITHUMB_WS_URL)
+    parser.add_argument("--flush-interval", type=float, default=60)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.markets:
+        markets = args.markets.split(",")
+    else:
+        from src.bithumb import get_bithumb_client
+
+        markets = get_bithumb_client().crypto_markets["market"]
+        markets = [x for x in markets if x.startswith("KRW-")]
+    stream = BithumbTradeStream(
+        markets, url=args.url, flush_interval=args.flush_interval
+    )
+    asyncio.run(stream.run())
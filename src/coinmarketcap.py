@@ -1,19 +1,18 @@
-import os
 import pytz
-import requests
 import pandas as pd
-import jwt 
-import uuid
-import hashlib
-import time
-import requests
-import json
-from tqdm import tqdm
-from datetime import datetime, date, timedelta
-from dotenv import load_dotenv
-from urllib.parse import urlencode, urljoin
+from datetime import datetime
+from urllib.parse import urljoin
 
 from src.config.env import COINMARKETCAP_KEY
+from src.connection.http import EndpointPolicy, get_http_transport
+
+# listings/latest는 5000개 코인을 한 번에 받으므로 read timeout을 길게 둔다.
+ENDPOINT_POLICIES = {
+    'coinmarketcap.listings': EndpointPolicy(timeout=(3.05, 30), retries=2),
+    'coinmarketcap.fear-and-greed': EndpointPolicy(timeout=(3.05, 10), retries=2),
+}
+
+
 class CoinMarketCapClient():
     base_url = 'https://pro-api.coinmarketcap.com'
     headers = {
@@ -21,6 +20,12 @@ class CoinMarketCapClient():
         'X-CMC_PRO_API_KEY': COINMARKETCAP_KEY,
     }
 
+    def __init__(self):
+        self.http = get_http_transport()
+        self.http.mount(self.base_url, pool_size=2)
+        for endpoint, policy in ENDPOINT_POLICIES.items():
+            self.http.set_policy(endpoint, policy)
+
     def listing_latest(self) -> pd.DataFrame:
         end_point = '/v1/cryptocurrency/listings/latest'
         url = urljoin(self.base_url,end_point)
@@ -31,7 +36,9 @@ class CoinMarketCapClient():
             "sort": "market_cap",
             "limit": 5000,
         }
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.http.get(
+            url, endpoint='coinmarketcap.listings', headers=self.headers, params=params
+        )
         response.raise_for_status()
         result = pd.DataFrame(response.json()['data'])
         quote = pd.DataFrame(map(lambda x: x['USD'], result['quote'].values)).drop(columns='last_updated')
@@ -40,7 +47,9 @@ class CoinMarketCapClient():
     def get_fear_and_greed_latest(self) -> pd.DataFrame:
         end_point = '/v3/fear-and-greed/latest'
         url = urljoin(self.base_url,end_point)
-        response = requests.get(url, headers=self.headers)
+        response = self.http.get(
+            url, endpoint='coinmarketcap.fear-and-greed', headers=self.headers
+        )
         response.raise_for_status()
         result = response.json()['data']
         result = pd.DataFrame([result]).rename(columns={'update_time': 'created_at'})
@@ -52,7 +61,12 @@ class CoinMarketCapClient():
         end_point = '/v3/fear-and-greed/historical'
         url = urljoin(self.base_url,end_point)
         params = {'start': 1, 'limit': 500}
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.http.get(
+            url,
+            endpoint='coinmarketcap.fear-and-greed',
+            headers=self.headers,
+            params=params,
+        )
         response.raise_for_status()
         result = response.json()['data']
         result = pd.DataFrame(result).rename(columns={'timestamp': 'created_at'})
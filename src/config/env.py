@@ -1,14 +1,16 @@
 import os
-import dotenv
 from pathlib import Path
+
+import dotenv
+
 dotenv.load_dotenv()
 
 PROJ_ID = os.getenv("PROJ_ID")
 EXECUTE_ENV = os.getenv("EXECUTE_ENV")
 GOOGLE_SHEET_URL = os.getenv("GOOGLE_SHEET_URL")
-GOOGLE_SERVICE_ACCOUNT_PATH = os.getenv("GOOGLE_SERVICE_ACCOUNT_PATH", '')
-SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN", '')
-SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID", '')
+GOOGLE_SERVICE_ACCOUNT_PATH = os.getenv("GOOGLE_SERVICE_ACCOUNT_PATH", "")
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN", "")
+SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID", "")
 
 BITHUMB_KEY = os.getenv("BITHUMB_KEY")
 BITHUMB_SECRET = os.getenv("BITHUMB_SECRET")
@@ -18,5 +20,30 @@ BINANCE_SECRET_KEY = os.getenv("BINANCE_SECRET_KEY")
 
 COINMARKETCAP_KEY = os.getenv("COINMARKETCAP_KEY")
 
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent 
-GCP_KEY_PATH = GOOGLE_SERVICE_ACCOUNT_PATH
\ No newline at end of file
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+GCP_KEY_PATH = GOOGLE_SERVICE_ACCOUNT_PATH
+
+# BigQuery 조회 결과 로컬 Parquet 캐시
+BQ_CACHE_DIR = os.getenv("BQ_CACHE_DIR", str(PROJECT_ROOT / ".cache" / "bigquery"))
+BQ_CACHE_TTL_SEC = int(os.getenv("BQ_CACHE_TTL_SEC", 60 * 10))
+BQ_CACHE_MAX_AGE_DAYS = int(os.getenv("BQ_CACHE_MAX_AGE_DAYS", 7))
+BQ_CACHE_EVICT_DAYS = int(os.getenv("BQ_CACHE_EVICT_DAYS", 30))
+BQ_CACHE_MAX_BYTES = int(os.getenv("BQ_CACHE_MAX_BYTES", 2 * 1024**3))
+
+# 거래소 API 주소 (로컬 거래소 시뮬레이터(src/exchange_sim.py)로 바꿔 paper 실행/부하 테스트)
+BITHUMB_API_URL = os.getenv("BITHUMB_API_URL", "https://api.bithumb.com")
+UPBIT_API_URL = os.getenv("UPBIT_API_URL", "https://api.upbit.com")
+# 0이면 주문 체결 내역을 trade_history에 적재하지 않는다. (시뮬레이터 대상 실행용)
+TRADE_JOURNAL_ENABLED = os.getenv("TRADE_JOURNAL_ENABLED", "1") == "1"
+
+# 빗썸 캔들 동시 조회 스레드 수
+BITHUMB_FETCH_WORKERS = int(os.getenv("BITHUMB_FETCH_WORKERS", 16))
+
+# 학습된 LightGBM 모델 로컬 registry
+MODEL_REGISTRY_DIR = os.getenv(
+    "MODEL_REGISTRY_DIR", str(PROJECT_ROOT / ".cache" / "models")
+)
+MODEL_REGISTRY_KEEP = int(os.getenv("MODEL_REGISTRY_KEEP", 30))
+
+# 빗썸 WebSocket 체결 스트림 (분/시간/일봉 실시간 집계)
+BITHUMB_WS_URL = os.getenv("BITHUMB_WS_URL", "wss://ws-api.bithumb.com/websocket/v1")
@@ -1,33 +1,134 @@
-from datetime import datetime
 import inspect
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
 from functools import wraps
-from src.logger import get_logger
+
+from src.logger import LOG_LEVEL, JSONFormatter, get_logger
+from src.metrics import get_metrics_registry
 
 logger = get_logger(__name__)
+# 호출별 측정 결과를 한 줄 JSON으로 남기는 logger (일반 로그 형식으로 중복 출력되지 않도록 전파 안 함)
+# 전파하지 않으므로 상위 logger의 handler 유무(hasHandlers)와 관계없이 전용 handler를 단다.
+profile_logger = logging.getLogger("src.profile")
+profile_logger.setLevel(LOG_LEVEL)
+profile_logger.propagate = False
+if not profile_logger.handlers:
+    _profile_handler = logging.StreamHandler()
+    _profile_handler.setLevel(LOG_LEVEL)
+    _profile_handler.setFormatter(JSONFormatter())
+    profile_logger.addHandler(_profile_handler)
+
+# 호출 중 늘어난 peak RSS(MB) bucket 경계
+RSS_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000, 2000, 4000)
+# ru_maxrss 단위: Linux는 KB, macOS는 byte
+RSS_UNIT_MB = 1024**2 if sys.platform == "darwin" else 1024
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / RSS_UNIT_MB
+
+
+@contextmanager
+def atomic_path(path: str):
+    """
+    path와 같은 디렉토리에 만든 고유한 임시 파일 경로를 넘겨주고, 블록이 정상 종료되면 path로 교체한다.
+    - 저장 도중 프로세스가 죽어도 기존 파일이 깨지지 않는다.
+    - 여러 job/프로세스가 같은 파일을 동시에 저장해도 서로의 임시 파일을 덮어쓰지 않는다. (마지막 저장이 남음)
+    """
+    dir = os.path.dirname(path) or "."
+    os.makedirs(dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(
+        dir=dir, prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
 
 def log_method_call(func):
+    """
+    호출 로그(메서드 이름, 인자)와 함께 호출별 wall time, CPU time(프로세스 전체), peak RSS 증가량,
+    예외 여부를 측정해 src.profile logger(JSON)와 metrics registry에 남긴다.
+    - method_call_duration_seconds (histogram), method_calls_total (counter): method, status label
+    - method_call_cpu_seconds_total (counter), method_call_rss_peak_delta_mb (histogram): method label
+    """
+    # signature와 metric 객체는 데코레이터를 적용할 때 한 번만 만든다.
+    signature = inspect.signature(func)
+    name = func.__qualname__
+    registry = get_metrics_registry()
+    durations, calls = {}, {}
+    for status in ("ok", "error"):
+        durations[status] = registry.histogram(
+            "method_call_duration_seconds", "함수 실행 시간", method=name, status=status
+        )
+        calls[status] = registry.counter(
+            "method_calls_total", "함수 호출 수", method=name, status=status
+        )
+    cpu_seconds = registry.counter(
+        "method_call_cpu_seconds_total",
+        "함수 실행 중 프로세스 CPU time 합계",
+        method=name,
+    )
+    rss_delta = registry.histogram(
+        "method_call_rss_peak_delta_mb",
+        "함수 실행 중 늘어난 프로세스 peak RSS(MB)",
+        buckets=RSS_BUCKETS,
+        method=name,
+    )
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        # 현재 메서드 이름 가져오기
-        method_name = func.__name__
-        
-        class_name = None
-        if args:
-            instance = args[0]
-            class_name = instance.__class__.__name__
-
-        # 현재 메서드의 파라미터와 값 가져오기
-        signature = inspect.signature(func)
-        bound_arguments = signature.bind(*args, **kwargs)
-        bound_arguments.apply_defaults()
-
         # 메서드 이름과 파라미터 출력
-        if class_name != None:
-            logger.info("EXECUTE: %s.%s", class_name, method_name)
-        else:
-            logger.info("EXECUTE: %s", method_name)
-        for arg, value in bound_arguments.arguments.items():
-            if isinstance(value, (bool, int, float, str, datetime, list, dict)):
-                logger.info("    - %s: %s", arg, value)
-        return func(*args, **kwargs)
-    return wrapper
\ No newline at end of file
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("EXECUTE: %s", name)
+            bound_arguments = signature.bind(*args, **kwargs)
+            bound_arguments.apply_defaults()
+            for arg, value in bound_arguments.arguments.items():
+                if isinstance(value, (bool, int, float, str, datetime, list, dict)):
+                    logger.info("    - %s: %s", arg, value)
+
+        status, error = "ok", None
+        peak_rss = _peak_rss_mb()
+        cpu_time = time.process_time()
+        strt_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException as e:
+            status, error = "error", type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - strt_time
+            cpu = time.process_time() - cpu_time
+            peak_delta = _peak_rss_mb() - peak_rss
+            durations[status].observe(elapsed)
+            calls[status].inc()
+            cpu_seconds.inc(cpu)
+            rss_delta.observe(peak_delta)
+            if profile_logger.isEnabledFor(logging.INFO):
+                profile_logger.info(
+                    "method_call",
+                    extra={
+                        "fields": {
+                            "method": name,
+                            "status": status,
+                            "error": error,
+                            "wall_sec": round(elapsed, 6),
+                            "cpu_sec": round(cpu, 6),
+                            "rss_peak_mb": round(peak_rss + peak_delta, 1),
+                            "rss_peak_delta_mb": round(peak_delta, 1),
+                        }
+                    },
+                )
+
+    return wrapper
@@ -1,19 +1,40 @@
 import os
+import threading
 import time
-from datetime import date, datetime
-from typing import Sequence, Tuple
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
 
 import pandas as pd
 import pandas_gbq
+import pyarrow as pa
 import pytz
 from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
 from google.cloud.bigquery.table import Table
 
 from src.config.helper import log_method_call
+from src.connection.bq_cache import BigQueryCache
 from src.connection.gcp_auth import GCPAuth
+from src.metrics import get_metrics_registry
 
 bq_conn = None  # 전역 BigQuery 연결 객체
+# 프로세스 전역 테이블 메타데이터 캐시: table_full_id -> (Table, 캐시 시각)
+TABLE_CACHE_TTL_SEC = 60 * 10
+table_cache = {}
+table_cache_lock = threading.Lock()
+# insert_rows_from_dataframe의 요청당 행 수 (오류의 index는 요청 안에서의 위치)
+STREAM_CHUNK_SIZE = 500
+
+
+class StreamInsertRowError(Exception):
+    """stream insert에서 BigQuery가 행 단위로 거부한 경우. rows는 df에서 거부된 행의 위치(0부터)다."""
+
+    def __init__(self, rows: List[int], errors: list) -> None:
+        super().__init__(f"stream insert 행 {len(rows)}개 거부: {errors}")
+        self.rows = rows
+        self.errors = errors
 
 
 class BigQueryConn(GCPAuth):
@@ -21,6 +42,7 @@ class BigQueryConn(GCPAuth):
         super().__init__(scope=scope)
         self.client = bigquery.Client(credentials=self.credential)
         self.project_id = "proj-asset-allocation"
+        self.cache = BigQueryCache(fetch=self.query_arrow)
 
     @log_method_call
     def extract_schema_from_df(self, df: pd.DataFrame):
@@ -72,27 +94,69 @@ class BigQueryConn(GCPAuth):
     def preprocess_for_insert(
         self, df: pd.DataFrame, proj_id: str, data_set: str, table_id: str
     ) -> Tuple[pd.DataFrame, Table]:
-        result = df.copy()
         table_full_id = f"{proj_id}.{data_set}.{table_id}"
         seoul_tz = pytz.timezone("Asia/Seoul")
         now = datetime.now(seoul_tz)
-        result["update_dt"] = pd.Timestamp(now)
+        update_dt = pd.Series(pd.Timestamp(now), index=df.index, name="update_dt")
 
         # 1. 테이블 존재 여부 확인: 테이블이 없다면, 새로 만들어서 넣기
         try:
-            table_info = self.client.get_table(table_full_id)
+            table_info = self.get_table_cached(table_full_id)
             table_schema = [x.name for x in table_info.schema]
-            result = result[table_schema]
+            result = self.project_columns(df, table_schema, update_dt)
         except NotFound as err:
             print(err)
             print("Target table does not exist, So create table.")
+            table_schema = [x for x in df.columns if x != "update_dt"] + ["update_dt"]
+            result = self.project_columns(df, table_schema, update_dt)
             schema = self.extract_schema_from_df(result)
             table_info = bigquery.Table(table_full_id, schema=schema)
             table_info = self.client.create_table(table_info)  # Make an API request.
             self.wait_for_table_creation(table_full_id)
+            self.set_table_cache(table_full_id, table_info)
 
         return (result, table_info)
 
+    @staticmethod
+    def project_columns(
+        df: pd.DataFrame, columns: List[str], update_dt: pd.Series
+    ) -> pd.DataFrame:
+        """테이블 스키마 순서로 컬럼을 고른다. 원본 컬럼 버퍼를 복사하지 않고 그대로 참조한다."""
+        return pd.DataFrame(
+            {x: update_dt if x == "update_dt" else df[x] for x in columns}, copy=False
+        )
+
+    def get_table_cached(self, table_full_id: str) -> Table:
+        """프로세스 전역 테이블 메타데이터 캐시 (TTL: TABLE_CACHE_TTL_SEC)"""
+        with table_cache_lock:
+            cached = table_cache.get(table_full_id)
+        if cached is not None and time.time() - cached[1] < TABLE_CACHE_TTL_SEC:
+            return cached[0]
+        table_info = self.client.get_table(table_full_id)
+        self.set_table_cache(table_full_id, table_info)
+        return table_info
+
+    def set_table_cache(self, table_full_id: str, table_info: Table):
+        with table_cache_lock:
+            table_cache[table_full_id] = (table_info, time.time())
+
+    def invalidate_table_cache(self, table_full_id: str = None):
+        """스키마 변경/오류 시 캐시된 테이블 메타데이터를 비운다. (None이면 전체)"""
+        with table_cache_lock:
+            if table_full_id is None:
+                table_cache.clear()
+            else:
+                table_cache.pop(table_full_id, None)
+
+    @contextmanager
+    def invalidate_table_cache_on_error(self, data_set: str, table_id: str):
+        """적재 실패는 캐시된 스키마가 낡아서일 수 있으므로, 예외 시 해당 테이블 캐시를 비운다."""
+        try:
+            yield
+        except Exception:
+            self.invalidate_table_cache(f"{self.project_id}.{data_set}.{table_id}")
+            raise
+
     @log_method_call
     def insert(
         self, df: pd.DataFrame, table_id: str, data_set: str, if_exists: str = "append"
@@ -100,13 +164,14 @@ class BigQueryConn(GCPAuth):
         df, table_info = self.preprocess_for_insert(
             df, proj_id=self.project_id, data_set=data_set, table_id=table_id
         )
-        pandas_gbq.to_gbq(
-            dataframe=df,
-            destination_table=f"{data_set}.{table_id}",
-            project_id=self.project_id,
-            if_exists=if_exists,
-            credentials=self.credential,
-        )
+        with self.invalidate_table_cache_on_error(data_set, table_id):
+            pandas_gbq.to_gbq(
+                dataframe=df,
+                destination_table=f"{data_set}.{table_id}",
+                project_id=self.project_id,
+                if_exists=if_exists,
+                credentials=self.credential,
+            )
 
     @log_method_call
     def upsert(self, df: pd.DataFrame, table_id: str, data_set: str, target_dict: dict):
@@ -136,13 +201,105 @@ class BigQueryConn(GCPAuth):
         # INSERT
         print("INSERT FOR UPSERT")
         if del_query_job.result() is not None:
-            pandas_gbq.to_gbq(
-                dataframe=df,
-                destination_table=f"{data_set}.{table_id}",
-                project_id=self.project_id,
-                if_exists="append",
-                credentials=self.credential,
+            with self.invalidate_table_cache_on_error(data_set, table_id):
+                pandas_gbq.to_gbq(
+                    dataframe=df,
+                    destination_table=f"{data_set}.{table_id}",
+                    project_id=self.project_id,
+                    if_exists="append",
+                    credentials=self.credential,
+                )
+
+    @log_method_call
+    def merge_upsert(
+        self,
+        df: pd.DataFrame,
+        table_id: str,
+        data_set: str,
+        key_cols: List[str],
+        replace_cols: List[str] = None,
+    ):
+        """
+        DataFrame을 임시 테이블에 한 번 적재(Parquet load job)한 뒤 단일 MERGE로 반영한다.
+        여러 파티션/market을 한 번에 넘기면 DELETE + INSERT를 반복하지 않고 한 job으로 처리된다.
+
+        Parameters:
+        - key_cols: 행을 식별하는 컬럼 (일치하면 UPDATE, 없으면 INSERT)
+        - replace_cols: 지정하면 df에 있는 replace_cols 값 범위(예: reg_date)에서
+          df에 없는 기존 행은 삭제한다. (기존 upsert의 target_dict 단위 교체와 동일)
+        """
+        if len(key_cols) == 0:
+            raise Exception("MERGE를 위한 key_cols가 없습니다.")
+
+        df, table_info = self.preprocess_for_insert(
+            df, proj_id=self.project_id, data_set=data_set, table_id=table_id
+        )
+        table_full_id = f"{self.project_id}.{data_set}.{table_id}"
+        stage_full_id = (
+            f"{self.project_id}.{data_set}._stage_{table_id}_{uuid.uuid4().hex[:12]}"
+        )
+
+        # 1) STAGE: 작업이 실패해도 남지 않도록 만료 시간을 둔 임시 테이블에 적재
+        stage_info = bigquery.Table(stage_full_id, schema=table_info.schema)
+        stage_info.expires = datetime.now(pytz.utc) + timedelta(hours=1)
+        self.client.create_table(stage_info)
+        try:
+            load_job = self.client.load_table_from_dataframe(
+                df,
+                stage_full_id,
+                job_config=bigquery.LoadJobConfig(
+                    schema=table_info.schema,
+                    source_format=bigquery.SourceFormat.PARQUET,
+                    write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                ),
+            )
+            load_job.result()
+
+            # 2) MERGE
+            columns = [x.name for x in table_info.schema]
+            on_clause = " AND ".join(f"T.{x} = S.{x}" for x in key_cols)
+            update_clause = ", ".join(
+                f"{x} = S.{x}" for x in columns if x not in key_cols
             )
+            insert_cols = ", ".join(columns)
+            insert_values = ", ".join(f"S.{x}" for x in columns)
+            merge_query = ""
+            delete_clause = ""
+            if replace_cols:
+                # 교체 범위(replace_cols 값 조합)를 문자열 키 배열로 만들어 비교한다.
+                source_key = ", ".join(f"S.{x}" for x in replace_cols)
+                target_key = ", ".join(f"T.{x}" for x in replace_cols)
+                merge_query += f"""
+                DECLARE replace_keys ARRAY<STRING> DEFAULT (
+                    SELECT ARRAY_AGG(DISTINCT TO_JSON_STRING(STRUCT({source_key})))
+                    FROM `{stage_full_id}` S
+                );
+                """
+                delete_clause = f"""
+            WHEN NOT MATCHED BY SOURCE
+                AND TO_JSON_STRING(STRUCT({target_key})) IN UNNEST(replace_keys)
+                THEN DELETE"""
+            merge_query += f"""
+            MERGE `{table_full_id}` T
+            USING `{stage_full_id}` S
+            ON {on_clause}
+            WHEN MATCHED THEN UPDATE SET {update_clause}
+            WHEN NOT MATCHED THEN INSERT ({insert_cols}) VALUES ({insert_values}){delete_clause}
+            """
+            print("MERGE FOR UPSERT")
+            strt_time = time.time()
+            merge_job = self.client.query(merge_query)
+            merge_job.result()
+            elapsed_time = round(time.time() - strt_time, 2)
+            print(
+                f"[BigQuery] job ID(elapsed_time: {str(elapsed_time)} sec.): {merge_job.job_id}"
+            )
+        except Exception:
+            # 캐시된 스키마가 낡아서 실패했을 수 있으므로 비운다.
+            self.invalidate_table_cache(table_full_id)
+            raise
+        finally:
+            self.client.delete_table(stage_full_id, not_found_ok=True)
 
     @log_method_call
     def query_from_sql_file(self, file_path, file_name, **kwargs) -> pd.DataFrame:
@@ -157,7 +314,9 @@ class BigQueryConn(GCPAuth):
         print(
             f"[BigQuery] job ID(elapsed_time: {str(elapsed_time)} sec.): {response.job_id}"
         )
-        return response.to_dataframe()
+        result = response.to_dataframe()
+        self.record_job(response, "query_from_sql_file")
+        return result
 
     def query(self, sql, **kwargs) -> pd.DataFrame:
         strt_time = time.time()
@@ -167,34 +326,112 @@ class BigQueryConn(GCPAuth):
         print(
             f"[BigQuery] job ID(elapsed_time: {str(elapsed_time)} sec.): {response.job_id}"
         )
+        self.record_job(response, "query")
+        return result
+
+    def query_arrow(self, sql, **kwargs) -> pa.Table:
+        strt_time = time.time()
+        response = self.client.query(sql, **kwargs)
+        result = response.to_arrow()
+        elapsed_time = round(time.time() - strt_time, 2)
+        print(
+            f"[BigQuery] job ID(elapsed_time: {str(elapsed_time)} sec.): {response.job_id}"
+        )
+        self.record_job(response, "query_arrow")
         return result
 
+    def record_job(self, job: bigquery.QueryJob, method: str):
+        """완료된 조회 job의 처리/과금 바이트와 (서버 기준) 실행 시간을 metrics에 남긴다."""
+        metrics = get_metrics_registry()
+        metrics.counter(
+            "bigquery_bytes_processed_total", "BigQuery 처리 바이트", method=method
+        ).inc(job.total_bytes_processed or 0)
+        metrics.counter(
+            "bigquery_bytes_billed_total", "BigQuery 과금 바이트", method=method
+        ).inc(job.total_bytes_billed or 0)
+        if job.started and job.ended:
+            metrics.histogram(
+                "bigquery_job_duration_seconds", "BigQuery job 실행 시간", method=method
+            ).observe((job.ended - job.started).total_seconds())
+
+    def query_with_cache(
+        self,
+        name: str,
+        sql: str,
+        date_col: str,
+        start_date: date,
+        end_date: date,
+        offline: bool = False,
+    ) -> pd.DataFrame:
+        """
+        date_col 기준 [start_date, end_date] 구간을 로컬 Parquet 캐시를 거쳐 조회한다.
+        sql에는 조회 구간이 들어갈 자리에 <start_date>, <end_date>를 둔다.
+        캐시에 없는 날짜 구간만 BigQuery에서 가져온다. (offline=True면 캐시만 읽는다)
+        """
+        return self.cache.query(
+            name=name,
+            sql=sql,
+            date_col=date_col,
+            start_date=start_date,
+            end_date=end_date,
+            offline=offline,
+        )
+
     @log_method_call
     def insert_using_stream(
         self, df: pd.DataFrame, table_id: str, data_set: str
-    ) -> Sequence[Sequence[dict]]:
+    ) -> bool:
         """
         이 함수는 내부적으로 stream API를 활용한다.
         장점: JSON schemaField를 다룰 수 있다.
         단점: stream API 작업이 걸려있는 테이블은 일정 기간(몇 분에서 몇 시간 정도) 동안은 DELETE/UPDATE 접근이 불가하다.
+
+        테이블을 timeout 안에 찾지 못하면 False를 반환한다.
+        스키마를 갱신해 다시 시도해도 거부되는 행이 있으면 StreamInsertRowError를 올린다.
+        (BigQuery는 이때 요청 전체를 적재하지 않으므로, 함께 멈춘("stopped") 행은 거부 행에서 제외한다)
         """
         df, table_info = self.preprocess_for_insert(
             df=df, proj_id=self.project_id, data_set=data_set, table_id=table_id
         )
+        table_full_id = f"{self.project_id}.{data_set}.{table_id}"
 
         interval, timeout = 5, 60 * 3
+        schema_retried = False
         start_time = time.time()
         while time.time() - start_time < timeout:
             try:
                 # 테이블 정보 가져오기
                 # tmp_client = bigquery.Client(project=self.project, credentials=self.credentials)
                 # tmp_client.insert_rows_from_dataframe(dataframe=df,table=table_info)
-                self.client.insert_rows_from_dataframe(dataframe=df, table=table_info)
-                print("streamAPI을 활용한 INSERT 완료")
-                return True
+                errors = self.client.insert_rows_from_dataframe(
+                    dataframe=df, table=table_info, chunk_size=STREAM_CHUNK_SIZE
+                )
             except NotFound:
                 print("streamAPI에서 사용할 테이블을 못 찾고 있습니다.")
+                self.invalidate_table_cache(table_full_id)
                 time.sleep(interval)
+                continue
+
+            if not any(errors):
+                print("streamAPI을 활용한 INSERT 완료")
+                return True
+            # 스키마 불일치: 캐시된 테이블 정보를 갱신해 한 번만 다시 시도한다.
+            print(f"streamAPI INSERT 오류: {errors}")
+            self.invalidate_table_cache(table_full_id)
+            if schema_retried:
+                reasons = {
+                    i * STREAM_CHUNK_SIZE + x["index"]: {
+                        e.get("reason") for e in x["errors"]
+                    }
+                    for i, chunk in enumerate(errors)
+                    for x in chunk
+                }
+                rejected = [row for row, x in reasons.items() if x != {"stopped"}]
+                raise StreamInsertRowError(sorted(rejected or reasons), errors)
+            schema_retried = True
+            df, table_info = self.preprocess_for_insert(
+                df=df, proj_id=self.project_id, data_set=data_set, table_id=table_id
+            )
         return False
 
 
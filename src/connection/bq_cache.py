@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytz
+
+from src.config.env import (
+    BQ_CACHE_DIR,
+    BQ_CACHE_EVICT_DAYS,
+    BQ_CACHE_MAX_AGE_DAYS,
+    BQ_CACHE_MAX_BYTES,
+    BQ_CACHE_TTL_SEC,
+)
+from src.config.helper import atomic_path
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+kst = pytz.timezone("Asia/Seoul")
+
+
+class BigQueryCache:
+    """
+    날짜 컬럼 기준으로 BigQuery 조회 결과를 로컬 Parquet 파티션에 보관하는 캐시.
+
+    - 디렉토리 구조: <cache_dir>/<name>/<sql hash>/<YYYY-MM-DD>.parquet
+      (빈 결과에도 컬럼을 유지하도록 마지막 조회 결과의 스키마를 _schema.parquet에 둔다)
+    - 요청 구간 중 캐시에 없거나 만료된 날짜만 연속 구간으로 묶어 조회한다.
+    - 만료 정책
+        - 최근 mutable_days 이내 파티션(당일 적재 중인 데이터): ttl_sec 후 재조회
+        - 그 외 파티션: max_age_days 후 재조회 (backfill로 과거 데이터가 바뀔 수 있으므로)
+    - 축출 정책: evict_days 동안 읽지 않은 파티션 삭제, 전체 크기가 max_bytes를 넘으면
+      오래 읽지 않은 순서(LRU)로 삭제
+    """
+
+    manifest_file = "_manifest.json"
+    schema_file = "_schema.parquet"
+
+    def __init__(
+        self,
+        fetch: Callable[[str], pa.Table],
+        cache_dir: str = BQ_CACHE_DIR,
+        mutable_days: int = 2,
+        ttl_sec: int = BQ_CACHE_TTL_SEC,
+        max_age_days: int = BQ_CACHE_MAX_AGE_DAYS,
+        evict_days: int = BQ_CACHE_EVICT_DAYS,
+        max_bytes: int = BQ_CACHE_MAX_BYTES,
+    ) -> None:
+        self.fetch = fetch
+        self.cache_dir = cache_dir
+        self.mutable_days = mutable_days
+        self.ttl_sec = ttl_sec
+        self.max_age_days = max_age_days
+        self.evict_days = evict_days
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def query(
+        self,
+        name: str,
+        sql: str,
+        date_col: str,
+        start_date: date,
+        end_date: date,
+        offline: bool = False,
+    ) -> pd.DataFrame:
+        """
+        sql의 <start_date>, <end_date>를 치환해 date_col 기준 [start_date, end_date] 구간을 조회한다.
+        (치환 규칙은 BigQueryConn.query_from_sql_file과 동일)
+        offline=True면 BigQuery를 조회하지 않고, 만료 여부와 상관없이 캐시에 있는 날짜만 읽는다.
+        """
+        table_dir = self.get_table_dir(name, sql)
+        start_date, end_date = self._to_date(start_date), self._to_date(end_date)
+        # 미래 날짜에는 데이터가 있을 수 없으므로 캐시/조회 대상에서 뺀다.
+        end_date = min(end_date, datetime.now(tz=kst).date())
+        target_dates = [
+            start_date + timedelta(days=i)
+            for i in range((end_date - start_date).days + 1)
+        ]
+
+        with self.lock:
+            manifest = self.load_manifest(table_dir)
+            now = time.time()
+            if offline:
+                missing = []
+                target_dates = [d for d in target_dates if d.isoformat() in manifest]
+            else:
+                missing = [d for d in target_dates if self.is_stale(manifest, d, now)]
+            for range_start, range_end in self.group_ranges(missing):
+                range_sql = sql.replace("<start_date>", range_start.isoformat())
+                range_sql = range_sql.replace("<end_date>", range_end.isoformat())
+                table = self.fetch(range_sql)
+                self.write_partitions(
+                    table_dir, manifest, table, date_col, range_start, range_end
+                )
+
+            tables = []
+            for _date in target_dates:
+                entry = manifest[_date.isoformat()]
+                entry["accessed_at"] = now
+                if entry["rows"] > 0:
+                    path = os.path.join(table_dir, f"{_date.isoformat()}.parquet")
+                    tables += [pq.read_table(path, memory_map=True)]
+            self.save_manifest(table_dir, manifest)
+            self.evict()
+
+        logger.info(
+            "[BigQueryCache] %s: %d일 중 %d일 조회",
+            name,
+            len(target_dates),
+            len(missing),
+        )
+        if not tables:
+            return self.empty_frame(table_dir)
+        table = pa.concat_tables(tables, promote_options="default")
+        # 숫자형 컬럼은 memory map 버퍼를 그대로 쓰도록 블록 통합 없이 변환
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def empty_frame(self, table_dir: str) -> pd.DataFrame:
+        """조회된 행이 없을 때 캐시된 스키마의 컬럼/타입을 가진 빈 DataFrame을 반환한다."""
+        try:
+            schema = pq.read_schema(os.path.join(table_dir, self.schema_file))
+        except FileNotFoundError:
+            return pd.DataFrame()
+        return schema.empty_table().to_pandas()
+
+    def invalidate(self, name: str, sql: str = None):
+        """name(또는 name + sql)에 해당하는 캐시 파티션을 모두 만료시킨다. (backfill 이후 등)"""
+        target_dir = os.path.join(self.cache_dir, name)
+        if sql is not None:
+            target_dir = self.get_table_dir(name, sql)
+        with self.lock:
+            for root, _, files in os.walk(target_dir):
+                if self.manifest_file in files:
+                    self.save_manifest(root, {})
+
+    def get_table_dir(self, name: str, sql: str) -> str:
+        sql_hash = hashlib.sha1(sql.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, name, sql_hash)
+
+    def is_stale(self, manifest: dict, _date: date, now: float) -> bool:
+        entry = manifest.get(_date.isoformat())
+        if entry is None:
+            return True
+        age = now - entry["fetched_at"]
+        today = datetime.now(tz=kst).date()
+        if _date >= today - timedelta(days=self.mutable_days - 1):
+            return age > self.ttl_sec
+        return age > self.max_age_days * 86400
+
+    @staticmethod
+    def group_ranges(dates: List[date]) -> List[Tuple[date, date]]:
+        """정렬된 날짜 목록을 연속 구간 [(시작, 끝), ...]으로 묶는다."""
+        result = []
+        for _date in dates:
+            if result and _date - result[-1][1] == timedelta(days=1):
+                result[-1] = (result[-1][0], _date)
+            else:
+                result += [(_date, _date)]
+        return result
+
+    def write_partitions(
+        self,
+        table_dir: str,
+        manifest: dict,
+        table: pa.Table,
+        date_col: str,
+        start_date: date,
+        end_date: date,
+    ):
+        os.makedirs(table_dir, exist_ok=True)
+        with atomic_path(os.path.join(table_dir, self.schema_file)) as tmp:
+            pq.write_table(table.slice(0, 0), tmp)
+        partition_key = (
+            pc.cast(table[date_col], pa.date32()) if table.num_rows else None
+        )
+        fetched_at = time.time()
+        for i in range((end_date - start_date).days + 1):
+            _date = start_date + timedelta(days=i)
+            path = os.path.join(table_dir, f"{_date.isoformat()}.parquet")
+            part = (
+                table.filter(pc.equal(partition_key, pa.scalar(_date, pa.date32())))
+                if partition_key is not None
+                else table.slice(0, 0)
+            )
+            if part.num_rows > 0:
+                with atomic_path(path) as tmp:
+                    pq.write_table(part, tmp)
+            elif os.path.exists(path):
+                os.remove(path)
+            manifest[_date.isoformat()] = {
+                "fetched_at": fetched_at,
+                "accessed_at": fetched_at,
+                "rows": part.num_rows,
+                "bytes": os.path.getsize(path) if part.num_rows > 0 else 0,
+            }
+
+    def evict(self):
+        """오래 읽지 않은 파티션을 삭제하고, 전체 용량을 max_bytes 이하로 맞춘다."""
+        now = time.time()
+        partitions = []  # (accessed_at, bytes, table_dir, date_str)
+        manifests = {}
+        for root, _, files in os.walk(self.cache_dir):
+            if self.manifest_file not in files:
+                continue
+            manifests[root] = self.load_manifest(root)
+            for date_str, entry in manifests[root].items():
+                partitions += [(entry["accessed_at"], entry["bytes"], root, date_str)]
+
+        total_bytes = sum(x[1] for x in partitions)
+        evicted = set()
+        for accessed_at, size, root, date_str in sorted(partitions):
+            expired = now - accessed_at > self.evict_days * 86400
+            if not expired and total_bytes <= self.max_bytes:
+                break
+            path = os.path.join(root, f"{date_str}.parquet")
+            if os.path.exists(path):
+                os.remove(path)
+            del manifests[root][date_str]
+            total_bytes -= size
+            evicted.add(root)
+
+        for root in evicted:
+            self.save_manifest(root, manifests[root])
+
+    def load_manifest(self, table_dir: str) -> dict:
+        try:
+            with open(os.path.join(table_dir, self.manifest_file)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_manifest(self, table_dir: str, manifest: dict):
+        os.makedirs(table_dir, exist_ok=True)
+        path = os.path.join(table_dir, self.manifest_file)
+        with atomic_path(path) as tmp, open(tmp, "w") as f:
+            json.dump(manifest, f)
+
+    @staticmethod
+    def _to_date(value) -> date:
+        return value.date() if isinstance(value, datetime) else value
@@ -0,0 +1,249 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+http_transport = None  # 전역 HttpTransport 객체
+
+
+class TokenBucket:
+    """
+    초당 rate개씩 토큰이 차고 최대 capacity개까지 쌓이는 토큰 버킷 (thread-safe).
+    거래소 API 호출 제한을 여러 스레드가 공유할 때 사용한다.
+    """
+
+    def __init__(self, rate: float, capacity: float = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """기다리지 않고 토큰을 얻을 수 있을 때만 가져간다."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+
+class RetryBudget:
+    """
+    재시도 예산: 요청 1건마다 ratio개씩 토큰이 쌓이고 재시도 1번에 1개씩 쓴다. (초당 min_per_sec개는 항상 보장)
+    거래소 장애 시 재시도가 정상 요청의 ratio 비율을 넘지 않게 해 재시도 폭주를 막는다.
+    """
+
+    def __init__(
+        self, ratio: float = 0.2, min_per_sec: float = 1.0, capacity: float = 10
+    ) -> None:
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.min_per_sec
+            )
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class EndpointPolicy:
+    """
+    endpoint별 호출 정책
+    - timeout: (connect, read) 초. 응답이 없는 요청이 작업 전체를 멈추지 않도록 항상 건다.
+    - retries: 최대 재시도 횟수. retry_methods에 속한 (멱등) 요청만 재시도한다.
+    - budget_ratio: 재시도 예산 (RetryBudget 참고)
+    """
+
+    def __init__(
+        self,
+        timeout: Tuple[float, float] = (3.05, 10),
+        retries: int = 2,
+        backoff_factor: float = 0.5,
+        retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+        retry_methods: Tuple[str, ...] = ("GET",),
+        budget_ratio: float = 0.2,
+    ) -> None:
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_statuses = retry_statuses
+        self.retry_methods = retry_methods
+        self.budget_ratio = budget_ratio
+
+
+class HttpTransport:
+    """
+    거래소/외부 API 클라이언트가 공유하는 HTTP transport.
+
+    - 하나의 requests.Session을 공유하고, 호스트별로 keep-alive 커넥션 풀 크기를 따로 잡는다. (mount)
+    - endpoint 이름별로 timeout·재시도 횟수·재시도 예산(EndpointPolicy)을 둔다.
+    - 요청마다 http_request_duration_seconds{host, endpoint, method} 히스토그램과
+      http_requests_total{..., status} / http_retries_total 카운터를 남긴다.
+    - HTTP/1.1 keep-alive만 사용한다. (requests/urllib3는 HTTP/2를 지원하지 않음)
+    """
+
+    def __init__(
+        self, pool_size: int = 10, default_policy: EndpointPolicy = None
+    ) -> None:
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=pool_size))
+        self.default_policy = default_policy or EndpointPolicy()
+        self.policies: Dict[str, EndpointPolicy] = {}
+        self.budgets: Dict[str, RetryBudget] = {}
+        self.lock = threading.Lock()
+        self.metrics = get_metrics_registry()
+
+    def mount(self, base_url: str, pool_size: int):
+        """base_url 호스트 전용 커넥션 풀 (동시 요청 스레드 수만큼 잡는다)"""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount(base_url.rstrip("/") + "/", adapter)
+
+    def set_policy(self, endpoint: str, policy: EndpointPolicy):
+        self.policies[endpoint] = policy
+
+    def get_budget(self, endpoint: str, policy: EndpointPolicy) -> RetryBudget:
+        budget = self.budgets.get(endpoint)
+        if budget is None:
+            with self.lock:
+                budget = self.budgets.setdefault(
+                    endpoint, RetryBudget(ratio=policy.budget_ratio)
+                )
+        return budget
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+        auth: Callable[[], dict] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        endpoint 정책에 따라 요청한다. endpoint를 주지 않으면 URL 경로를 이름으로 쓴다.
+        재시도 후에도 실패하면 마지막 응답을 그대로 돌려주거나(상태 코드 오류) 마지막 예외를 올린다.
+        auth를 주면 시도마다 호출해 headers에 더한다. (JWT nonce/timestamp는 재전송하면 거부되므로 매번 새로 서명)
+        """
+        method = method.upper()
+        host = urlparse(url).netloc
+        endpoint = endpoint or urlparse(url).path
+        policy = self.policies.get(endpoint, self.default_policy)
+        budget = self.get_budget(endpoint, policy)
+        budget.deposit()
+        latency = self.metrics.histogram(
+            "http_request_duration_seconds",
+            "HTTP 요청 latency",
+            host=host,
+            endpoint=endpoint,
+            method=method,
+        )
+        can_retry = method in policy.retry_methods
+
+        attempt = 0
+        while True:
+            if auth is not None:
+                kwargs["headers"] = {**kwargs.get("headers", {}), **auth()}
+            strt_time = time.perf_counter()
+            response, error, status = None, None, "error"
+            try:
+                response = self.session.request(
+                    method, url, timeout=timeout or policy.timeout, **kwargs
+                )
+                status = str(response.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            latency.observe(time.perf_counter() - strt_time)
+            self.metrics.counter(
+                "http_requests_total",
+                "HTTP 요청 수",
+                host=host,
+                endpoint=endpoint,
+                method=method,
+                status=status,
+            ).inc()
+
+            retryable = (
+                error is not None or response.status_code in policy.retry_statuses
+            )
+            if (
+                not retryable
+                or not can_retry
+                or attempt >= policy.retries
+                or not budget.withdraw()
+            ):
+                if error is not None:
+                    raise error
+                return response
+
+            retry_after = (
+                response.headers.get("Retry-After") if response is not None else None
+            )
+            if response is not None:
+                response.close()  # 커넥션을 풀에 돌려준다.
+            attempt += 1
+            self.metrics.counter(
+                "http_retries_total", "HTTP 재시도 수", host=host, endpoint=endpoint
+            ).inc()
+            wait = policy.backoff_factor * 2 ** (attempt - 1) * (0.5 + random.random())
+            if retry_after and retry_after.isdigit():
+                wait = max(wait, min(float(retry_after), 30))
+            logger.warning(
+                f"{method} {endpoint} 재시도 {attempt}/{policy.retries} ({status}), {wait:.2f}초 대기"
+            )
+            time.sleep(wait)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+def get_http_transport():
+    global http_transport
+    if http_transport is None:
+        http_transport = HttpTransport()
+    return http_transport
@@ -1,21 +1,52 @@
 import logging
-from datetime import datetime, timedelta
-from typing import Tuple
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
 
+import lightgbm as lgb
+import numpy as np
 import pandas as pd
 import pytz
 from lightgbm import LGBMRegressor
 
-from src.bithumb import get_bithumb_client
 from src.connection.bigquery import get_bq_conn
-from src.feature_store import FeatureStoreByCrypto, FeatureStoreByDate
+from src.feature_store import (
+    FeatureStoreByDate,
+    FeatureStoreByPanel,
+    IncrementalFeatureStore,
+    MarkovRegimeCache,
+)
+from src.metrics import get_metrics_registry, time_stage
+from src.model_registry import get_model_registry
 
 logger = logging.getLogger(__name__)
 RANDOM_STATE = 950223
 kst = pytz.timezone("Asia/Seoul")
 
-bq_conn = get_bq_conn()
-bithumb_client = get_bithumb_client()
+LONG_Q: float = 0.8  # 상위 20%
+SHORT_Q: float = 0.2  # 하위 20%
+
+
+def quantile_long_short(
+    df: pd.DataFrame,
+    col: str = "pred",
+    long_q: float = LONG_Q,
+    short_q: float = SHORT_Q,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """예측 점수 기준으로 롱/숏 후보를 분리한다.
+    - long: 상위 (1 - short_q) 이상
+    - short: 하위 short_q 이하
+    빈 DF에 대해서는 빈 DF를 반환.
+    """
+    if df is None or df.empty:
+        return df, df
+
+    # 경계값 계산
+    long_thr = df[col].quantile(long_q)
+    short_thr = df[col].quantile(short_q)
+
+    long = df.loc[df[col] >= long_thr]
+    short = df.loc[df[col] <= short_thr]
+    return long, short
 
 
 class CTRENDAllocator:
@@ -24,16 +55,31 @@ class CTRENDAllocator:
         self.train_size = kwargs.get("train_size")
         self.inference_date = kwargs.get("inference_date")
         self.except_cryptos = kwargs.get("except_cryptos", ("KRW-BTC"))
-        self.model = LGBMRegressor(random_state=RANDOM_STATE)
+        # True면 BigQuery를 조회하지 않고 로컬 캐시만 읽는다. (백테스트용)
+        self.offline = kwargs.get("offline", False)
+        self.model = LGBMRegressor(
+            **{"random_state": RANDOM_STATE, **kwargs.get("model_params", {})}
+        )
+        # 같은 조건으로 학습한 모델이 registry에 있으면 재사용
+        self.use_registry = kwargs.get("use_registry", True)
+        # True면 이전 모델에 새로 라벨이 생긴 날짜만 이어서 학습 (트리 수가 max_trees를 넘으면 전체 재학습)
+        self.incremental = kwargs.get("incremental", False)
+        self.max_trees = kwargs.get("max_trees", 1000)
+        # regime 피처의 MarkovRegression 재적합 주기(일)
+        self.markov_refit_days = kwargs.get("markov_refit_days", 7)
+        # 계산할 피처 목록 (None이면 feature_store.DEFAULT_FEATURES 전체)
+        self.features = kwargs.get("features")
+        # True면 지난 실행에서 계산한 피처 행을 재사용하고 새로 들어온/바뀐 캔들의 행만 계산
+        self.feature_cache = kwargs.get("feature_cache", True)
 
     def get_bithumb_raw_from_bq(
         self, start_date: datetime, end_date: datetime
     ) -> pd.DataFrame:
-        start_date_str = start_date.strftime("%Y-%m-%d")
-        end_date_str = end_date.strftime("%Y-%m-%d")
-        result = bq_conn.query(f"""
-        DECLARE start_date DATETIME DEFAULT '{start_date_str}';
-        DECLARE   end_date DATETIME DEFAULT '{end_date_str}';
+        result = get_bq_conn().query_with_cache(
+            name="bithumb_crypto_1d",
+            sql="""
+        DECLARE start_date DATETIME DEFAULT '<start_date>';
+        DECLARE   end_date DATETIME DEFAULT '<end_date>';
         SELECT
             reg_date,
             market, 
@@ -45,28 +91,41 @@ class CTRENDAllocator:
             volume,
         FROM `proj-asset-allocation.crypto_fluxor.bithumb_crypto_1d`
         WHERE 1=1
-        AND reg_date BETWEEN start_date AND DATETIME_ADD(end_date, INTERVAL 7 DAY)
+        AND reg_date BETWEEN start_date AND end_date
         AND STARTS_WITH(market, 'BTC') IS NOT TRUE
         ORDER BY reg_date, market
-        """)
+        """,
+            date_col="reg_date",
+            start_date=start_date,
+            end_date=end_date + timedelta(days=7),
+            offline=self.offline,
+        )
         result["reg_date"] = pd.to_datetime(result["reg_date"]).dt.date
         return result
 
     def get_marketcaps_from_bq(
-        self, target_date: datetime, lower_bound: int
+        self, target_date: datetime, lower_bound: int, start_date: datetime = None
     ) -> pd.DataFrame:
-        target_date_str = target_date.strftime("%Y-%m-%d")
+        """target_date(또는 [start_date, target_date] 구간)의 시가총액 하한 이상 비-스테이블코인"""
         query = f"""
-        DECLARE target_date DATETIME DEFAULT '{target_date_str}';
+        DECLARE start_date DATETIME DEFAULT '<start_date>';
+        DECLARE   end_date DATETIME DEFAULT '<end_date>';
         DECLARE lower_bound INT64 DEFAULT {lower_bound};
         SELECT *
         FROM `proj-asset-allocation.crypto_fluxor.crypto_market_cap_1d`
         WHERE 1=1
-        AND reg_date = target_date
+        AND reg_date BETWEEN start_date AND end_date
         AND market_cap > lower_bound
         ORDER BY reg_date, symbol
         """
-        result = bq_conn.query(query)
+        result = get_bq_conn().query_with_cache(
+            name="crypto_market_cap_1d",
+            sql=query,
+            date_col="reg_date",
+            start_date=start_date or target_date,
+            end_date=target_date,
+            offline=self.offline,
+        )
         result["is_stablecoin"] = result["tags"].apply(
             lambda x: True if "stablecoin" in x else False
         )
@@ -74,36 +133,78 @@ class CTRENDAllocator:
         return result
 
     def get_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        result = []
-        # crypto단위 feature 추가
-        for _, _df in df.groupby(by=["market"]):
-            ctrend = FeatureStoreByCrypto(_df, "reg_date")
-            ctrend.set_features()
-            result += [ctrend.data]
-        result = pd.concat(result).dropna()
+        """
+        학습/추론용 feature 표. (reg_date, market, symbol, feature..., y, label_date)
+        - feature와 y는 float32, market/symbol은 category로 반환한다.
+        - label_date는 y에 쓴 종가의 날짜다. (거래 정지 등으로 행이 빠지면 7일보다 뒤일 수 있음)
+        - 중간 단계는 행 번호/1차원 배열로만 다루고, 결과 표는 마지막에 한 번만 만든다.
+        """
+        # crypto단위 feature 추가: 전체 market을 (date × market) 패널로 한 번에 계산
+        panel = FeatureStoreByPanel(df, "reg_date")
+        # regime 피처의 MarkovRegression 파라미터는 refit 주기 동안 재사용한다.
+        markov_cache = MarkovRegimeCache.load(refit_days=self.markov_refit_days)
+        feature_cache = IncrementalFeatureStore.load() if self.feature_cache else None
+        panel.set_features(
+            dtype=np.float32,
+            markov_cache=markov_cache,
+            features=self.features,
+            feature_cache=feature_cache,
+        )
+        markov_cache.save()
+        if feature_cache is not None:
+            feature_cache.save()
+        data = panel.data
+        # 결측이 있는 행 제외 (rolling warm-up 구간 등)
+        rows = np.flatnonzero(data.notna().all(axis=1).to_numpy())
+        reg_date = data.index[rows]
 
         # 일단위 feature 추가
         fear_greed = (
             FeatureStoreByDate()
             .get_fear_and_greed_indicator(
-                start_date=result.index.min(), end_date=result.index.max()
+                start_date=reg_date.min(),
+                end_date=reg_date.max(),
+                offline=self.offline,
             )
             .set_index(keys="reg_date")
         )
-        result = result.merge(fear_greed, how="left", left_index=True, right_index=True)
 
-        # 주가 데이터를 ticker별로 그룹화한 후, 7일 뒤 종가를 shift로 구함
-        result["future_close"] = result.groupby("market")["close"].shift(-7)
+        # 같은 market 안에서 7행 뒤 종가 (panel.data는 market, reg_date 순으로 정렬되어 있음)
+        close = data["close"].to_numpy(dtype=np.float64)[rows]
+        market_code = panel._cols[rows]
+        future_close = np.full(len(rows), np.nan)
+        same_market = market_code[7:] == market_code[:-7]
+        future_close[:-7][same_market] = close[7:][same_market]
         # 7일 뒤 상승률 계산 ((7일 뒤 종가 - 현재 종가) / 현재 종가) * 100
-        result["y"] = (result["future_close"] - result["close"]) / result["close"] * 100
-        result = result.drop(
-            columns=["future_close", "open", "close", "high", "low", "volume"]
-        )
-        label_cols = ["market", "symbol"]
-        obj_col = "y"
-        feature_cols = list(set(result.columns) - set(label_cols) - set(obj_col))
-        result = result.dropna(subset=feature_cols)
-        return result.reset_index()
+        y = ((future_close - close) / close * 100).astype(np.float32)
+        # y에 쓴 종가의 날짜 (그 날짜가 지나야 y가 확정된다)
+        dates = reg_date.to_numpy()
+        label_date = np.full(len(rows), np.datetime64("NaT"), dtype=dates.dtype)
+        label_date[:-7][same_market] = dates[7:][same_market]
+
+        columns = {
+            "reg_date": reg_date.to_numpy(),
+            "market": pd.Categorical(data["market"].to_numpy()[rows]),
+            "symbol": pd.Categorical(data["symbol"].to_numpy()[rows]),
+        }
+        drop_cols = {"market", "symbol", "open", "close", "high", "low", "volume"}
+        for col in data.columns:
+            if col not in drop_cols:
+                columns[col] = data[col].to_numpy(dtype=np.float32)[rows]
+        for col in fear_greed.columns:
+            columns[col] = (
+                fear_greed[col]
+                .reindex(reg_date)
+                .to_numpy(dtype=np.float32, na_value=np.nan)
+            )
+
+        # feature가 모두 있는 행만 남긴다. (y는 최근 7일이 비어 있어도 추론용으로 유지)
+        feature_cols = [x for x in columns if x not in ("reg_date", "market", "symbol")]
+        complete = np.logical_and.reduce([~np.isnan(columns[x]) for x in feature_cols])
+        columns = {col: values[complete] for col, values in columns.items()}
+        columns["y"] = y[complete]
+        columns["label_date"] = label_date[complete]
+        return pd.DataFrame(columns)
 
     def get_raw_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
         train_end_date = self.inference_date - timedelta(days=1)
@@ -128,43 +229,87 @@ class CTRENDAllocator:
         ]
         return filtered_bithumb, outliers_for_train
 
-    def run(self):
-        filtered_bithumb, outliers_for_train = self.get_raw_data()
-        raw_features = self.get_features(filtered_bithumb)
-
-        train_set = (
-            raw_features.loc[
-                (raw_features["reg_date"] < self.inference_date)
-                & ~(raw_features["symbol"].isin(outliers_for_train))
-            ]
-            .dropna()
-            .reset_index(drop=True)
+    def fit_model(
+        self,
+        train_dates: pd.Series,
+        feature_cols: List[str],
+        train_X: np.ndarray,
+        train_y: np.ndarray,
+    ) -> lgb.Booster:
+        """registry에 같은 조건(schema, 학습 구간, 파라미터, 데이터)의 모델이 있으면 재사용하고, 없으면 학습해 저장한다."""
+        if not self.use_registry:
+            self.model.fit(train_X, train_y, feature_name=feature_cols)
+            return self.model.booster_
+
+        registry = get_model_registry()
+        train_end = train_dates.max()
+        meta = registry.get_meta(
+            feature_cols,
+            train_X,
+            train_y,
+            train_start=train_dates.min(),
+            train_end=train_end,
+            params=self.model.get_params(),
         )
-        inference_set = raw_features.loc[
-            (raw_features["reg_date"] == self.inference_date)
-        ].reset_index(drop=True)
+        booster = registry.load(meta["key"])
+        if booster is not None:
+            logger.info(f"저장된 모델 재사용: {meta['key']}")
+            return booster
+
+        init_model, X, y = None, train_X, train_y
+        if self.incremental:
+            prev = registry.find_latest(
+                meta["schema_hash"], meta["params_hash"], before=train_end
+            )
+            if prev and prev["num_trees"] + self.model.n_estimators <= self.max_trees:
+                new_rows = (
+                    train_dates > date.fromisoformat(prev["train_end"])
+                ).to_numpy()
+                if new_rows.any():
+                    logger.info(
+                        f"{prev['key']}에 이어서 {int(new_rows.sum())}행 추가 학습"
+                    )
+                    init_model = registry.load(prev["key"])
+                    X, y = train_X[new_rows], train_y[new_rows]
+
+        self.model.fit(X, y, feature_name=feature_cols, init_model=init_model)
+        registry.save(self.model.booster_, meta)
+        return self.model.booster_
+
+    def run(self):
+        with time_stage("raw_data"):
+            filtered_bithumb, outliers_for_train = self.get_raw_data()
+        with time_stage("features"):
+            raw_features = self.get_features(filtered_bithumb)
         label_cols = ["reg_date", "market", "symbol"]
+        feature_cols = [
+            x for x in raw_features.columns if x not in label_cols + ["y", "label_date"]
+        ]
 
-        train_label, train_y, train_X = (
-            train_set[label_cols],
-            train_set["y"],
-            train_set.drop(columns=["y"] + label_cols),
-        )
-        inference_label, inference_y, inference_X = (
-            inference_set[label_cols],
-            inference_set["y"],
-            inference_set.drop(columns=["y"] + label_cols),
-        )
-        self.model.fit(train_X, train_y)
-        pred = self.model.predict(inference_X)
-
-        pred_result = pd.concat(
-            [
-                inference_label,
-                inference_y.rename("real").reset_index(drop=True),
-                pd.Series(pred).rename("pred"),
-            ],
-            axis=1,
+        # feature는 float32 한 덩어리 행렬로 한 번만 꺼내고, 학습/추론 행은 행 번호로 고른다.
+        X = raw_features[feature_cols].to_numpy(dtype=np.float32)
+        y = raw_features["y"].to_numpy(dtype=np.float32)
+        metrics = get_metrics_registry()
+        metrics.gauge("feature_matrix_rows", "피처 행렬 행 수").set(X.shape[0])
+        metrics.gauge("feature_matrix_columns", "피처 행렬 컬럼 수").set(X.shape[1])
+        metrics.gauge("feature_matrix_bytes", "피처 행렬 크기(byte)").set(X.nbytes)
+        reg_date = raw_features["reg_date"]
+        train_rows = np.flatnonzero(
+            (reg_date < self.inference_date)
+            & ~(raw_features["symbol"].isin(outliers_for_train))
+            & ~np.isnan(y)
         )
+        inference_rows = np.flatnonzero(reg_date == self.inference_date)
+
+        with time_stage("fit"):
+            booster = self.fit_model(
+                reg_date.iloc[train_rows], feature_cols, X[train_rows], y[train_rows]
+            )
+        with time_stage("predict"):
+            pred = booster.predict(X[inference_rows])
 
-        return pred_result
+        inference_label = raw_features[label_cols].iloc[inference_rows]
+        pred_result = inference_label.astype({"market": str, "symbol": str})
+        pred_result["real"] = y[inference_rows]
+        pred_result["pred"] = pred
+        return pred_result.reset_index(drop=True)
@@ -0,0 +1,832 @@
+"""
+로컬 거래소 시뮬레이터 (paper trading / 부하 테스트용)
+
+BithumbClient와 src/upbit.py가 호출하는 v1 REST API를 과거 일봉 위에서 흉내낸다.
+
+    python -m src.exchange_sim --candles .cache/bithumb_1d.parquet --port 8765
+
+    BITHUMB_API_URL=http://127.0.0.1:8765 UPBIT_API_URL=http://127.0.0.1:8765 \
+    TRADE_JOURNAL_ENABLED=0 python main.py
+
+- 공개 API: v1/market/all, v1/ticker, v1/candles/days, v1/candles/minutes/{unit}
+- 인증 API: v1/accounts, v1/orders/chance, v1/orders(POST), v1/order, v1/deposits/krw(POST)
+- 관리 API: /sim/state(GET), /sim/advance?days=1(POST) - 기준일을 다음 일봉으로 옮긴다.
+
+기준일(as_of) 일봉 종가를 중심으로 호가창을 만들고, 주문은 호가를 소진하며 체결된다.
+체결 결과는 fill_delay초 뒤부터 v1/order에 state=done으로 보인다.
+지정가 주문의 미체결 잔량은 이후 advance로 넘어간 일봉의 고가/저가가 주문 가격에 닿으면 체결된다.
+JWT 서명은 secret을 줄 때만 검증하고, query_hash는 항상 요청 파라미터와 비교한다.
+이미 사용한 nonce로 다시 온 인증 요청은 401(nonce_used)로 거부한다.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qsl, unquote, urlencode, urlparse
+
+import jwt
+import pandas as pd
+
+from src.connection.http import TokenBucket
+from src.order_engine import MIN_ORDER_KRW
+
+logger = logging.getLogger(__name__)
+
+FEE_RATE = 0.0004
+# 실제 빗썸 호출 제한 (초당)
+PUBLIC_API_RATE = 150
+PRIVATE_API_RATE = 140
+KST = timezone(timedelta(hours=9))
+CANDLE_COLUMNS = ["reg_date", "market", "open", "high", "low", "close", "volume"]
+
+
+class SimulatorError(Exception):
+    """거래소 오류 응답 ({"error": {"name", "message"}})으로 변환되는 예외"""
+
+    def __init__(self, status: int, name: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.name = name
+        self.message = message
+
+    def to_dict(self) -> dict:
+        return {"error": {"name": self.name, "message": self.message}}
+
+
+def _fmt(value: float) -> str:
+    """API 응답의 숫자 문자열 (지수 표기 없이, 부동소수점 잔차는 0으로)"""
+    if abs(value) < 5e-9:
+        return "0"
+    return f"{value:.8f}".rstrip("0").rstrip(".")
+
+
+def _kst_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=KST).isoformat(timespec="seconds")
+
+
+class SimulatedExchange:
+    """
+    일봉 기준 in-memory 거래소 (thread-safe).
+
+    - candles: reg_date, market, open, high, low, close, volume 컬럼 (bithumb_crypto_1d 조회 결과 형식)
+    - 호가창은 market마다 종가 ± spread_bps/2에서 시작해 tick_bps 간격으로 depth_levels개를 두고,
+      전체 호가 물량은 그날 거래대금의 depth_ratio 비율이다. 소진된 호가는 advance 때 다시 채운다.
+    """
+
+    def __init__(
+        self,
+        candles: pd.DataFrame,
+        balances: Dict[str, float] = None,
+        as_of: date = None,
+        fee_rate: float = FEE_RATE,
+        spread_bps: float = 10,
+        tick_bps: float = 5,
+        depth_levels: int = 10,
+        depth_ratio: float = 0.01,
+        fill_delay: float = 0.0,
+    ) -> None:
+        candles = candles[CANDLE_COLUMNS].copy()
+        candles["reg_date"] = pd.to_datetime(candles["reg_date"]).dt.date
+        candles = candles.sort_values(by=["reg_date", "market"]).reset_index(drop=True)
+        self.candles = {
+            reg_date: group.set_index("market")
+            for reg_date, group in candles.groupby("reg_date", sort=True)
+        }
+        self.dates = sorted(self.candles)
+        self.history = {market: group for market, group in candles.groupby("market")}
+        self.as_of = as_of or self.dates[-1]
+        if self.as_of not in self.candles:
+            raise ValueError(f"{self.as_of} 일봉이 없습니다.")
+        self.fee_rate = fee_rate
+        self.spread_bps = spread_bps
+        self.tick_bps = tick_bps
+        self.depth_levels = depth_levels
+        self.depth_ratio = depth_ratio
+        self.fill_delay = fill_delay
+
+        self.balances: Dict[str, float] = {"KRW": 10_000_000.0, **(balances or {})}
+        self.locked: Dict[str, float] = {}
+        self.avg_buy_price: Dict[str, float] = {}
+        self.orders: Dict[str, dict] = {}
+        self.books: Dict[str, Dict[str, List[List[float]]]] = {}
+        self.deposits: List[dict] = []
+        self.lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # 시세
+    # ------------------------------------------------------------------
+    def get_candle(self, market: str, reg_date: date = None) -> pd.Series:
+        day = self.candles[reg_date or self.as_of]
+        if market not in day.index:
+            raise SimulatorError(404, "not_found_market", f"Code not found: {market}")
+        return day.loc[market]
+
+    def get_markets(self) -> List[dict]:
+        return [
+            {
+                "market": market,
+                "korean_name": market.split("-")[-1],
+                "english_name": market.split("-")[-1],
+            }
+            for market in self.candles[self.as_of].index
+        ]
+
+    def get_ticker(self, markets: List[str]) -> List[dict]:
+        result = []
+        for market in markets:
+            candle = self.get_candle(market)
+            result += [
+                {
+                    "market": market,
+                    "trade_date": self.as_of.strftime("%Y%m%d"),
+                    "opening_price": float(candle["open"]),
+                    "high_price": float(candle["high"]),
+                    "low_price": float(candle["low"]),
+                    "trade_price": float(candle["close"]),
+                    "acc_trade_volume_24h": float(candle["volume"]),
+                    "acc_trade_price_24h": float(candle["volume"] * candle["close"]),
+                    "timestamp": int(time.time() * 1000),
+                }
+            ]
+        return result
+
+    def get_day_candles(self, market: str, count: int, to: datetime) -> List[dict]:
+        """to 미만, 기준일 이하의 일봉을 최신순으로 count개 (빗썸 v1/candles/days 형식)"""
+        if market not in self.history:
+            raise SimulatorError(404, "not_found_market", f"Code not found: {market}")
+        history = self.history[market]
+        end = min(to.date() - timedelta(days=1), self.as_of)
+        history = history.loc[history["reg_date"] <= end].tail(min(count, 200))
+        result = []
+        prev_close = history["close"].shift(1)
+        for row, prev in zip(history.itertuples(index=False), prev_close):
+            kst = datetime.combine(row.reg_date, datetime.min.time())
+            result += [
+                {
+                    "market": market,
+                    "candle_date_time_utc": (kst - timedelta(hours=9)).strftime(
+                        "%Y-%m-%dT%H:%M:%S"
+                    ),
+                    "candle_date_time_kst": kst.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "opening_price": float(row.open),
+                    "high_price": float(row.high),
+                    "low_price": float(row.low),
+                    "trade_price": float(row.close),
+                    "timestamp": int(
+                        (
+                            kst - timedelta(hours=9) - datetime(1970, 1, 1)
+                        ).total_seconds()
+                        * 1000
+                    ),
+                    "candle_acc_trade_price": float(row.volume * row.close),
+                    "candle_acc_trade_volume": float(row.volume),
+                    "prev_closing_price": float(prev)
+                    if pd.notna(prev)
+                    else float(row.open),
+                }
+            ]
+        return result[::-1]
+
+    def get_book(self, market: str) -> Dict[str, List[List[float]]]:
+        """기준일 종가 중심의 합성 호가창 (소진된 수량은 그대로 유지)"""
+        book = self.books.get(market)
+        if book is None:
+            candle = self.get_candle(market)
+            close = float(candle["close"])
+            size = float(candle["volume"]) * self.depth_ratio / self.depth_levels
+            offsets = [
+                (self.spread_bps / 2 + i * self.tick_bps) / 1e4
+                for i in range(self.depth_levels)
+            ]
+            book = {
+                "asks": [[close * (1 + x), size] for x in offsets],
+                "bids": [[close * (1 - x), size] for x in offsets],
+            }
+            self.books[market] = book
+        return book
+
+    # ------------------------------------------------------------------
+    # 계좌
+    # ------------------------------------------------------------------
+    def get_accounts(self) -> List[dict]:
+        with self.lock:
+            currencies = [
+                x
+                for x in self.balances
+                if x == "KRW" or self.balances[x] > 0 or self.locked.get(x, 0) > 0
+            ]
+            return [
+                {
+                    "currency": currency,
+                    "balance": _fmt(self.balances[currency]),
+                    "locked": _fmt(self.locked.get(currency, 0)),
+                    "avg_buy_price": _fmt(self.avg_buy_price.get(currency, 0)),
+                    "avg_buy_price_modified": False,
+                    "unit_currency": "KRW",
+                }
+                for currency in currencies
+            ]
+
+    def get_chance(self, market: str) -> dict:
+        currency = market.split("-")[-1]
+        self.get_candle(market)
+        with self.lock:
+            return {
+                "bid_fee": _fmt(self.fee_rate),
+                "ask_fee": _fmt(self.fee_rate),
+                "market": {
+                    "id": market,
+                    "order_types": ["limit", "price", "market"],
+                    "bid": {"currency": "KRW", "min_total": str(MIN_ORDER_KRW)},
+                    "ask": {"currency": currency, "min_total": str(MIN_ORDER_KRW)},
+                    "state": "active",
+                },
+                "bid_account": {
+                    "currency": "KRW",
+                    "balance": _fmt(self.balances.get("KRW", 0)),
+                },
+                "ask_account": {
+                    "currency": currency,
+                    "balance": _fmt(self.balances.get(currency, 0)),
+                },
+            }
+
+    def deposit_krw(self, amount: float) -> dict:
+        with self.lock:
+            self.balances["KRW"] += amount
+            deposit = {
+                "type": "deposit",
+                "uuid": str(uuid.uuid4()),
+                "currency": "KRW",
+                "txid": str(uuid.uuid4()),
+                "state": "ACCEPTED",
+                "created_at": _kst_iso(time.time()),
+                "done_at": _kst_iso(time.time()),
+                "amount": _fmt(amount),
+                "fee": "0",
+                "transaction_type": "default",
+            }
+            self.deposits += [deposit]
+            return deposit
+
+    # ------------------------------------------------------------------
+    # 주문
+    # ------------------------------------------------------------------
+    def place_order(self, body: dict) -> dict:
+        market, side, ord_type = (
+            body.get("market"),
+            body.get("side"),
+            body.get("ord_type"),
+        )
+        if side not in ("bid", "ask") or ord_type not in ("limit", "price", "market"):
+            raise SimulatorError(
+                400,
+                "invalid_parameter",
+                f"잘못된 주문: side={side}, ord_type={ord_type}",
+            )
+        try:
+            volume = float(body["volume"]) if body.get("volume") is not None else None
+            price = float(body["price"]) if body.get("price") is not None else None
+        except ValueError:
+            raise SimulatorError(
+                400, "invalid_parameter", "volume/price는 숫자여야 합니다."
+            )
+        if (
+            (ord_type == "limit" and (volume is None or price is None))
+            or (ord_type == "price" and (side != "bid" or price is None))
+            or (ord_type == "market" and (side != "ask" or volume is None))
+        ):
+            raise SimulatorError(
+                400, "invalid_parameter", f"{ord_type} 주문 파라미터가 부족합니다."
+            )
+        currency = market.split("-")[-1]
+
+        with self.lock:
+            candle = self.get_candle(market)
+            total = (
+                price
+                if ord_type == "price"
+                else (price or float(candle["close"])) * volume
+            )
+            if total < MIN_ORDER_KRW:
+                name = "under_min_total_bid" if side == "bid" else "under_min_total_ask"
+                raise SimulatorError(
+                    400, name, f"최소주문금액 이상으로 주문해주세요 ({MIN_ORDER_KRW}원)"
+                )
+
+            # 주문에 필요한 잔고를 먼저 묶는다. (매수는 수수료 포함)
+            if side == "bid":
+                reserve, reserve_currency = total * (1 + self.fee_rate), "KRW"
+            else:
+                reserve, reserve_currency = volume, currency
+            if self.balances.get(reserve_currency, 0) + 1e-9 < reserve:
+                raise SimulatorError(
+                    400, "insufficient_funds_" + side, "주문가능한 금액이 부족합니다."
+                )
+            self.balances[reserve_currency] -= reserve
+            self.locked[reserve_currency] = (
+                self.locked.get(reserve_currency, 0) + reserve
+            )
+
+            order = {
+                "uuid": str(uuid.uuid4()),
+                "side": side,
+                "ord_type": ord_type,
+                "price": price,
+                "market": market,
+                "created_at": time.time(),
+                "volume": volume,
+                "remaining_volume": volume,
+                "remaining_funds": price if ord_type == "price" else None,
+                "reserved": reserve,
+                "reserved_currency": reserve_currency,
+                "paid_fee": 0.0,
+                "executed_volume": 0.0,
+                "trades": [],
+                "settle_at": time.time() + self.fill_delay,
+                "closed": False,
+            }
+            self.orders[order["uuid"]] = order
+            self.match(order)
+            if ord_type != "limit":
+                # 시장가 주문의 미체결 잔량은 취소된다.
+                self.close_order(order)
+            return self.to_response(order, with_trades=False, state="wait")
+
+    def match(self, order: dict):
+        """주문을 호가창에 대고 체결한다."""
+        book = self.get_book(order["market"])
+        levels = book["asks"] if order["side"] == "bid" else book["bids"]
+        limit = order["price"] if order["ord_type"] == "limit" else None
+        for level in levels:
+            level_price, level_size = level
+            if level_size <= 0:
+                continue
+            if limit is not None and (
+                (order["side"] == "bid" and level_price > limit)
+                or (order["side"] == "ask" and level_price < limit)
+            ):
+                break
+            if order["remaining_funds"] is not None:
+                qty = min(level_size, order["remaining_funds"] / level_price)
+            else:
+                qty = min(level_size, order["remaining_volume"])
+            if qty <= 0:
+                break
+            level[1] -= qty
+            self.fill(order, level_price, qty)
+            if self.is_filled(order):
+                break
+
+    @staticmethod
+    def is_filled(order: dict) -> bool:
+        if order["remaining_funds"] is not None:
+            return order["remaining_funds"] <= 1e-9
+        return order["remaining_volume"] <= 1e-12
+
+    def fill(self, order: dict, price: float, qty: float):
+        """체결 한 건을 잔고/주문에 반영한다."""
+        currency = order["market"].split("-")[-1]
+        funds = price * qty
+        fee = funds * self.fee_rate
+        if order["side"] == "bid":
+            spent = funds + fee
+            order["reserved"] -= spent
+            self.locked["KRW"] -= spent
+            prev = self.balances.get(currency, 0)
+            self.avg_buy_price[currency] = (
+                prev * self.avg_buy_price.get(currency, 0) + funds
+            ) / (prev + qty)
+            self.balances[currency] = prev + qty
+        else:
+            order["reserved"] -= qty
+            self.locked[currency] -= qty
+            self.balances["KRW"] += funds - fee
+        if order["remaining_funds"] is not None:
+            order["remaining_funds"] -= funds
+        else:
+            order["remaining_volume"] -= qty
+        order["executed_volume"] += qty
+        order["paid_fee"] += fee
+        order["trades"] += [
+            {
+                "market": order["market"],
+                "uuid": str(uuid.uuid4()),
+                "price": _fmt(price),
+                "volume": _fmt(qty),
+                "funds": _fmt(funds),
+                "side": order["side"],
+                "created_at": _kst_iso(time.time()),
+            }
+        ]
+        if self.is_filled(order):
+            self.close_order(order)
+
+    def close_order(self, order: dict):
+        """남은 예약 잔고를 돌려주고 주문을 닫는다."""
+        if order["closed"]:
+            return
+        currency = order["reserved_currency"]
+        self.locked[currency] -= order["reserved"]
+        self.balances[currency] += order["reserved"]
+        order["reserved"] = 0.0
+        order["closed"] = True
+
+    def get_order(self, id: str) -> dict:
+        with self.lock:
+            order = self.orders.get(id)
+            if order is None:
+                raise SimulatorError(404, "order_not_found", "주문을 찾지 못했습니다.")
+            if time.time() < order["settle_at"]:
+                return self.to_response(order, with_trades=False, state="wait")
+            return self.to_response(order, with_trades=True)
+
+    def to_response(self, order: dict, with_trades: bool, state: str = None) -> dict:
+        if state is None:
+            if not order["closed"]:
+                state = "wait"
+            elif self.is_filled(order):
+                state = "done"
+            else:
+                state = "cancel"
+        visible = with_trades or state != "wait"
+        response = {
+            "uuid": order["uuid"],
+            "side": order["side"],
+            "ord_type": order["ord_type"],
+            "price": None if order["price"] is None else _fmt(order["price"]),
+            "state": state,
+            "market": order["market"],
+            "created_at": _kst_iso(order["created_at"]),
+            "volume": None if order["volume"] is None else _fmt(order["volume"]),
+            "remaining_volume": (
+                None
+                if order["volume"] is None
+                else _fmt(order["remaining_volume"] if visible else order["volume"])
+            ),
+            "reserved_fee": _fmt(
+                order["reserved"] * self.fee_rate if order["side"] == "bid" else 0
+            ),
+            "remaining_fee": "0",
+            "paid_fee": _fmt(order["paid_fee"] if visible else 0),
+            "locked": _fmt(order["reserved"]),
+            "executed_volume": _fmt(order["executed_volume"] if visible else 0),
+            "trades_count": len(order["trades"]) if visible else 0,
+        }
+        if with_trades:
+            response["trades"] = list(order["trades"])
+        return response
+
+    # ------------------------------------------------------------------
+    # 시간 진행
+    # ------------------------------------------------------------------
+    def advance(self, days: int = 1) -> date:
+        """기준일을 다음 일봉으로 옮기고, 새 일봉 범위에 닿은 지정가 잔량을 체결한다."""
+        with self.lock:
+            index = self.dates.index(self.as_of)
+            as_of = self.dates[min(index + days, len(self.dates) - 1)]
+            if as_of == self.as_of:
+                return self.as_of
+            self.as_of = as_of
+            self.books = {}
+            day = self.candles[self.as_of]
+            for order in self.orders.values():
+                if order["closed"] or order["market"] not in day.index:
+                    continue
+                candle = day.loc[order["market"]]
+                if (order["side"] == "bid" and candle["low"] <= order["price"]) or (
+                    order["side"] == "ask" and candle["high"] >= order["price"]
+                ):
+                    self.fill(order, order["price"], order["remaining_volume"])
+            return self.as_of
+
+    def get_state(self) -> dict:
+        with self.lock:
+            return {
+                "as_of": self.as_of.isoformat(),
+                "n_orders": len(self.orders),
+                "n_open_orders": sum(not x["closed"] for x in self.orders.values()),
+                "accounts": self.get_accounts(),
+            }
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    """SimulatedExchange를 빗썸/업비트 REST API 형태로 노출한다."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        exchange: SimulatedExchange,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        public_rate: float = PUBLIC_API_RATE,
+        private_rate: float = PRIVATE_API_RATE,
+        secret: str = None,
+    ) -> None:
+        super().__init__((host, port), SimulatorHandler)
+        self.exchange = exchange
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.public_limiter = TokenBucket(rate=public_rate, capacity=public_rate)
+        self.private_limiter = TokenBucket(rate=private_rate, capacity=private_rate)
+        self.secret = secret
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        # Private 요청에서 본 JWT nonce (거래소처럼 재사용된 nonce는 거부한다)
+        self.nonces = set()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def use_nonce(self, header: str) -> bool:
+        """Authorization 헤더의 nonce를 기록하고, 이미 쓴 nonce면 True를 반환한다. (429로 거절된 요청 포함)"""
+        try:
+            payload = jwt.decode(header[7:], options={"verify_signature": False})
+        except jwt.PyJWTError:
+            return False  # 형식 오류는 authorize()에서 처리
+        nonce = payload.get("nonce")
+        if nonce is None:
+            return False
+        with self.stats_lock:
+            reused = nonce in self.nonces
+            self.nonces.add(nonce)
+        return reused
+
+    def start(self) -> "SimulatorServer":
+        """백그라운드 스레드에서 요청 처리를 시작한다."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # keep-alive에서 헤더/본문을 나눠 보낼 때 Nagle + delayed ACK로 생기는 ~40ms 지연 방지
+    disable_nagle_algorithm = True
+    server: SimulatorServer
+
+    # (method, path) → (처리 함수 이름, 인증 필요 여부)
+    ROUTES = {
+        ("GET", "/v1/market/all"): ("markets", False),
+        ("GET", "/v1/ticker"): ("ticker", False),
+        ("GET", "/v1/candles/days"): ("candles_days", False),
+        ("GET", "/v1/accounts"): ("accounts", True),
+        ("GET", "/v1/orders/chance"): ("orders_chance", True),
+        ("POST", "/v1/orders"): ("orders", True),
+        ("GET", "/v1/order"): ("order", True),
+        ("POST", "/v1/deposits/krw"): ("deposits_krw", True),
+        ("GET", "/sim/state"): ("sim_state", None),
+        ("POST", "/sim/advance"): ("sim_advance", None),
+    }
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        self.raw_query = parsed.query
+        self.query = dict(parse_qsl(parsed.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+
+        path = parsed.path
+        if path.startswith("/v1/candles/minutes/"):
+            route = ("candles_minutes", False)
+        else:
+            route = self.ROUTES.get((method, path))
+        if route is None:
+            return self.reply(
+                404, {"error": {"name": "not_found", "message": f"{method} {path}"}}
+            )
+        name, private = route
+        self.server.count(name)
+
+        self.nonce_reused = private and self.server.use_nonce(
+            self.headers.get("Authorization", "")
+        )
+        if private is not None:
+            limiter = (
+                self.server.private_limiter if private else self.server.public_limiter
+            )
+            if not limiter.try_acquire():
+                self.server.count("too_many_requests")
+                return self.reply(
+                    429,
+                    {
+                        "error": {
+                            "name": "too_many_requests",
+                            "message": "Too Many Requests",
+                        }
+                    },
+                )
+        latency = random.gauss(self.server.latency_ms, self.server.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+        try:
+            self.body = json.loads(raw_body) if raw_body else {}
+            if private:
+                self.authorize(self.body if method == "POST" else None)
+            result = getattr(self, "handle_" + name)()
+        except SimulatorError as e:
+            self.server.count(e.name)
+            return self.reply(e.status, e.to_dict())
+        except (ValueError, KeyError) as e:
+            return self.reply(
+                400, {"error": {"name": "invalid_parameter", "message": str(e)}}
+            )
+        self.reply(
+            201 if method == "POST" and name in ("orders", "deposits_krw") else 200,
+            result,
+        )
+
+    def reply(self, status: int, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorize(self, body: dict = None):
+        """Bearer JWT 확인. query_hash가 있으면 (unquote 여부와 무관하게) 파라미터의 SHA512와 같아야 한다."""
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            raise SimulatorError(
+                401, "jwt_verification", "Authorization 헤더가 없습니다."
+            )
+        try:
+            if self.server.secret is None:
+                payload = jwt.decode(header[7:], options={"verify_signature": False})
+            else:
+                payload = jwt.decode(
+                    header[7:], self.server.secret, algorithms=["HS256"]
+                )
+        except jwt.PyJWTError as e:
+            raise SimulatorError(401, "jwt_verification", str(e))
+        if not payload.get("access_key"):
+            raise SimulatorError(401, "jwt_verification", "access_key가 없습니다.")
+        if self.nonce_reused:
+            raise SimulatorError(401, "nonce_used", "이미 사용한 nonce입니다.")
+
+        query = urlencode(body) if body else self.raw_query
+        if not query:
+            return
+        expected = {
+            hashlib.sha512(x.encode("utf-8")).hexdigest()
+            for x in (query, unquote(query))
+        }
+        if payload.get("query_hash") not in expected:
+            raise SimulatorError(
+                401, "invalid_query_payload", "query_hash가 파라미터와 다릅니다."
+            )
+
+    def param(self, key: str) -> str:
+        if key not in self.query:
+            raise SimulatorError(
+                400, "invalid_parameter", f"{key} 파라미터가 필요합니다."
+            )
+        return self.query[key]
+
+    def handle_markets(self):
+        return self.server.exchange.get_markets()
+
+    def handle_ticker(self):
+        markets = [x.strip() for x in self.param("markets").split(",") if x.strip()]
+        return self.server.exchange.get_ticker(markets)
+
+    def handle_candles_days(self):
+        to = self.query.get("to")
+        to = datetime.fromisoformat(to) if to else datetime.max
+        return self.server.exchange.get_day_candles(
+            self.param("market"), int(self.query.get("count", 1)), to
+        )
+
+    def handle_candles_minutes(self):
+        # 일봉만 가지고 있으므로 분봉은 빈 응답
+        return []
+
+    def handle_accounts(self):
+        return self.server.exchange.get_accounts()
+
+    def handle_orders_chance(self):
+        return self.server.exchange.get_chance(self.param("market"))
+
+    def handle_orders(self):
+        return self.server.exchange.place_order(self.body)
+
+    def handle_order(self):
+        return self.server.exchange.get_order(self.param("uuid"))
+
+    def handle_deposits_krw(self):
+        return self.server.exchange.deposit_krw(float(self.body.get("amount", 0)))
+
+    def handle_sim_state(self):
+        with self.server.stats_lock:
+            stats = dict(self.server.stats)
+        return {**self.server.exchange.get_state(), "requests": stats}
+
+    def handle_sim_advance(self):
+        as_of = self.server.exchange.advance(int(self.query.get("days", 1)))
+        return {"as_of": as_of.isoformat()}
+
+
+def start_simulator(exchange: SimulatedExchange, **kwargs) -> SimulatorServer:
+    """임의 포트(port=0)에 시뮬레이터를 띄우고 서버 객체를 반환한다. (벤치마크/부하 테스트용)"""
+    return SimulatorServer(exchange, **kwargs).start()
+
+
+def load_candles(path: str = None, days: int = 60) -> pd.DataFrame:
+    """parquet/csv 파일, 또는 (path가 없으면) 로컬 bithumb_crypto_1d 캐시의 최근 days일"""
+    if path:
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_csv(path)
+    from src.ctrend_model import CTRENDAllocator
+
+    end_date = datetime.combine(date.today(), datetime.min.time())
+    return CTRENDAllocator(offline=True).get_bithumb_raw_from_bq(
+        start_date=end_date - timedelta(days=days), end_date=end_date
+    )
+
+
+def _parse_balances(values: List[str]) -> Dict[str, float]:
+    result = {}
+    for value in values:
+        currency, amount = value.split("=")
+        result[currency] = float(amount)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="로컬 거래소 시뮬레이터 (빗썸/업비트 v1 API)"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--candles",
+        type=str,
+        default=None,
+        help="일봉 parquet/csv (기본: 로컬 BigQuery 캐시)",
+    )
+    parser.add_argument("--days", type=int, default=60, help="캐시에서 읽을 기간(일)")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None)
+    parser.add_argument(
+        "--balance", type=str, nargs="*", default=[], help="예: KRW=10000000 ETH=0.5"
+    )
+    parser.add_argument("--fill-delay", type=float, default=0.5)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--public-rate", type=float, default=PUBLIC_API_RATE)
+    parser.add_argument("--private-rate", type=float, default=PRIVATE_API_RATE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    exchange = SimulatedExchange(
+        load_candles(args.candles, args.days),
+        balances=_parse_balances(args.balance),
+        as_of=args.as_of,
+        fill_delay=args.fill_delay,
+    )
+    server = SimulatorServer(
+        exchange,
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        public_rate=args.public_rate,
+        private_rate=args.private_rate,
+    )
+    logger.info(f"exchange simulator: {server.url} (as_of={exchange.as_of})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
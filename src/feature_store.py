@@ -1,14 +1,20 @@
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Tuple
 
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import StandardScaler
 from statsmodels.tsa.regime_switching.markov_regression import MarkovRegression
 
+from src.config.env import PROJECT_ROOT
+from src.config.helper import atomic_path
 from src.connection.bigquery import get_bq_conn
 
-bq_conn = get_bq_conn()
-
 
 class FeatureStoreByCrypto:
     def __init__(self, data: pd.DataFrame, date_col: str) -> None:
@@ -96,10 +102,8 @@ class FeatureStoreByCrypto:
 
         # self.data['TP'].rolling(window=window).sum()
         self.data["MA_TP"] = self.data["TP"].rolling(window=window).mean()
-        self.data["mean_deviation_TP"] = (
-            self.data["TP"]
-            .rolling(window=window)
-            .apply(lambda x: abs(x - x.mean()).mean(), raw=True)
+        self.data["mean_deviation_TP"] = rolling_mean_abs_deviation(
+            self.data["TP"].to_numpy(dtype=float), window=window
         )
         self.data["CCI"] = (self.data["TP"] - self.data["MA_TP"]) / (
             0.015 * self.data["mean_deviation_TP"]
@@ -185,21 +189,8 @@ class FeatureStoreByCrypto:
         self.data = self.data.drop(columns=["std"])
 
     def set_markov_regime_switching(self):
-        df = self.data.copy()
-        # df['returns'] = np.log(df['close'] / df['close'].shift(1))  # Log returns
-        df["returns"] = df["close"] / df["close"].shift(1)  # Log returns
-        df = df.dropna()
-
-        df["returns"] = StandardScaler().fit_transform(df[["returns"]])
-
-        model = MarkovRegression(
-            df["returns"], k_regimes=2, switching_variance=True
-        ).fit()
-        smoothed_marginal_probabilities = model.smoothed_marginal_probabilities
-        result = pd.DataFrame(smoothed_marginal_probabilities[0].rename("regime_prob"))
-
-        cutoff = result["regime_prob"].mean()
-        result["regime"] = np.where(result["regime_prob"] >= cutoff, 0, 1)
+        # 다른 피처가 모두 있는 행(rolling warm-up 이후)만으로 적합한다.
+        result = get_markov_regime(self.data["close"], self.data.notna().all(axis=1))
         self.data = self.data.merge(
             result[["regime"]], left_index=True, right_index=True, how="left"
         )
@@ -232,18 +223,882 @@ class FeatureStoreByCrypto:
         self.set_markov_regime_switching()
 
 
+def get_markov_regime(close: pd.Series, sample: pd.Series = None) -> pd.DataFrame:
+    """종가 시계열 하나에 2-국면 MarkovRegression을 적합해 국면(regime)을 구한다.
+
+    sample을 주면 그 행(True)만으로 표준화·적합·cutoff를 계산한다. 수익률은 원래 시계열의
+    직전 행 대비로 구한 뒤 거른다. (기존 구현은 다른 피처가 모두 있는 행만 dropna로 남겨 적합했다)
+    """
+    df = close.to_frame(name="close")
+    # df['returns'] = np.log(df['close'] / df['close'].shift(1))  # Log returns
+    df["returns"] = df["close"] / df["close"].shift(1)  # Log returns
+    if sample is not None:
+        df = df.loc[sample.to_numpy(dtype=bool)]
+    df = df.dropna()
+
+    df["returns"] = StandardScaler().fit_transform(df[["returns"]])
+
+    model = MarkovRegression(df["returns"], k_regimes=2, switching_variance=True).fit()
+    smoothed_marginal_probabilities = model.smoothed_marginal_probabilities
+    result = pd.DataFrame(smoothed_marginal_probabilities[0].rename("regime_prob"))
+
+    cutoff = result["regime_prob"].mean()
+    result["regime"] = np.where(result["regime_prob"] >= cutoff, 0, 1)
+    return result
+
+
+def fit_markov_params(returns: np.ndarray) -> np.ndarray:
+    """표준화된 수익률 하나에 2-국면 MarkovRegression을 EM 적합해 파라미터를 반환한다.
+
+    파라미터 순서: p[0->0], p[1->0], const[0], const[1], sigma2[0], sigma2[1]
+    """
+    try:
+        model = MarkovRegression(returns, k_regimes=2, switching_variance=True).fit()
+        return np.asarray(model.params, dtype=float)
+    except Exception:
+        return np.full(6, np.nan)
+
+
+def markov_smoothed_probs(returns: np.ndarray, params: np.ndarray) -> np.ndarray:
+    """(date × market) 수익률에 market별 고정 파라미터로 Hamilton filter + Kim smoother를 적용한다.
+
+    statsmodels `MarkovRegression.smooth(params)`의 regime 0 smoothed 확률과 같은 값을
+    모든 market에 대해 한 번에(날짜 축 loop 1회) 계산한다.
+    NaN 행(상장 이전, 적합 표본 밖)은 fit_markov_params와 같이 시계열에서 뺀 것으로 보고
+    전이 없이 건너뛴다. 결과도 NaN이다.
+    params: (market × 6), 순서는 fit_markov_params와 같다.
+    """
+    n_rows, n_markets = returns.shape
+    p00, p10, const, sigma2 = params[:, 0], params[:, 1], params[:, 2:4], params[:, 4:6]
+    # transition[:, i, j] = P(S_t = i | S_{t-1} = j)
+    transition = np.stack(
+        [np.stack([p00, p10], axis=1), np.stack([1 - p00, 1 - p10], axis=1)], axis=1
+    )
+    # 초기 확률은 statsmodels 기본값과 같은 정상(ergodic) 분포
+    pi0 = p10 / (1 - p00 + p10)
+    predicted = np.stack([pi0, 1 - pi0], axis=1)
+
+    predicted_all = np.empty((n_rows, n_markets, 2))
+    filtered_all = np.empty((n_rows, n_markets, 2))
+    for t in range(n_rows):
+        predicted_all[t] = predicted
+        r = returns[t][:, None]
+        likelihood = np.exp(-0.5 * (r - const) ** 2 / sigma2) / np.sqrt(
+            2 * np.pi * sigma2
+        )
+        joint = predicted * likelihood
+        filtered = joint / joint.sum(axis=1, keepdims=True)
+        observed = ~np.isnan(returns[t])
+        filtered = np.where(observed[:, None], filtered, predicted)
+        filtered_all[t] = filtered
+        predicted = np.where(
+            observed[:, None], np.einsum("mij,mj->mi", transition, filtered), predicted
+        )
+
+    smoothed = np.full((n_rows, n_markets, 2), np.nan)
+    # ratio: market별로 뒤쪽에서 가장 가까운 관측 행의 smoothed / predicted
+    ratio = np.ones((n_markets, 2))
+    seen = np.zeros(n_markets, dtype=bool)  # 뒤쪽에 관측 행이 있었는지
+    for t in range(n_rows - 1, -1, -1):
+        observed = ~np.isnan(returns[t])
+        current = np.where(
+            seen[:, None],
+            filtered_all[t] * np.einsum("mij,mi->mj", transition, ratio),
+            filtered_all[t],
+        )
+        smoothed[t] = np.where(observed[:, None], current, np.nan)
+        ratio = np.where(observed[:, None], current / predicted_all[t], ratio)
+        seen |= observed
+    result = smoothed[:, :, 0]
+    result[np.isnan(returns)] = np.nan
+    return result
+
+
+class MarkovRegimeCache:
+    """market별 MarkovRegression 파라미터와 적합 기준일을 보관한다.
+
+    기준일(데이터 마지막 날짜)로부터 refit_days가 지나지 않았으면 저장된 파라미터로
+    filtering/smoothing만 하고, 지났거나 과거 데이터를 다시 계산하는 경우에만 EM으로 재적합한다.
+    """
+
+    default_path = os.path.join(PROJECT_ROOT, ".cache", "markov_params.pkl")
+    # 적합 표본이 바뀌면 올린다. (버전이 다른 캐시 파일은 버리고 재적합)
+    VERSION = 2
+
+    def __init__(self, refit_days: int = 7) -> None:
+        self.version = self.VERSION
+        self.refit_days = refit_days
+        self.params = {}  # market -> (params, 적합 기준일)
+
+    def get(self, market: str, as_of: date):
+        entry = self.params.get(market)
+        if entry is None:
+            return None
+        params, fitted_at = entry
+        if as_of < fitted_at or (as_of - fitted_at).days >= self.refit_days:
+            return None
+        return params
+
+    def set(self, market: str, params: np.ndarray, as_of: date):
+        self.params[market] = (params, as_of)
+
+    def save(self, path: str = None):
+        # run/test job이 동시에 저장할 수 있으므로 고유한 임시 파일을 거쳐 교체한다.
+        with atomic_path(path or self.default_path) as tmp, open(tmp, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path: str = None, refit_days: int = 7) -> "MarkovRegimeCache":
+        """저장된 캐시를 읽는다. 없거나 깨졌으면 빈 캐시를 반환한다."""
+        try:
+            with open(path or cls.default_path, "rb") as f:
+                cache = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            cache = cls()
+        if getattr(cache, "version", None) != cls.VERSION:
+            cache = cls()
+        cache.refit_days = refit_days
+        return cache
+
+
+def _rolling_reduce(values: np.ndarray, window: int, func) -> np.ndarray:
+    """(date × market) 배열의 각 market 열에 길이 window의 rolling 집계를 적용한다.
+
+    pandas의 `.rolling(window)` 기본값(min_periods=window)과 같이
+    window를 채우지 못했거나 NaN이 섞인 구간은 NaN이 된다.
+    """
+    n_rows, n_markets = values.shape
+    result = np.full((n_markets, n_rows), np.nan)
+    if n_rows >= window:
+        # market 축을 앞으로 보내 window 축이 연속 메모리가 되도록 한다.
+        windows = sliding_window_view(
+            np.ascontiguousarray(values.T), window_shape=window, axis=1
+        )
+        result[:, window - 1 :] = func(windows, axis=-1)
+    return result.T
+
+
+def rolling_mean_abs_deviation(
+    values: np.ndarray, window: int, chunk_size: int = 256
+) -> np.ndarray:
+    """rolling 평균절대편차(mean absolute deviation)를 벡터 연산으로 계산한다.
+
+    `.rolling(window).apply(lambda x: abs(x - x.mean()).mean(), raw=True)`와 같은 값을
+    1차원 시계열 또는 (date × market) 배열 전체에 대해 Python 호출 없이 구한다.
+    window 축을 펼친 임시 배열이 커지지 않도록 chunk_size 행씩 나눠 집계한다.
+    """
+    values = np.asarray(values, dtype=float)
+    is_series = values.ndim == 1
+    if is_series:
+        values = values[:, np.newaxis]
+
+    n_rows, n_markets = values.shape
+    result = np.full((n_markets, n_rows), np.nan)
+    if n_rows >= window:
+        windows = sliding_window_view(
+            np.ascontiguousarray(values.T), window_shape=window, axis=1
+        )
+        for start in range(0, windows.shape[1], chunk_size):
+            block = windows[:, start : start + chunk_size]
+            deviation = np.abs(block - block.mean(axis=-1, keepdims=True))
+            offset = window - 1 + start
+            result[:, offset : offset + block.shape[1]] = deviation.mean(axis=-1)
+    return result[0] if is_series else result.T
+
+
+def rolling_moments(
+    values: np.ndarray,
+    mean_windows: Iterable[int] = (),
+    std_windows: Iterable[int] = (),
+    out: np.ndarray = None,
+) -> np.ndarray:
+    """(date × market) 배열의 여러 window rolling 평균/표준편차(ddof=1)를 계산한다.
+
+    결과는 (len(mean_windows) + len(std_windows), date, market) 블록에
+    [평균..., 표준편차...] 순으로 쓴다. out을 주면 그 블록에 바로 쓴다.
+    pandas `.rolling(window)`와 같이 window를 채우지 못했거나 NaN/inf가 섞인 구간은 NaN이다.
+    - 평균은 누적합 한 번으로 모든 window를 계산한다. 누적합의 자릿수 손실을 줄이기 위해
+      market별 평균을 빼고 누적한 뒤 다시 더한다.
+    - 표준편차는 Σx² - (Σx)²/n 누적합 공식이 가격 수준에 비해 변동이 작으면(1e8원대 가격 등)
+      자릿수를 크게 잃으므로, window 안 편차 제곱합을 두 번 훑어 직접 계산한다. (_rolling_sq_deviation)
+    """
+    mean_windows, std_windows = tuple(mean_windows), tuple(std_windows)
+    values = np.asarray(values, dtype=float)
+    n_rows, n_markets = values.shape
+    if out is None:
+        out = np.empty((len(mean_windows) + len(std_windows), n_rows, n_markets))
+
+    valid = np.isfinite(values)
+    n_valid = valid.sum(axis=0)
+    offset = np.where(valid, values, 0).sum(axis=0) / np.maximum(n_valid, 1)
+    shifted = np.where(valid, values - offset, 0)
+
+    # 앞에 0행을 붙인 누적합: 구간 [i - w, i)의 합 = cum[i] - cum[i - w]
+    cum = np.zeros((n_rows + 1, n_markets))
+    np.cumsum(shifted, axis=0, out=cum[1:])
+    invalid = np.zeros((n_rows + 1, n_markets), dtype=np.int64)
+    np.cumsum(~valid, axis=0, out=invalid[1:])
+    # 값이 변하지 않는 window(거래 없는 구간의 gain/loss, 가격이 고정된 구간 등)는
+    # 누적합 오차 없이 평균 = 그 값, 표준편차 = 0이 되도록 값이 바뀐 횟수를 따로 센다.
+    changes = np.zeros((n_rows + 1, n_markets), dtype=np.int64)
+    np.cumsum(values[1:] != values[:-1], axis=0, out=changes[2:])
+
+    windows = [(w, False) for w in mean_windows] + [(w, True) for w in std_windows]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for block, (window, is_std) in zip(out, windows):
+            block[: window - 1] = np.nan
+            if window > n_rows:
+                continue
+            body = block[window - 1 :]
+            if is_std:
+                _rolling_sq_deviation(shifted, window, out=body)
+                np.divide(body, window - 1, out=body)
+                np.sqrt(body, out=body)
+            else:
+                np.subtract(cum[window:], cum[:-window], out=body)
+                np.divide(body, window, out=body)
+                body += offset
+            constant = changes[window:] == changes[1 : n_rows + 2 - window]
+            body[constant] = 0 if is_std else values[window - 1 :][constant]
+            body[invalid[window:] != invalid[:-window]] = np.nan
+    return out
+
+
+def _rolling_sq_deviation(
+    values: np.ndarray, window: int, out: np.ndarray, chunk_size: int = 256
+) -> np.ndarray:
+    """(date × market) 배열의 window별 Σ(x - window 평균)²를 out[i - window + 1]에 쓴다.
+
+    window 축을 펼친 임시 배열이 커지지 않도록 chunk_size 행씩 나눠 계산한다.
+    """
+    windows = sliding_window_view(values, window_shape=window, axis=0)
+    for start in range(0, len(windows), chunk_size):
+        block = windows[start : start + chunk_size]
+        deviation = block - block.mean(axis=-1, keepdims=True)
+        np.einsum(
+            "...i,...i->...", deviation, deviation, out=out[start : start + len(block)]
+        )
+    return out
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    return rolling_moments(values, mean_windows=(window,))[0]
+
+
+def _rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    return rolling_moments(values, std_windows=(window,))[0]
+
+
+def _rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_reduce(values, window, np.min)
+
+
+def _rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_reduce(values, window, np.max)
+
+
+class FeatureSpec:
+    """
+    피처 계산 단위: inputs(원천 컬럼 또는 다른 피처)로 outputs 컬럼을 (date × market) 배열로 만든다.
+    rolling에는 func이 쓰는 (컬럼, window, 종류)를 선언해 같은 컬럼의 평균/표준편차를 한 번에 계산하게 한다.
+    lag는 func이 직접 참조하는 이전 행 수(diff 등)로, rolling과 함께 필요한 이력 길이(get_lookback)를 정한다.
+    """
+
+    def __init__(
+        self,
+        outputs: Tuple[str, ...],
+        inputs: Tuple[str, ...],
+        func: Callable,
+        rolling: Tuple[Tuple[str, int, str], ...] = (),
+        lag: int = 0,
+    ):
+        self.outputs = outputs
+        self.inputs = inputs
+        self.func = func
+        self.rolling = rolling
+        self.lag = lag
+
+
+SMA_SIZES = (3, 5, 10, 20, 50, 100, 200)
+# 피처 이름 → FeatureSpec. '_'로 시작하는 이름은 다른 피처만 쓰는 중간 결과다.
+FEATURE_REGISTRY: Dict[str, FeatureSpec] = {}
+RAW_COLUMNS = ("close", "high", "low", "volume")
+MARKOV_FEATURE = "regime"  # MarkovRegimeCache를 쓰므로 그래프 밖에서 따로 계산한다.
+
+
+def register_feature(
+    outputs: Iterable[str],
+    inputs: Iterable[str] = (),
+    rolling: Iterable[Tuple[str, int, str]] = (),
+    lag: int = 0,
+):
+    """FeatureGraph를 받아 outputs 순서대로 배열(1개면 배열 하나)을 돌려주는 함수를 등록한다."""
+
+    def decorator(func: Callable) -> Callable:
+        spec = FeatureSpec(tuple(outputs), tuple(inputs), func, tuple(rolling), lag)
+        for output in spec.outputs:
+            FEATURE_REGISTRY[output] = spec
+        return func
+
+    return decorator
+
+
+def resolve_features(features: Iterable[str]) -> List[str]:
+    """요청한 피처와 그 의존 피처 전체를 의존 순서(위상 정렬)로 돌려준다."""
+    order, visiting = [], set()
+
+    def visit(name: str):
+        if name in order or name in RAW_COLUMNS:
+            return
+        if name not in FEATURE_REGISTRY:
+            raise ValueError(f"등록되지 않은 피처: {name}")
+        if name in visiting:
+            raise ValueError(f"피처 의존성에 순환이 있음: {name}")
+        visiting.add(name)
+        for x in FEATURE_REGISTRY[name].inputs:
+            visit(x)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in features:
+        if name != MARKOV_FEATURE:
+            visit(name)
+    return order
+
+
+def get_lookback(features: Iterable[str]) -> int:
+    """
+    features의 한 행을 계산하는 데 필요한 이전 행 수. (regime 제외)
+    이보다 앞선 캔들은 결과에 영향을 주지 않으므로, 그 뒤 행은 잘린 이력으로 계산해도 전체 재계산과 같다.
+    """
+    features = [x for x in features if x != MARKOV_FEATURE]
+    lookback = dict.fromkeys(RAW_COLUMNS, 0)
+    for name in resolve_features(features):
+        spec = FEATURE_REGISTRY[name]
+        lookback[name] = max(
+            [spec.lag]
+            + [lookback[x] for x in spec.inputs]
+            + [window - 1 + lookback[col] for col, window, _ in spec.rolling]
+        )
+    return max((lookback[x] for x in features), default=0)
+
+
+class FeatureGraph:
+    """
+    FEATURE_REGISTRY의 DAG 중 요청된 부분만 lazy하게 계산한다.
+    - 피처/중간 결과는 한 번만 계산해 memoize 한다.
+    - rolling window 결과도 (컬럼, window, 종류) 단위로 공유한다. (SMA_20과 Boll_mid, MACD와 volMACD의 26일 평균 등)
+    - 한 컬럼에 선언된 평균/표준편차 window는 처음 요청될 때 rolling_moments 한 번으로 모두 계산한다.
+    """
+
+    ROLLING_FUNCS = {
+        "min": lambda values, window: _rolling_min(values, window),
+        "max": lambda values, window: _rolling_max(values, window),
+    }
+
+    def __init__(
+        self, panel: "FeatureStoreByPanel", features: Iterable[str] = None
+    ) -> None:
+        self.panel = panel
+        self.values: Dict[str, np.ndarray] = {}
+        self.rolled: Dict[Tuple[str, int, str], np.ndarray] = {}
+        # 컬럼 → 계산 예정인 (window, 종류) 목록
+        self.planned: Dict[str, set] = {}
+        names = resolve_features(DEFAULT_FEATURES if features is None else features)
+        for spec in {id(x): x for x in map(FEATURE_REGISTRY.get, names)}.values():
+            for col, window, kind in spec.rolling:
+                self.planned.setdefault(col, set()).add((window, kind))
+
+    def get(self, name: str) -> np.ndarray:
+        if name not in self.values:
+            if name in RAW_COLUMNS:
+                self.values[name] = self.panel.to_panel(name)
+            else:
+                spec = FEATURE_REGISTRY[name]
+                result = spec.func(self)
+                if len(spec.outputs) == 1:
+                    result = (result,)
+                self.values.update(zip(spec.outputs, result))
+        return self.values[name]
+
+    def rolling(self, name: str, window: int, kind: str = "mean") -> np.ndarray:
+        key = (name, window, kind)
+        if key in self.rolled:
+            return self.rolled[key]
+        if kind in self.ROLLING_FUNCS:
+            self.rolled[key] = self.ROLLING_FUNCS[kind](self.get(name), window)
+            return self.rolled[key]
+
+        pending = {(window, kind)} | self.planned.get(name, set())
+        pending = {x for x in pending if x[1] in ("mean", "std")}
+        pending = {x for x in pending if (name,) + x not in self.rolled}
+        mean_windows = sorted(w for w, k in pending if k == "mean")
+        std_windows = sorted(w for w, k in pending if k == "std")
+        block = rolling_moments(self.get(name), mean_windows, std_windows)
+        keys = [(name, w, "mean") for w in mean_windows] + [
+            (name, w, "std") for w in std_windows
+        ]
+        self.rolled.update(zip(keys, block))
+        return self.rolled[key]
+
+
+# 모멘텀 오실레이터
+@register_feature(outputs=("_gain", "_loss"), inputs=("close",), lag=1)
+def _gain_loss(graph: FeatureGraph):
+    price_diff = np.diff(graph.get("close"), axis=0, prepend=np.nan)
+    # 기존 구현과 같이 첫 행의 diff(NaN)는 gain/loss 0으로 취급하고, 상장 이전은 NaN
+    listed = graph.panel.listed
+    gain = np.where(listed, np.where(price_diff > 0, price_diff, 0), np.nan)
+    loss = np.where(listed, np.where(price_diff < 0, np.abs(price_diff), 0), np.nan)
+    return gain, loss
+
+
+@register_feature(
+    outputs=("RSI",),
+    inputs=("_gain", "_loss"),
+    rolling=(("_gain", 14, "mean"), ("_loss", 14, "mean")),
+)
+def _RSI(graph: FeatureGraph, window: int = 14):
+    AU = graph.rolling("_gain", window)
+    AD = graph.rolling("_loss", window)
+    return AU / (AU + AD) * 100
+
+
+@register_feature(
+    outputs=("stochK",),
+    inputs=("close",),
+    rolling=(("close", 14, "min"), ("close", 14, "max")),
+)
+def _stochK(graph: FeatureGraph, window: int = 14):
+    lowest = graph.rolling("close", window, "min")
+    highest = graph.rolling("close", window, "max")
+    return (graph.get("close") - lowest) / (highest - lowest) * 100
+
+
+@register_feature(
+    outputs=("stochD",), inputs=("stochK",), rolling=(("stochK", 3, "mean"),)
+)
+def _stochD(graph: FeatureGraph, window: int = 3):
+    return graph.rolling("stochK", window)
+
+
+@register_feature(
+    outputs=("stochRSI",),
+    inputs=("RSI",),
+    rolling=(("RSI", 14, "min"), ("RSI", 14, "max")),
+)
+def _stochRSI(graph: FeatureGraph, window: int = 14):
+    lowest = graph.rolling("RSI", window, "min")
+    highest = graph.rolling("RSI", window, "max")
+    return (graph.get("RSI") - lowest) / (highest - lowest) * 100
+
+
+@register_feature(outputs=("TP",), inputs=("high", "low", "close"))
+def _TP(graph: FeatureGraph):
+    return (graph.get("high") + graph.get("low") + graph.get("close")) / 3
+
+
+@register_feature(outputs=("CCI",), inputs=("TP",), rolling=(("TP", 20, "mean"),))
+def _CCI(graph: FeatureGraph, window: int = 20):
+    # 기본 피처에는 포함되지 않는다. (기존 구현도 CCI는 계산 후 버리고 TP만 남겼음)
+    TP = graph.get("TP")
+    mean_deviation = rolling_mean_abs_deviation(TP, window)
+    return (TP - graph.rolling("TP", window)) / (0.015 * mean_deviation)
+
+
+# 이동평균 지표
+for _col, _prefix in (("close", "SMA"), ("volume", "volSMA")):
+    for _size in SMA_SIZES:
+        register_feature(
+            outputs=(f"{_prefix}_{_size}",),
+            inputs=(_col,),
+            rolling=((_col, _size, "mean"),),
+        )(lambda graph, col=_col, size=_size: graph.rolling(col, size))
+del _col, _prefix, _size
+
+
+@register_feature(
+    outputs=("MACD",),
+    inputs=("close",),
+    rolling=(("close", 12, "mean"), ("close", 26, "mean")),
+)
+def _MACD(graph: FeatureGraph, fast_window: int = 12, slow_window: int = 26):
+    return graph.rolling("close", fast_window) - graph.rolling("close", slow_window)
+
+
+@register_feature(
+    outputs=("volMACD",),
+    inputs=("volume", "close"),
+    rolling=(("volume", 12, "mean"), ("close", 26, "mean")),
+)
+def _volMACD(graph: FeatureGraph, fast_window: int = 12, slow_window: int = 26):
+    # volMACD의 slow window는 기존과 같이 close 기준
+    return graph.rolling("volume", fast_window) - graph.rolling("close", slow_window)
+
+
+@register_feature(
+    outputs=("MACD_diff_signal",), inputs=("MACD",), rolling=(("MACD", 9, "mean"),)
+)
+def _MACD_signal(graph: FeatureGraph, window: int = 9):
+    return graph.get("MACD") - graph.rolling("MACD", window)
+
+
+@register_feature(
+    outputs=("volMACD_diff_signal",),
+    inputs=("volMACD",),
+    rolling=(("volMACD", 9, "mean"),),
+)
+def _volMACD_signal(graph: FeatureGraph, window: int = 9):
+    return graph.get("volMACD") - graph.rolling("volMACD", window)
+
+
+# 거래량 지표
+@register_feature(outputs=("_AD",), inputs=("close", "high", "low", "volume"))
+def _AD(graph: FeatureGraph):
+    close, high, low = graph.get("close"), graph.get("high"), graph.get("low")
+    return ((close - low) - (high - close)) / (high - low) * graph.get("volume")
+
+
+@register_feature(
+    outputs=("Chaikin",),
+    inputs=("_AD",),
+    rolling=(("_AD", 3, "mean"), ("_AD", 10, "mean")),
+)
+def _Chaikin(graph: FeatureGraph, fast_window: int = 3, slow_window: int = 10):
+    return graph.rolling("_AD", fast_window) - graph.rolling("_AD", slow_window)
+
+
+# 변동성 지표
+@register_feature(
+    outputs=("Boll_mid", "Boll_up", "Boll_low", "Boll_width"),
+    inputs=("close",),
+    rolling=(("close", 20, "mean"), ("close", 20, "std")),
+)
+def _bollinger(graph: FeatureGraph, window: int = 20):
+    k = 2  # 표준편차 배수 (일반적으로 2)
+    mid = graph.rolling("close", window)  # SMA_20과 공유
+    std = graph.rolling("close", window, "std")
+    up, low = mid + (k * std), mid - (k * std)
+    return mid, up, low, up - low
+
+
+# 기존 set_features의 피처와 컬럼 순서 (모델 registry의 schema hash가 이 순서에 의존한다)
+DEFAULT_FEATURES = (
+    ("RSI", "stochK", "stochD", "stochRSI", "TP")
+    + tuple(f"SMA_{i}" for i in SMA_SIZES)
+    + ("MACD", "MACD_diff_signal")
+    + tuple(f"volSMA_{i}" for i in SMA_SIZES)
+    + ("volMACD", "volMACD_diff_signal", "Chaikin")
+    + ("Boll_mid", "Boll_up", "Boll_low", "Boll_width", MARKOV_FEATURE)
+)
+
+
+class FeatureStoreByPanel:
+    """전체 market의 CTREND 피처를 (date × market) 배열에서 한 번에 계산한다.
+
+    market별 `FeatureStoreByCrypto`를 groupby loop로 돌린 결과와 동일한 출력을 낸다.
+    rolling window는 날짜가 아닌 market별 행 순서 기준이므로, 각 market의 이력을
+    배열 하단(최근 시점)에 맞춰 채우고 상장 이전 구간은 NaN으로 둔다.
+    """
+
+    SMA_SIZES = SMA_SIZES
+
+    def __init__(
+        self, data: pd.DataFrame, date_col: str, market_col: str = "market"
+    ) -> None:
+        # groupby(market) → set_index(date).sort_index() → concat 순서와 동일하게 정렬
+        data = data.sort_values(by=[market_col, date_col], kind="stable")
+        self.data = data.set_index(keys=[date_col])
+        self.market_col = market_col
+
+        codes, self.markets = pd.factorize(self.data[market_col], sort=True)
+        position = self.data.groupby(market_col, sort=False).cumcount().to_numpy()
+        lengths = np.bincount(codes)
+        self.n_rows = int(lengths.max()) if len(lengths) else 0
+        # (행 위치, market 코드): 각 market의 마지막 행이 배열의 마지막 행에 오도록 정렬
+        self._rows = self.n_rows - lengths[codes] + position
+        self._cols = codes
+        self.position = position  # market 안에서의 행 순서
+        # 실제 캔들이 있는 칸(상장 이전 padding 제외)
+        self.listed = np.zeros((self.n_rows, len(self.markets)), dtype=bool)
+        self.listed[self._rows, self._cols] = True
+
+    def to_panel(self, col: str) -> np.ndarray:
+        """long 포맷 컬럼을 (date × market) 배열로 변환한다."""
+        panel = np.full((self.n_rows, len(self.markets)), np.nan)
+        panel[self._rows, self._cols] = self.data[col].to_numpy(dtype=float)
+        return panel
+
+    def from_panel(self, panel: np.ndarray) -> np.ndarray:
+        """(date × market) 배열을 self.data 행 순서의 1차원 배열로 되돌린다."""
+        return panel[self._rows, self._cols]
+
+    def set_features(
+        self,
+        dtype=np.float64,
+        markov_cache: MarkovRegimeCache = None,
+        max_workers: int = None,
+        features: Iterable[str] = None,
+        feature_cache: "IncrementalFeatureStore" = None,
+    ):
+        """
+        features(기본값 DEFAULT_FEATURES)에 필요한 DAG만 계산해 요청 순서대로 컬럼을 추가한다.
+        피처 계산은 float64로 하고, 결과 컬럼은 dtype으로 저장한다. (학습용은 float32)
+        feature_cache를 주면 지난 계산 이후 새로 들어왔거나 바뀐 행만 계산한다. (IncrementalFeatureStore)
+        """
+        features = list(DEFAULT_FEATURES if features is None else features)
+        resolve_features(features)  # 등록되지 않은 피처는 계산 전에 ValueError
+        graph_features = [x for x in features if x != MARKOV_FEATURE]
+        if feature_cache is not None:
+            result = feature_cache.update(self, graph_features, dtype=dtype)
+        else:
+            graph = FeatureGraph(self, features)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result = {
+                    col: self.from_panel(graph.get(col)).astype(dtype, copy=False)
+                    for col in graph_features
+                }
+        self.data = pd.concat(
+            [self.data, pd.DataFrame(result, index=self.data.index)], axis=1
+        )
+        if MARKOV_FEATURE in features:
+            self.set_markov_regime_switching(
+                dtype=dtype, cache=markov_cache, max_workers=max_workers
+            )
+            # 요청 순서 유지
+            order = [x for x in self.data.columns if x not in features] + features
+            self.data = self.data[order]
+
+    def get_markov_sample(self) -> np.ndarray:
+        """
+        기존 구현이 regime 적합에 쓴 표본: 입력 컬럼과 DEFAULT_FEATURES(regime 제외)가 모두 있는 행.
+        (date × market) bool 배열로 돌려주며, 요청되지 않은 기본 피처는 여기서 계산해 확인한다.
+        """
+        names = [x for x in DEFAULT_FEATURES if x != MARKOV_FEATURE]
+        inputs = [
+            x
+            for x in self.data.columns
+            if x not in FEATURE_REGISTRY and x != MARKOV_FEATURE
+        ]
+        computed = [x for x in names if x in self.data.columns]
+        valid = self.data[inputs + computed].notna().all(axis=1).to_numpy(copy=True)
+        missing = [x for x in names if x not in self.data.columns]
+        if missing:
+            graph = FeatureGraph(self, missing)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                for col in missing:
+                    valid &= ~np.isnan(self.from_panel(graph.get(col)))
+        sample = np.zeros_like(self.listed)
+        sample[self._rows, self._cols] = valid
+        return sample
+
+    def set_markov_regime_switching(
+        self,
+        dtype=np.float64,
+        cache: MarkovRegimeCache = None,
+        max_workers: int = None,
+    ):
+        """
+        market별 2-국면 MarkovRegression의 smoothed 확률로 regime을 구한다. (get_markov_regime과 같은 정의)
+        - 표준화·적합·smoothing·cutoff는 get_markov_sample()의 행만 쓰고, 나머지 행의 regime은 결측이다.
+        - cache에 유효한 파라미터가 있는 market은 EM 적합 없이 filtering/smoothing만 한다.
+        - 나머지 market은 프로세스 풀에서 병렬로 EM 적합한 뒤 cache에 저장한다.
+        - smoothing은 전체 market을 (date × market) 배열에서 한 번에 계산한다.
+        """
+        close = self.to_panel("close")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = close / np.roll(close, 1, axis=0)
+        returns[0] = np.nan
+        returns[~self.get_markov_sample()] = np.nan
+        # market별 StandardScaler (모집단 표준편차)
+        returns = (returns - np.nanmean(returns, axis=0)) / np.nanstd(returns, axis=0)
+
+        as_of = self.data.index.max()
+        params = np.full((len(self.markets), 6), np.nan)
+        refit = []
+        for i, market in enumerate(self.markets):
+            cached = cache.get(market, as_of) if cache is not None else None
+            if cached is None:
+                refit += [i]
+            else:
+                params[i] = cached
+
+        series = [returns[~np.isnan(returns[:, i]), i] for i in refit]
+        series_ok = [len(x) > 2 for x in series]
+        targets = [x for x, ok in zip(series, series_ok) if ok]
+        if max_workers == 1 or len(targets) <= 1:
+            fitted = list(map(fit_markov_params, targets))
+        else:
+            # 스레드가 떠 있는 서버 프로세스에서 fork하면 교착될 수 있으므로 forkserver로 띄운다.
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            ) as executor:
+                chunksize = max(
+                    1, len(targets) // ((max_workers or os.cpu_count() or 1) * 4)
+                )
+                fitted = list(
+                    executor.map(fit_markov_params, targets, chunksize=chunksize)
+                )
+        fitted = iter(fitted)
+        for i, ok in zip(refit, series_ok):
+            params[i] = next(fitted) if ok else np.nan
+            if cache is not None and ok:
+                cache.set(self.markets[i], params[i], as_of)
+
+        prob = markov_smoothed_probs(returns, params)
+        # 기존 정의와 같이 market별 smoothed 확률 평균을 기준으로 0/1 국면을 나눈다.
+        cutoff = np.nanmean(prob, axis=0)
+        regime = np.where(np.isnan(prob), np.nan, np.where(prob >= cutoff, 0, 1))
+        self.data["regime"] = self.from_panel(regime).astype(dtype, copy=False)
+
+
+class IncrementalFeatureStore:
+    """(market, 날짜)별로 계산해 둔 피처 행을 보관해, 새로 들어왔거나 값이 바뀐 캔들의 행만 다시 계산한다.
+
+    rolling 상태(누적합 등)를 따로 저장하는 대신 완성된 피처 행을 저장하고, 필요한 이력만 잘라 다시 계산한다.
+    - 계산은 FEATURE_REGISTRY(FeatureStoreByPanel)를 그대로 쓰고, market별로 다시 계산할 첫 행보다
+      get_lookback()행 앞부터만 잘라 넣는다. 하루치 갱신은 market당 O(lookback)이다.
+    - 저장된 행과 원천 값(RAW_COLUMNS)이나 직전 캔들 날짜가 다르면(장중 재실행, 보정·추가된 캔들)
+      그 행부터 다시 계산한다.
+    - 입력 구간의 시작이 바뀐 market(학습 구간이 하루 밀린 경우 등)은 앞 lookback행의 값이
+      구간 시작점에 따라 달라지므로, 그 행들만 구간 처음부터 다시 계산한다.
+    - 결과는 같은 panel에 set_features()로 전체 계산한 값과 같다. (rolling 누적합의 부동소수 오차 범위)
+    - regime은 전체 이력에 대한 smoothing이라 다루지 않는다. (MarkovRegimeCache)
+    """
+
+    default_path = os.path.join(PROJECT_ROOT, ".cache", "feature_state.pkl")
+
+    def __init__(self) -> None:
+        self.features: Tuple[str, ...] = ()
+        self.dtype = None
+        # 마지막 update 입력의 행 (market, 날짜 순)
+        self.market_names: List[str] = []
+        self.market_codes = np.empty(0, dtype=np.int64)
+        self.dates = np.empty(0, dtype=np.int64)  # datetime64[D]의 정수값
+        # 같은 market 직전 행의 날짜 (첫 행은 -1)
+        self.prev_dates = np.empty(0, dtype=np.int64)
+        self.raw = np.empty((0, len(RAW_COLUMNS)))
+        self.values = np.empty((0, 0))
+
+    def update(
+        self, panel: "FeatureStoreByPanel", features: Iterable[str], dtype=np.float64
+    ) -> Dict[str, np.ndarray]:
+        """panel.data 행 순서의 피처 배열 {피처: 1차원 배열}을 돌려주고, 그 결과로 저장된 행을 바꾼다."""
+        features = tuple(features)
+        if features != self.features or dtype != self.dtype:
+            self.__init__()
+            self.features, self.dtype = features, dtype
+            self.values = np.empty((0, len(features)), dtype=dtype)
+        lookback = get_lookback(features)
+
+        data = panel.data
+        codes, position = panel._cols, panel.position
+        dates = (
+            pd.to_datetime(data.index)
+            .to_numpy()
+            .astype("datetime64[D]")
+            .astype(np.int64)
+        )
+        prev_dates = np.where(position > 0, np.roll(dates, 1), -1)
+        raw = data[list(RAW_COLUMNS)].to_numpy(dtype=float)
+
+        # 저장된 행 찾기: (market, 날짜)를 정수 key 하나로 묶는다.
+        stored_codes = pd.Index(self.market_names).get_indexer(panel.markets)[codes]
+        keys = np.where(stored_codes >= 0, (stored_codes << 32) + dates, -1)
+        stored = pd.Index((self.market_codes << 32) + self.dates).get_indexer(keys)
+        found = (keys >= 0) & (stored >= 0)
+        same = found.copy()
+        rows = stored[found]
+        same[found] = (
+            (self.raw[rows] == raw[found])
+            | (np.isnan(self.raw[rows]) & np.isnan(raw[found]))
+        ).all(axis=1)
+        same_prev = np.zeros(len(data), dtype=bool)
+        same_prev[found] = self.prev_dates[rows] == prev_dates[found]
+        # 입력 구간의 첫 행은 직전 날짜를 보지 않는다. (구간 시작이 바뀐 경우는 head에서 처리)
+        same &= same_prev | (position == 0)
+
+        # market별로 다시 계산할 첫 행: 바뀐 첫 행
+        n_markets = len(panel.markets)
+        first = np.full(n_markets, np.iinfo(np.int64).max)
+        np.minimum.at(first, codes[~same], position[~same])
+        # 입력 구간의 시작(첫 행과 그 직전 캔들)이 지난번과 같은 market
+        head_rows = position == 0
+        same_start = np.zeros(n_markets, dtype=bool)
+        same_start[codes[head_rows]] = (same & same_prev)[head_rows]
+
+        values = np.full((len(data), len(features)), np.nan, dtype=dtype)
+        reuse = position < first[codes]
+        values[reuse] = self.values[stored[reuse]]
+        # 바뀐 행 이후: lookback행 앞부터 잘라 계산해도 전체 재계산과 같다.
+        tail = ~reuse
+        if tail.any():
+            take = position >= first[codes] - lookback
+            values[tail] = self.compute(panel, take, tail, features, dtype)
+        # 구간 시작이 바뀐 market의 앞 lookback행은 구간 처음부터 다시 계산한다.
+        head = reuse & ~same_start[codes] & (position < lookback)
+        if head.any():
+            take = ~same_start[codes] & (position < lookback)
+            values[head] = self.compute(panel, take, head, features, dtype)
+
+        self.market_names = list(panel.markets)
+        self.market_codes = codes.astype(np.int64)
+        self.dates, self.prev_dates, self.raw, self.values = (
+            dates,
+            prev_dates,
+            raw,
+            values,
+        )
+        return dict(zip(features, values.T))
+
+    @staticmethod
+    def compute(
+        panel: "FeatureStoreByPanel",
+        take: np.ndarray,
+        rows: np.ndarray,
+        features: Tuple[str, ...],
+        dtype,
+    ) -> np.ndarray:
+        """panel.data의 take 행만으로 피처를 계산해 rows(take의 부분집합) 행의 값을 돌려준다."""
+        data = panel.data
+        sub = FeatureStoreByPanel(
+            data.loc[take, [panel.market_col, *RAW_COLUMNS]].reset_index(),
+            date_col=data.index.name,
+            market_col=panel.market_col,
+        )
+        sub.set_features(dtype=dtype, features=features)
+        # sub.data는 data와 같은 (market, 날짜) 순서다.
+        return sub.data[list(features)].to_numpy(dtype=dtype)[rows[take]]
+
+    def save(self, path: str = None):
+        # run/test job이 동시에 저장할 수 있으므로 고유한 임시 파일을 거쳐 교체한다.
+        with atomic_path(path or self.default_path) as tmp, open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str = None) -> "IncrementalFeatureStore":
+        """저장된 상태를 읽는다. 없거나 깨졌으면 빈 상태를 반환한다. (첫 update에서 전체 계산)"""
+        try:
+            with open(path or cls.default_path, "rb") as f:
+                store = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError):
+            return cls()
+        return store if isinstance(store, cls) else cls()
+
+
 class FeatureStoreByDate:
     def __init__(self):
         pass
 
     def get_fear_and_greed_indicator(
-        self, start_date: date, end_date: date
+        self, start_date: date, end_date: date, offline: bool = False
     ) -> pd.DataFrame:
-        start_date_str = start_date.strftime("%Y-%m-%d")
-        end_date_str = end_date.strftime("%Y-%m-%d")
-        result = bq_conn.query(f"""
-        DECLARE start_date DATE DEFAULT '{start_date_str}';
-        DECLARE   end_date DATE DEFAULT '{end_date_str}';
+        result = get_bq_conn().query_with_cache(
+            name="fear_and_greed",
+            sql="""
+        DECLARE start_date DATE DEFAULT '<start_date>';
+        DECLARE   end_date DATE DEFAULT '<end_date>';
         SELECT
             reg_date,
             value AS fear_greed_value,
@@ -258,5 +1113,10 @@ class FeatureStoreByDate:
         WHERE 1=1
         AND reg_date BETWEEN start_date AND end_date
         QUALIFY row_number() OVER (PARTITION BY reg_date ORDER BY update_dt DESC) = 1
-        """)
+        """,
+            date_col="reg_date",
+            start_date=start_date,
+            end_date=end_date,
+            offline=offline,
+        )
         return result
@@ -0,0 +1,198 @@
+import logging
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+import pytz
+
+from src.metrics import add_stage_listener, get_metrics_registry
+
+logger = logging.getLogger(__name__)
+kst = pytz.timezone("Asia/Seoul")
+job_manager = None  # 전역 JobManager 객체
+
+# 이 상태가 되면 job이 끝난 것으로 본다.
+FINISHED_STATES = ("succeeded", "failed")
+
+
+def _kst_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=kst).isoformat() if ts else None
+
+
+def step_errors(result) -> dict:
+    """{단계: {"result": "error", "detail": ...}} 형태의 결과에서 실패한 단계와 메시지를 뽑는다."""
+    if not isinstance(result, dict):
+        return {}
+    return {
+        step: value.get("detail")
+        for step, value in result.items()
+        if isinstance(value, dict) and value.get("result") == "error"
+    }
+
+
+class Job:
+    def __init__(self, kind: str, key: str) -> None:
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"  # queued → running → succeeded/failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # time_stage로 기록된 단계별 진행 상황 [{stage, status, started_at, elapsed_sec}]
+        self.stages: List[dict] = []
+        self.result = None
+        self.error = None
+        # 실행 중에 같은 key로 들어와 이 job에 붙은 요청 수
+        self.attached = 0
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def on_stage(self, stage: str, status: str, elapsed: float):
+        with self.lock:
+            if status == "running":
+                self.stages += [
+                    {
+                        "stage": stage,
+                        "status": status,
+                        "started_at": time.time(),
+                        "elapsed_sec": None,
+                    }
+                ]
+                return
+            # 같은 이름의 단계가 중첩될 수 있으므로 가장 최근에 시작한 항목을 닫는다.
+            for entry in reversed(self.stages):
+                if entry["stage"] == stage and entry["status"] == "running":
+                    entry["status"] = status
+                    entry["elapsed_sec"] = round(elapsed, 3)
+                    break
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            stages = [
+                {**x, "started_at": _kst_iso(x["started_at"])} for x in self.stages
+            ]
+        running = [x["stage"] for x in stages if x["status"] == "running"]
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": _kst_iso(self.created_at),
+            "started_at": _kst_iso(self.started_at),
+            "finished_at": _kst_iso(self.finished_at),
+            "elapsed_sec": round(end - self.started_at, 3) if self.started_at else None,
+            "current_stage": running[-1] if running else None,
+            "stages": stages,
+            "attached": self.attached,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    파이프라인 실행(run/test)을 요청 스레드가 아닌 백그라운드 스레드 풀에서 수행한다.
+
+    - single-flight: 같은 key의 job이 대기/실행 중이면 새로 실행하지 않고 그 job을 돌려준다.
+      (중복 트리거가 두 번째 매매 세션을 시작하지 않도록)
+    - job 스레드 안의 time_stage 기록은 해당 job의 단계별 진행 상황으로도 남는다.
+    - 끝난 job은 최근 max_history개만 보관한다.
+    """
+
+    def __init__(self, max_workers: int = 2, max_history: int = 100) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self.max_history = max_history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.inflight = {}  # key -> 대기/실행 중인 Job
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        add_stage_listener(self.on_stage)
+
+    def submit(self, kind: str, func: Callable, key: str = None) -> Tuple[Job, bool]:
+        """(job, 새로 만들었는지 여부). key를 주지 않으면 kind를 single-flight key로 쓴다."""
+        key = key or kind
+        with self.lock:
+            job = self.inflight.get(key)
+            if job is not None:
+                job.attached += 1
+                logger.info(
+                    f"실행 중인 job에 연결: {kind} ({job.id}, status={job.status})"
+                )
+                return job, False
+            job = Job(kind, key)
+            self.inflight[key] = job
+            self.jobs[job.id] = job
+            self.evict()
+        get_metrics_registry().counter(
+            "jobs_submitted_total", "제출된 job 수", kind=kind
+        ).inc()
+        logger.info(f"job 제출: {kind} ({job.id})")
+        self.executor.submit(self.run, job, func)
+        return job, True
+
+    def run(self, job: Job, func: Callable):
+        self.local.job = job
+        job.status, job.started_at = "running", time.time()
+        try:
+            job.result = func()
+            errors = step_errors(job.result)
+            job.status = "failed" if errors else "succeeded"
+            if errors:
+                # run()처럼 단계별 예외를 잡아 결과로 돌려주는 함수도 실패한 단계가 있으면 실패로 본다.
+                job.error = "; ".join(
+                    f"{step}: {detail}" for step, detail in errors.items()
+                )
+                logger.error(f"job 단계 실패: {job.kind} ({job.id}) {job.error}")
+        except BaseException as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            logger.error(f"job 실패: {job.kind} ({job.id})\n{traceback.format_exc()}")
+        finally:
+            job.finished_at = time.time()
+            self.local.job = None
+            with self.lock:
+                if self.inflight.get(job.key) is job:
+                    del self.inflight[job.key]
+            get_metrics_registry().counter(
+                "jobs_finished_total", "끝난 job 수", kind=job.kind, status=job.status
+            ).inc()
+            job.done.set()
+
+    def on_stage(self, stage: str, status: str, elapsed: float):
+        """time_stage listener: job 스레드에서 기록된 단계만 해당 job에 남긴다."""
+        job = getattr(self.local, "job", None)
+        if job is not None:
+            job.on_stage(stage, status, elapsed)
+
+    def evict(self):
+        """끝난 job 중 오래된 것부터 max_history개를 넘는 만큼 지운다."""
+        finished = [x.id for x in self.jobs.values() if x.finished]
+        for id in finished[: max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[id]
+
+    def get(self, id: str) -> Job:
+        with self.lock:
+            return self.jobs.get(id)
+
+    def list(self) -> List[Job]:
+        with self.lock:
+            return list(self.jobs.values())[::-1]
+
+
+def get_job_manager():
+    global job_manager
+    if job_manager is None:
+        job_manager = JobManager()
+    return job_manager
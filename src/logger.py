@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 from datetime import datetime
@@ -22,13 +23,32 @@ class KSTFormatter(logging.Formatter):
         return s
 
 
+class JSONFormatter(logging.Formatter):
+    """
+    한 줄 JSON 로그 (Cloud Run/Cloud Logging이 structured log로 파싱하는 형식).
+    logger.info(message, extra={"fields": {...}})로 넘긴 fields는 최상위 key로 합친다.
+    """
+
+    def format(self, record):
+        payload = {
+            "time": datetime.fromtimestamp(record.created, tz=kst).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
 # 로깅 포맷 설정 (파일명과 라인 번호 포함)
 LOG_FORMAT = (
     "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
 )
 
 
-def get_logger(name: str) -> logging.Logger:
+def get_logger(name: str, json_format: bool = False) -> logging.Logger:
     # 로거 생성
     logger = logging.getLogger(name)
     logger.setLevel(LOG_LEVEL)
@@ -37,8 +57,8 @@ def get_logger(name: str) -> logging.Logger:
     console_handler = logging.StreamHandler()
     console_handler.setLevel(LOG_LEVEL)
 
-    # KST 포맷터 사용
-    formatter = KSTFormatter(LOG_FORMAT)
+    # KST 포맷터 사용 (json_format=True면 한 줄 JSON)
+    formatter = JSONFormatter() if json_format else KSTFormatter(LOG_FORMAT)
     console_handler.setFormatter(formatter)
 
     # 핸들러가 없는 경우 추가 (중복 방지)
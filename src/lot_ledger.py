@@ -0,0 +1,156 @@
+import logging
+import os
+import pickle
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pandas as pd
+
+from src.config.env import PROJECT_ROOT
+from src.config.helper import atomic_path
+
+logger = logging.getLogger(__name__)
+
+TRADE_HISTORY_SQL = """
+DECLARE since DATETIME DEFAULT '<since>';
+SELECT
+    uuid,
+    type,
+    market,
+    SAFE_CAST(JSON_VALUE(data, '$.executed_volume') AS FLOAT64) AS executed_volume,
+    DATETIME(PARSE_TIMESTAMP('%Y-%m-%dT%H:%M:%S%Ez', JSON_VALUE(data, '$.created_at')), 'Asia/Seoul') AS created_at,
+    update_dt
+FROM `proj-asset-allocation.crypto_fluxor.trade_history`
+WHERE update_dt >= since
+ORDER BY created_at ASC
+"""
+
+
+class LotLedger:
+    """
+    market별 매수 잔량(lot)을 FIFO로 관리하는 원장.
+
+    - lots[market]은 [매수 시각, 남은 수량]의 deque이며 매수 시각 순으로 정렬되어 있다.
+    - 매도는 deque 앞(가장 오래된 매수)부터 차감하므로 거래 1건당 상각 O(1)이다.
+    - 처리한 거래의 uuid와 적재 시각(update_dt) watermark를 저장해,
+      다음 실행에서는 watermark 이후 적재된 거래만 조회해 반영한다.
+    """
+
+    default_path = os.path.join(PROJECT_ROOT, ".cache", "lot_ledger.pkl")
+    # 같은 시각 근처에 적재된 거래를 놓치지 않도록 watermark보다 조금 앞부터 조회한다.
+    WATERMARK_MARGIN = timedelta(hours=1)
+
+    def __init__(self) -> None:
+        self.lots = defaultdict(deque)
+        self.uuids = set()
+        self.last_created_at = None
+        self.watermark = None  # 마지막으로 반영한 거래의 update_dt
+
+    def update(self, trade_log: pd.DataFrame) -> Optional[int]:
+        """
+        거래 내역(uuid, type, market, executed_volume, created_at, update_dt)을 반영하고 반영한 건수를 반환한다.
+        이미 반영한 uuid와 같은 배치 안의 중복 uuid는 건너뛴다. (trade_history는 at-least-once 적재)
+        이전에 반영한 거래보다 과거의 거래가 새로 들어오면
+        FIFO 순서가 깨지므로 None을 반환하고 아무것도 반영하지 않는다. (호출자가 전체 재구성)
+        """
+        trade_log = trade_log.drop_duplicates("uuid")
+        trade_log = trade_log.loc[~trade_log["uuid"].isin(self.uuids)]
+        if trade_log.empty:
+            return 0
+        trade_log = trade_log.sort_values("created_at", kind="stable")
+        if (
+            self.last_created_at is not None
+            and trade_log["created_at"].iloc[0] < self.last_created_at
+        ):
+            return None
+
+        for row in trade_log.itertuples(index=False):
+            if row.type == "buy":
+                self.buy(row.market, row.created_at, row.executed_volume)
+            elif row.type == "sell":
+                self.sell(row.market, row.created_at, row.executed_volume)
+            self.uuids.add(row.uuid)
+
+        self.last_created_at = trade_log["created_at"].iloc[-1]
+        watermark = trade_log["update_dt"].max()
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+        return len(trade_log)
+
+    def buy(self, market: str, created_at: datetime, volume: float):
+        lots = self.lots[market]
+        if lots and lots[-1][0] == created_at:
+            # 같은 시각의 매수는 하나의 lot으로 합산한다.
+            lots[-1][1] += volume
+        else:
+            lots.append([created_at, volume])
+
+    def sell(self, market: str, created_at: datetime, volume: float):
+        """가장 오래된 매수부터 차감한다. (매도 시각과 같거나 이후의 매수는 차감하지 않음)"""
+        lots = self.lots.get(market)
+        if not lots:
+            return
+        remaining = volume
+        while lots and remaining > 0 and lots[0][0] < created_at:
+            deduct = min(remaining, lots[0][1])
+            lots[0][1] -= deduct
+            remaining -= deduct
+            if lots[0][1] <= 0:
+                lots.popleft()
+        if not lots:
+            del self.lots[market]
+
+    def get_expired(self, cutoff_date: datetime) -> pd.DataFrame:
+        """cutoff_date 이전에 매수해 아직 남아 있는 수량을 market별로 합산한다."""
+        expired = defaultdict(float)
+        for market, lots in self.lots.items():
+            for created_at, volume in lots:
+                if created_at >= cutoff_date:
+                    break  # 이후 lot은 모두 더 최근 매수
+                expired[market] += volume
+        return pd.DataFrame(
+            [{"market": market, "volume": volume} for market, volume in expired.items()]
+        )
+
+    def get_since(self) -> datetime:
+        """다음 조회 시작 시각. 처음이면 전체를 조회한다."""
+        if self.watermark is None:
+            return datetime(1970, 1, 1)
+        return pd.Timestamp(self.watermark).to_pydatetime() - self.WATERMARK_MARGIN
+
+    def save(self, path: str = None):
+        with atomic_path(path or self.default_path) as tmp, open(tmp, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path: str = None) -> "LotLedger":
+        with open(path or cls.default_path, "rb") as f:
+            return pickle.load(f)
+
+
+def query_trade_log(bq_conn, since: datetime) -> pd.DataFrame:
+    trade_log = bq_conn.query(
+        TRADE_HISTORY_SQL.replace("<since>", since.strftime("%Y-%m-%d %H:%M:%S"))
+    )
+    # datetime 타입으로 변환
+    trade_log["created_at"] = pd.to_datetime(trade_log["created_at"])
+    trade_log["update_dt"] = pd.to_datetime(trade_log["update_dt"])
+    return trade_log
+
+
+def sync_lot_ledger(bq_conn, path: str = None) -> LotLedger:
+    """저장된 원장에 새 거래를 반영한다. 원장이 없거나 순서가 어긋나면 전체 이력으로 재구성한다."""
+    try:
+        ledger = LotLedger.load(path)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        ledger = LotLedger()
+
+    n_updated = ledger.update(query_trade_log(bq_conn, ledger.get_since()))
+    if n_updated is None:
+        logger.warning("lot ledger: 과거 거래가 뒤늦게 적재되어 원장을 재구성합니다.")
+        ledger = LotLedger()
+        n_updated = ledger.update(query_trade_log(bq_conn, ledger.get_since()))
+    logger.info(f"lot ledger: 거래 {n_updated}건 반영")
+    ledger.save(path)
+    return ledger
@@ -0,0 +1,251 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+metrics_registry = None  # 전역 MetricsRegistry 객체
+# time_stage 시작/종료 때 (stage, status, elapsed) 로 호출되는 함수 목록 (job 진행 상황 기록 등)
+stage_listeners: List[Callable[[str, str, float], None]] = []
+
+# latency(초) 기본 bucket 경계
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 파이프라인 단계(분 단위) 소요 시간 bucket 경계
+STAGE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+# 노출 형식별 Content-Type
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, value: float = 1):
+        with self.lock:
+            self.value += value
+
+
+class Gauge:
+    """마지막으로 설정한 값 (예: 피처 행렬 크기)"""
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def set(self, value: float):
+        with self.lock:
+            self.value = float(value)
+
+    def inc(self, value: float = 1):
+        with self.lock:
+            self.value += value
+
+
+class Histogram:
+    """고정 bucket 누적 히스토그램 (thread-safe). 분위수는 bucket 안에서 선형 보간한 근사값이다."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 마지막 칸은 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(bucket 상한, 누적 건수) 목록. 마지막 상한은 inf"""
+        with self.lock:
+            counts = list(self.counts)
+        result, total = [], 0
+        for le, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            result += [(le, total)]
+        return result
+
+    def quantile(self, q: float) -> float:
+        cumulative = self.cumulative()
+        total = cumulative[-1][1]
+        if total == 0:
+            return float("nan")
+        rank = q * total
+        lower, prev = 0.0, 0
+        for le, count in cumulative:
+            if count >= rank:
+                if le == float("inf"):
+                    return lower
+                return lower + (le - lower) * (rank - prev) / max(count - prev, 1)
+            lower, prev = le, count
+        return lower
+
+
+class MetricsRegistry:
+    """
+    이름 + label 조합별 Counter/Histogram 저장소.
+    같은 (이름, label)로 다시 요청하면 같은 객체를 돌려준다.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], object] = {}
+        self.types: Dict[str, str] = {}
+        self.helps: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def get_or_create(self, kind: str, name: str, help: str, labels: dict, factory):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self.metrics.get(key)
+        if metric is not None:
+            return metric
+        with self.lock:
+            if self.types.setdefault(name, kind) != kind:
+                raise ValueError(f"{name}은 이미 {self.types[name]}로 등록됨")
+            if help:
+                self.helps.setdefault(name, help)
+            return self.metrics.setdefault(key, factory())
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        return self.get_or_create("counter", name, help, labels, Counter)
+
+    def gauge(self, name: str, help: str = "", **labels) -> Gauge:
+        return self.get_or_create("gauge", name, help, labels, Gauge)
+
+    def histogram(
+        self,
+        name: str,
+        help: str = "",
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        **labels,
+    ) -> Histogram:
+        return self.get_or_create(
+            "histogram", name, help, labels, lambda: Histogram(buckets)
+        )
+
+    def collect(self) -> List[Tuple[str, dict, object]]:
+        """(이름, labels, metric) 목록 (이름 순)"""
+        with self.lock:
+            items = list(self.metrics.items())
+        return [
+            (name, dict(labels), metric)
+            for (name, labels), metric in sorted(items, key=lambda x: x[0])
+        ]
+
+    def summary(self, name: str) -> pd.DataFrame:
+        """히스토그램 하나의 label 조합별 건수/평균/p50/p90/p99 표"""
+        rows = []
+        for metric_name, labels, metric in self.collect():
+            if metric_name != name or not isinstance(metric, Histogram):
+                continue
+            rows += [
+                {
+                    **labels,
+                    "count": metric.count,
+                    "mean": metric.sum / metric.count if metric.count else float("nan"),
+                    "p50": metric.quantile(0.5),
+                    "p90": metric.quantile(0.9),
+                    "p99": metric.quantile(0.99),
+                }
+            ]
+        return pd.DataFrame(rows)
+
+    def render(self, openmetrics: bool = False) -> str:
+        """
+        Prometheus text(0.0.4) 형식 노출 문자열. openmetrics=True면 OpenMetrics 1.0 형식
+        (counter family 이름에서 _total을 떼고, 마지막에 # EOF)으로 만든다.
+        counter 이름은 _total로 끝나야 한다.
+        """
+        families: Dict[str, list] = {}
+        for name, labels, metric in self.collect():
+            families.setdefault(name, []).append((labels, metric))
+        lines = []
+        for name, series in families.items():
+            kind = self.types[name]
+            family = name
+            if openmetrics and kind == "counter" and name.endswith("_total"):
+                family = name[: -len("_total")]
+            if name in self.helps:
+                lines += [f"# HELP {family} {_escape(self.helps[name], help=True)}"]
+            lines += [f"# TYPE {family} {kind}"]
+            for labels, metric in series:
+                if isinstance(metric, Histogram):
+                    for le, count in metric.cumulative():
+                        lines += [
+                            f"{name}_bucket{_labels({**labels, 'le': _number(le)})} {count}"
+                        ]
+                    lines += [f"{name}_sum{_labels(labels)} {_number(metric.sum)}"]
+                    lines += [f"{name}_count{_labels(labels)} {metric.count}"]
+                else:
+                    lines += [f"{name}{_labels(labels)} {_number(metric.value)}"]
+        if openmetrics:
+            lines += ["# EOF"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str, help: bool = False) -> str:
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value if help else value.replace('"', '\\"')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return (
+        repr(int(value))
+        if float(value).is_integer() and abs(value) < 1e15
+        else repr(float(value))
+    )
+
+
+def add_stage_listener(listener: Callable[[str, str, float], None]):
+    if listener not in stage_listeners:
+        stage_listeners.append(listener)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """
+    파이프라인 단계 소요 시간을 pipeline_stage_duration_seconds{stage, status}에 기록한다.
+    stage_listeners에는 시작 때 (stage, "running", 0), 끝날 때 (stage, "ok"/"error", 소요 시간)을 알린다.
+    """
+    for listener in stage_listeners:
+        listener(stage, "running", 0.0)
+    status = "error"
+    strt_time = time.perf_counter()
+    try:
+        yield
+        status = "ok"
+    finally:
+        elapsed = time.perf_counter() - strt_time
+        get_metrics_registry().histogram(
+            "pipeline_stage_duration_seconds",
+            "파이프라인 단계 소요 시간",
+            buckets=STAGE_BUCKETS,
+            stage=stage,
+            status=status,
+        ).observe(elapsed)
+        for listener in stage_listeners:
+            listener(stage, status, elapsed)
+
+
+def get_metrics_registry():
+    global metrics_registry
+    if metrics_registry is None:
+        metrics_registry = MetricsRegistry()
+    return metrics_registry
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date
+from typing import List, Optional
+
+import lightgbm as lgb
+import numpy as np
+
+from src.config.env import MODEL_REGISTRY_DIR, MODEL_REGISTRY_KEEP
+from src.config.helper import atomic_path
+
+logger = logging.getLogger(__name__)
+model_registry = None  # 전역 ModelRegistry 객체
+
+
+def _hash(value) -> str:
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+
+
+class ModelRegistry:
+    """
+    학습된 LightGBM booster를 로컬 디스크에 보관하는 registry.
+
+    - key = (feature schema hash, 학습 구간, 파라미터 hash, 학습 데이터 hash)
+      같은 날 /test와 /run처럼 같은 데이터로 다시 학습하는 경우 저장된 booster를 그대로 쓴다.
+    - 디렉토리 구조: <root>/<key>.txt (booster) + <key>.json (메타데이터)
+    - 최근 keep개만 남기고 오래된 모델은 삭제한다.
+    """
+
+    def __init__(
+        self, root: str = MODEL_REGISTRY_DIR, keep: int = MODEL_REGISTRY_KEEP
+    ) -> None:
+        self.root = root
+        self.keep = keep
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_schema_hash(feature_cols: List[str], X: np.ndarray) -> str:
+        return _hash([feature_cols, str(X.dtype)])
+
+    @staticmethod
+    def get_params_hash(params: dict) -> str:
+        return _hash(params)
+
+    @staticmethod
+    def get_data_hash(X: np.ndarray, y: np.ndarray) -> str:
+        """학습 배열(X, y)의 원본 바이트에 대한 sha1 (backfill 등으로 값이 바뀌면 key도 바뀐다)"""
+        hashed = hashlib.sha1(np.ascontiguousarray(X).data)
+        hashed.update(np.ascontiguousarray(y).data)
+        return hashed.hexdigest()[:16]
+
+    def get_meta(
+        self,
+        feature_cols: List[str],
+        X: np.ndarray,
+        y: np.ndarray,
+        train_start: date,
+        train_end: date,
+        params: dict,
+    ) -> dict:
+        meta = {
+            "schema_hash": self.get_schema_hash(feature_cols, X),
+            "params_hash": self.get_params_hash(params),
+            "train_start": str(train_start),
+            "train_end": str(train_end),
+            "data_hash": self.get_data_hash(X, y),
+        }
+        meta["key"] = _hash(meta)
+        return meta
+
+    def load(self, key: str) -> Optional[lgb.Booster]:
+        path = os.path.join(self.root, f"{key}.txt")
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # 최근 사용 시각 갱신 (정리 기준)
+        return lgb.Booster(model_file=path)
+
+    def save(self, booster: lgb.Booster, meta: dict):
+        os.makedirs(self.root, exist_ok=True)
+        key = meta["key"]
+        meta = {**meta, "num_trees": booster.num_trees(), "created_at": time.time()}
+        with self.lock:
+            with atomic_path(os.path.join(self.root, f"{key}.txt")) as tmp:
+                booster.save_model(tmp)
+            with (
+                atomic_path(os.path.join(self.root, f"{key}.json")) as tmp,
+                open(tmp, "w") as f,
+            ):
+                json.dump(meta, f)
+            self.prune()
+
+    def list_meta(self) -> List[dict]:
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for file in os.listdir(self.root):
+            if not file.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, file)) as f:
+                    result += [json.load(f)]
+            except (OSError, json.JSONDecodeError):
+                continue
+        return result
+
+    def find_latest(
+        self, schema_hash: str, params_hash: str, before: date
+    ) -> Optional[dict]:
+        """같은 schema·파라미터로 before 이전까지 학습한 모델 중 가장 최근 것의 메타데이터"""
+        candidates = [
+            x
+            for x in self.list_meta()
+            if x["schema_hash"] == schema_hash
+            and x["params_hash"] == params_hash
+            and x["train_end"] < str(before)
+            and os.path.exists(os.path.join(self.root, f"{x['key']}.txt"))
+        ]
+        return max(candidates, key=lambda x: x["train_end"], default=None)
+
+    def prune(self):
+        metas = sorted(self.list_meta(), key=lambda x: x["created_at"], reverse=True)
+        for meta in metas[self.keep :]:
+            for ext in ("txt", "json"):
+                path = os.path.join(self.root, f"{meta['key']}.{ext}")
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def get_model_registry():
+    global model_registry
+    if model_registry is None:
+        model_registry = ModelRegistry()
+    return model_registry
@@ -0,0 +1,207 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Tuple
+
+from src.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 주문 상세의 state가 이 값이면 체결이 끝난 것으로 본다.
+SETTLED_STATES = ("done", "cancel")
+# 매도 예상 대금을 계산할 때 수수료·슬리피지로 빼 두는 비율
+PROCEEDS_MARGIN = 0.005
+# 빗썸 원화 마켓 최소 주문 금액
+MIN_ORDER_KRW = 5000
+
+
+class OrderExecutionEngine:
+    """
+    매도/매수 주문을 동시에 제출하고 체결을 확인하며 리밸런싱을 수행한다.
+
+    - 주문은 스레드 풀로 동시에 제출되며, 호출 제한은 BithumbClient의 private limiter가 맡는다.
+    - 고정 시간 대기 대신 v1/order의 state를 poll_interval마다 조회해 체결을 확인한다.
+    - 매수는 (보유 KRW + 체결된 매도 대금)이 종목당 예산 이상이 되는 즉시 순서대로 제출한다.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_workers: int = 8,
+        poll_interval: float = 0.5,
+        settle_timeout: float = 60.0,
+    ) -> None:
+        self.client = client
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.settle_timeout = settle_timeout
+        # 체결 지연 측정용: uuid -> (제출 시각, 주문 종류)
+        self.submitted_at: Dict[str, Tuple[float, str]] = {}
+
+    def submit_orders(self, orders: List[dict]) -> List[dict]:
+        """exceute_order 인자 목록을 동시에 제출한다. 실패한 주문은 None으로 채운다."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.submit_order, orders))
+
+    def submit_order(self, order: dict) -> dict:
+        try:
+            result = self.client.exceute_order(**order)
+        except Exception as e:
+            logger.error(
+                f"Error executing {order['type']} order for {order['market']}: {e}"
+            )
+            return None
+        if result and "uuid" in result:
+            self.submitted_at[result["uuid"]] = (time.time(), order["type"])
+        return result
+
+    def poll_orders(self, uuids: List[str]) -> Dict[str, dict]:
+        """주문 상세를 동시에 조회해 체결이 끝난 주문만 반환한다."""
+
+        def fetch(id):
+            try:
+                return self.client.get_trade_history_by_uuid(id=id)
+            except Exception as e:
+                logger.warning(f"주문 조회 실패: {id} ({e})")
+                return {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            details = dict(zip(uuids, executor.map(fetch, uuids)))
+        return {
+            id: detail
+            for id, detail in details.items()
+            if detail.get("state") in SETTLED_STATES
+        }
+
+    def wait_settled(self, uuids: List[str]) -> Dict[str, dict]:
+        """주문이 모두 체결되거나 settle_timeout이 지날 때까지 기다린다."""
+        settled = {}
+        for detail in self.iter_settled(uuids):
+            settled.update(detail)
+        return settled
+
+    def iter_settled(self, uuids: List[str]):
+        """poll_interval마다 새로 체결된 주문 상세를 {uuid: detail}로 yield 한다."""
+        unsettled = set(uuids)
+        deadline = time.time() + self.settle_timeout
+        while unsettled:
+            settled = self.poll_orders(sorted(unsettled))
+            unsettled -= set(settled)
+            self.record_fill_latency(settled)
+            if settled:
+                yield settled
+            if not unsettled:
+                break
+            if time.time() >= deadline:
+                logger.warning(f"체결 대기 시간 초과: {sorted(unsettled)}")
+                break
+            time.sleep(self.poll_interval)
+
+    def record_fill_latency(self, settled: Dict[str, dict]):
+        """제출부터 체결 확인까지 걸린 시간을 order_fill_latency_seconds에 기록한다. (poll_interval 단위 정밀도)"""
+        now = time.time()
+        for id, detail in settled.items():
+            submitted = self.submitted_at.pop(id, None)
+            if submitted is None:
+                continue
+            strt_time, type = submitted
+            get_metrics_registry().histogram(
+                "order_fill_latency_seconds",
+                "주문 제출부터 체결 확인까지 걸린 시간",
+                type=type,
+                state=detail.get("state"),
+            ).observe(now - strt_time)
+
+    def rebalance(
+        self,
+        sells: List[Tuple[str, float]],
+        buys: List[str],
+        krw_balance: float,
+    ) -> dict:
+        """
+        sells: (market, volume) 목록 / buys: 매수할 market 목록
+        krw_balance: 매도 전 주문 가능한 KRW 잔고
+        """
+        each_budget = self.get_each_budget(sells, buys, krw_balance)
+        logger.info(f"BUDGET: {each_budget} (krw={krw_balance}, n_buy={len(buys)})")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            sell_results = list(
+                executor.map(
+                    self.submit_order,
+                    [
+                        dict(
+                            type="sell", market=market, volume=volume, ord_type="market"
+                        )
+                        for market, volume in sells
+                    ],
+                )
+            )
+            sell_uuids = [x["uuid"] for x in sell_results if x and "uuid" in x]
+
+            available = krw_balance
+            waiting = deque(buys)
+            buy_futures = []
+
+            def release(budget):
+                nonlocal available
+                while waiting and budget >= MIN_ORDER_KRW and available >= budget:
+                    market = waiting.popleft()
+                    logger.info(f"BUY(bid) price(시장가) - {market}:{budget}")
+                    order = dict(
+                        type="buy", market=market, price=budget, ord_type="price"
+                    )
+                    buy_futures.append(executor.submit(self.submit_order, order))
+                    available -= budget
+
+            release(each_budget)
+            for settled in self.iter_settled(sell_uuids):
+                for detail in settled.values():
+                    available += self.get_proceeds(detail)
+                release(each_budget)
+
+            if waiting:
+                # 매도 체결이 끝난 뒤 실제 잔고로 남은 매수 예산을 다시 맞춘다.
+                # 이미 넘긴 매수 주문이 거래소에 도달하기 전에 잔고를 읽으면 그 금액이 두 번 잡히므로
+                # 먼저 제출이 끝나기를 기다린다.
+                wait(buy_futures)
+                krw = self.client.get_krw_balance()
+                budget = min(each_budget, int(krw / len(waiting) / 1000) * 1000)
+                logger.info(
+                    f"BUDGET(재계산): {budget} (krw={krw}, n_buy={len(waiting)})"
+                )
+                available = krw
+                release(budget)
+                if waiting:
+                    logger.warning(f"예산 부족으로 매수하지 못한 종목: {list(waiting)}")
+
+            wait(buy_futures)
+            buy_results = [x.result() for x in buy_futures]
+
+        return {
+            "n_sell": len(sell_uuids),
+            "n_buy": sum(x is not None for x in buy_results),
+            "each_budget": each_budget,
+        }
+
+    def get_each_budget(
+        self, sells: List[Tuple[str, float]], buys: List[str], krw_balance: float
+    ) -> int:
+        """현재가 기준 매도 예상 대금을 포함해 매수 종목당 예산(1,000원 단위)을 계산한다."""
+        if not buys:
+            return 0
+        expected = krw_balance
+        if sells:
+            prices = self.client.get_current_price([market for market, _ in sells])
+            prices = prices.set_index("market")["trade_price"].astype(float)
+            expected += sum(
+                volume * prices.get(market, 0) for market, volume in sells
+            ) * (1 - PROCEEDS_MARGIN)
+        return int(expected / len(buys) / 1000) * 1000
+
+    @staticmethod
+    def get_proceeds(detail: dict) -> float:
+        """체결된 매도 주문 상세에서 수수료를 뺀 정산 금액을 계산한다."""
+        funds = sum(float(x.get("funds", 0)) for x in detail.get("trades", []))
+        return funds - float(detail.get("paid_fee") or 0)
@@ -0,0 +1,145 @@
+import argparse
+import itertools
+import json
+import logging
+from datetime import date
+from typing import List
+
+import pandas as pd
+
+from src.backtest import FeatureMatrix, WalkForwardBacktest, run_fit_tasks
+from src.ctrend_model import LONG_Q, SHORT_Q
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRID = {
+    "train_size": [365, 365 * 2],
+    "retrain_every": [7],
+    "long_q": [LONG_Q],
+    "short_q": [SHORT_Q],
+    "params": [{}],
+}
+
+
+class ParameterSweep:
+    """
+    학습 기간·재학습 주기·롱/숏 quantile·LightGBM 파라미터 조합을 한 번에 백테스트한다.
+
+    - 시세 조회와 feature 계산은 전체 조합에 대해 한 번만 한다.
+    - feature 행렬은 .npy 파일로 한 번 저장하고 워커 프로세스가 memory map으로 공유한다.
+    - 모든 조합의 (학습 시점별) 학습을 하나의 프로세스 풀에 올리고,
+      프로세스 수 × LightGBM 스레드 수가 코어 수를 넘지 않게 한다.
+    - quantile은 학습 결과에 영향을 주지 않으므로 같은 예측을 재사용해 시뮬레이션만 다시 한다.
+    """
+
+    def __init__(
+        self,
+        start_date: date,
+        end_date: date,
+        grid: dict = None,
+        max_workers: int = None,
+    ) -> None:
+        self.start_date = start_date
+        self.end_date = end_date
+        self.grid = {**DEFAULT_GRID, **(grid or {})}
+        self.max_workers = max_workers
+
+    def get_configs(self) -> List[dict]:
+        keys = list(self.grid)
+        return [dict(zip(keys, x)) for x in itertools.product(*self.grid.values())]
+
+    def get_backtest(self, config: dict) -> WalkForwardBacktest:
+        return WalkForwardBacktest(
+            start_date=self.start_date,
+            end_date=self.end_date,
+            train_size=config["train_size"],
+            retrain_every=config["retrain_every"],
+            long_q=config["long_q"],
+            short_q=config["short_q"],
+            params=config["params"],
+        )
+
+    @staticmethod
+    def get_fit_key(config: dict) -> tuple:
+        return (
+            config["train_size"],
+            config["retrain_every"],
+            json.dumps(config["params"], sort_keys=True),
+        )
+
+    def run(self) -> pd.DataFrame:
+        configs = self.get_configs()
+        # 가장 긴 학습 기간 기준으로 한 번만 읽고 feature를 계산한다.
+        longest = max(configs, key=lambda x: x["train_size"])
+        loader = self.get_backtest(longest)
+        raw_bithumb, raw_marketcap = loader.load_data()
+        features = loader.allocator.get_features(raw_bithumb)
+        universe_by_date = (
+            raw_marketcap.groupby("reg_date")["symbol"].agg(set).to_dict()
+        )
+        closes = raw_bithumb.pivot(index="reg_date", columns="market", values="close")
+        closes = closes.loc[closes.index <= self.end_date]
+
+        # 학습 결과가 같은 조합끼리 묶어 학습은 한 번만 한다.
+        fit_groups = {}
+        for config in configs:
+            fit_groups.setdefault(self.get_fit_key(config), []).append(config)
+
+        tasks, owners = [], []
+        for key, group in fit_groups.items():
+            backtest = self.get_backtest(group[0])
+            for task in backtest.get_fit_tasks(universe_by_date, backtest.params):
+                tasks += [task]
+                owners += [key]
+
+        with FeatureMatrix.from_features(features).shared() as path:
+            result = run_fit_tasks(path, tasks, self.max_workers)
+
+        predictions = {}
+        for key, pred in zip(owners, result):
+            predictions.setdefault(key, []).append(pred)
+
+        rows = []
+        for key, group in fit_groups.items():
+            pred = pd.concat(predictions[key]).reset_index(drop=True)
+            for config in group:
+                backtest = self.get_backtest(config)
+                history, _ = backtest.simulate(pred, closes)
+                rows += [
+                    {
+                        **{k: v for k, v in config.items() if k != "params"},
+                        "params": json.dumps(config["params"], sort_keys=True),
+                        **backtest.get_report(history, pred),
+                    }
+                ]
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="CTREND 전략 파라미터 sweep (로컬 캐시 사용)"
+    )
+    parser.add_argument("--start-date", required=True, type=date.fromisoformat)
+    parser.add_argument("--end-date", required=True, type=date.fromisoformat)
+    parser.add_argument(
+        "--grid",
+        type=str,
+        default=None,
+        help='조합 JSON 파일 (예: {"train_size": [365, 730], "params": [{"num_leaves": 15}]})',
+    )
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--output", type=str, default="sweep_result.csv")
+    args = parser.parse_args()
+
+    grid = None
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    result = ParameterSweep(
+        start_date=args.start_date,
+        end_date=args.end_date,
+        grid=grid,
+        max_workers=args.max_workers,
+    ).run()
+    result.to_csv(args.output, index=False)
+    print(result.sort_values("sharpe", ascending=False).to_string(index=False))
@@ -0,0 +1,284 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable
+
+import pandas as pd
+
+from src.config.env import PROJECT_ROOT
+from src.config.helper import atomic_path
+from src.connection.bigquery import StreamInsertRowError, get_bq_conn
+
+logger = logging.getLogger(__name__)
+
+# 주문 상세의 state가 이 값이면 더 이상 체결 내역이 바뀌지 않는다.
+SETTLED_STATES = ("done", "cancel")
+
+
+class TradeJournal:
+    """
+    주문 체결 내역(trade_history)을 백그라운드에서 모아 적재하는 journal.
+
+    - submit()은 주문 정보를 로컬 append-only spool 파일에 기록(fsync)하고 바로 반환한다.
+    - 백그라운드 스레드가 주문이 체결 완료(done/cancel)된 뒤 주문 상세를 조회하고,
+      batch_size개 또는 flush_interval초 단위로 모아 trade_history에 stream insert 한다.
+    - 적재가 끝난 주문은 spool에 done 이벤트를 남긴다. 프로세스가 중간에 죽으면
+      다음 시작 시 done이 없는 주문을 다시 처리한다. (at-least-once)
+    - BigQuery가 행 단위로 거부한 주문과, settle_timeout이 지나도록 상세 조회가 실패한 주문은
+      spool에 failed 이벤트(사유 포함)로 남기고 다시 시도하지 않는다.
+    - 전송 오류로 적재에 실패하면 배치를 유지한 채 backoff하며 다시 시도한다.
+      종료 중에는 max_write_retries번까지만 시도하고, 남은 주문은 다음 시작 시 spool에서 복구한다.
+    """
+
+    default_path = os.path.join(PROJECT_ROOT, ".cache", "trade_journal.jsonl")
+
+    def __init__(
+        self,
+        fetch_order: Callable[[str], dict],
+        spool_path: str = None,
+        table_id: str = "trade_history",
+        data_set: str = "crypto_fluxor",
+        batch_size: int = 50,
+        flush_interval: float = 5.0,
+        poll_interval: float = 1.0,
+        settle_timeout: float = 90.0,
+        max_backoff: float = 300.0,
+        max_write_retries: int = 3,
+    ) -> None:
+        self.fetch_order = fetch_order
+        self.spool_path = spool_path or self.default_path
+        self.table_id = table_id
+        self.data_set = data_set
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.settle_timeout = settle_timeout
+        self.max_backoff = max_backoff
+        self.max_write_retries = max_write_retries
+
+        self.queue = queue.Queue()
+        self.spool_lock = threading.Lock()
+        self.idle = threading.Condition()
+        self.n_unfinished = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """spool에 남은 미적재 주문을 복구하고 백그라운드 스레드를 시작한다."""
+        if self.thread is not None:
+            return
+        os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+        pending = self.compact_spool()
+        for entry in pending:
+            self.enqueue(entry)
+        if pending:
+            logger.info(f"trade journal: 미적재 주문 {len(pending)}건 복구")
+
+        self.thread = threading.Thread(
+            target=self.run, name="trade-journal", daemon=True
+        )
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, uuid: str, type: str, market: str):
+        """주문을 journal에 기록한다. spool에 기록된 뒤에 반환하므로 유실되지 않는다."""
+        self.start()
+        entry = {
+            "event": "order",
+            "uuid": uuid,
+            "type": type,
+            "market": market,
+            "submitted_at": time.time(),
+        }
+        self.append_spool([entry])
+        self.enqueue(entry)
+
+    def flush(self, timeout: float = None) -> bool:
+        """지금까지 submit된 주문이 모두 적재될 때까지 기다린다."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.idle:
+            while self.n_unfinished > 0:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 180.0):
+        if self.thread is None:
+            return
+        self.flush(timeout=timeout)
+        self.stop_event.set()
+        self.thread.join(timeout=self.flush_interval + 1)
+        self.thread = None
+
+    def enqueue(self, entry: dict):
+        with self.idle:
+            self.n_unfinished += 1
+        self.queue.put(entry)
+
+    def run(self):
+        pending = []  # 체결 대기 중인 주문
+        batch = []  # 적재 대기 중인 (주문, 상세) 목록
+        last_flush = time.time()
+        write_failures = 0  # 연속 적재 실패 횟수
+        while not self.stop_event.is_set() or pending or batch:
+            try:
+                pending += [self.queue.get(timeout=self.poll_interval)]
+                while True:
+                    pending += [self.queue.get_nowait()]
+            except queue.Empty:
+                pass
+
+            pending, settled = self.poll_orders(pending)
+            batch += settled
+
+            if batch and (
+                len(batch) >= self.batch_size
+                or time.time() - last_flush >= self.flush_interval
+                or self.stop_event.is_set()
+            ):
+                n_batch = len(batch)
+                batch = self.write_batch(batch)
+                # 일부 행만 거부된 경우(나머지는 함께 멈춤)는 실패로 세지 않고 다음 flush에 다시 적재한다.
+                if batch and len(batch) == n_batch:
+                    write_failures += 1
+                    if (
+                        self.stop_event.is_set()
+                        and write_failures >= self.max_write_retries
+                    ):
+                        logger.error(
+                            f"trade journal: 종료 중 적재 실패, {len(batch) + len(pending)}건은 다음 시작 시 다시 적재"
+                        )
+                        return
+                    time.sleep(
+                        min(
+                            self.flush_interval * 2 ** (write_failures - 1),
+                            self.max_backoff,
+                        )
+                    )
+                else:
+                    write_failures = 0
+                last_flush = time.time()
+
+    def poll_orders(self, pending: list) -> tuple:
+        """
+        체결이 끝났거나 settle_timeout이 지난 주문의 상세를 조회해 분리한다.
+        settle_timeout이 지나도록 조회가 실패하는 주문(404, 키 폐기 등)은 failed로 정리한다.
+        """
+        still_pending, settled = [], []
+        for entry in pending:
+            timed_out = time.time() - entry["submitted_at"] > self.settle_timeout
+            try:
+                detail = self.fetch_order(entry["uuid"])
+            except Exception as e:
+                logger.warning(f"trade journal: 주문 조회 실패 {entry['uuid']} ({e})")
+                if timed_out:
+                    self.mark_failed([(entry, None)], reason=f"주문 조회 실패: {e}")
+                else:
+                    still_pending += [entry]
+                continue
+            if detail.get("state") in SETTLED_STATES or timed_out:
+                settled += [(entry, detail)]
+            else:
+                still_pending += [entry]
+        return still_pending, settled
+
+    def write_batch(self, batch: list) -> list:
+        """
+        배치를 적재하고 다시 시도할 (주문, 상세) 목록을 반환한다. (모두 적재했으면 빈 목록)
+        행 단위로 거부된 주문은 failed로 정리하고, 함께 멈춘 나머지 행만 돌려준다.
+        """
+        df = pd.DataFrame(
+            [
+                {
+                    "uuid": entry["uuid"],
+                    "type": entry["type"],
+                    "market": entry["market"],
+                    "data": detail,
+                }
+                for entry, detail in batch
+            ]
+        )
+        try:
+            inserted = get_bq_conn().insert_using_stream(
+                df, table_id=self.table_id, data_set=self.data_set
+            )
+        except StreamInsertRowError as e:
+            rejected = set(e.rows)
+            self.mark_failed(
+                [x for i, x in enumerate(batch) if i in rejected],
+                reason=f"trade_history 적재 거부: {e.errors}",
+            )
+            return [x for i, x in enumerate(batch) if i not in rejected]
+        except Exception as e:
+            logger.error(f"trade journal: trade_history 적재 실패 ({e})")
+            inserted = False
+        if not inserted:
+            return batch
+
+        self.append_spool(
+            [{"event": "done", "uuid": entry["uuid"]} for entry, _ in batch]
+        )
+        self.finish(len(batch))
+        logger.info(f"trade journal: {len(batch)}건 적재")
+        return []
+
+    def mark_failed(self, items: list, reason: str):
+        """적재를 포기한 (주문, 상세) 목록을 spool에 failed 이벤트로 남긴다. (compact 후에도 유지)"""
+        if not items:
+            return
+        for entry, _ in items:
+            logger.error(f"trade journal: 주문 {entry['uuid']} 적재 포기 ({reason})")
+        self.append_spool(
+            [
+                {**entry, "event": "failed", "data": detail, "reason": reason}
+                for entry, detail in items
+            ]
+        )
+        self.finish(len(items))
+
+    def finish(self, n: int):
+        with self.idle:
+            self.n_unfinished -= n
+            self.idle.notify_all()
+
+    def append_spool(self, events: list):
+        with self.spool_lock:
+            with open(self.spool_path, "a") as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def compact_spool(self) -> list:
+        """spool에서 적재가 끝나지 않은 주문과 failed 이벤트만 남기고, 미적재 주문 목록을 반환한다."""
+        with self.spool_lock:
+            if not os.path.exists(self.spool_path):
+                return []
+            orders, done, failed = {}, set(), []
+            with open(self.spool_path) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 기록 도중 종료되어 잘린 마지막 줄
+                    if event["event"] == "order":
+                        orders[event["uuid"]] = event
+                    elif event["event"] == "done":
+                        done.add(event["uuid"])
+                    elif event["event"] == "failed":
+                        # 적재를 포기한 주문은 다시 처리하지 않고, 확인할 수 있도록 기록만 남긴다.
+                        failed += [event]
+                        done.add(event["uuid"])
+            pending = [x for uuid, x in orders.items() if uuid not in done]
+            with atomic_path(self.spool_path) as tmp, open(tmp, "w") as f:
+                for event in failed + pending:
+                    f.write(json.dumps(event) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            return pending
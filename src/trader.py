@@ -1,5 +1,4 @@
 import logging
-from collections import defaultdict
 from datetime import datetime, timedelta
 
 import pandas as pd
@@ -7,12 +6,15 @@ import pytz
 
 from src.bithumb import get_bithumb_client
 from src.connection.bigquery import get_bq_conn
+from src.lot_ledger import sync_lot_ledger
+from src.order_engine import OrderExecutionEngine
 
 logger = logging.getLogger(__name__)
 RANDOM_STATE = 950223
 kst = pytz.timezone("Asia/Seoul")
 bq_conn = get_bq_conn()
 bithumb_client = get_bithumb_client()
+order_engine = OrderExecutionEngine(bithumb_client)
 
 
 def get_account_df() -> pd.DataFrame:
@@ -20,131 +22,61 @@ def get_account_df() -> pd.DataFrame:
     return bithumb_client.get_account_info().rename(columns={"currency": "symbol"})
 
 
-def execute_sell_logic(cand_short: pd.DataFrame, except_cryptos: tuple):
-    # 1) SHORT TARGETs 매도
-    # account_df의 shape, columns 프린트
-    if cand_short.empty:
-        logger.info("No SHORT targets to sell.")
-        exit(0)
+def flush_trade_journal(timeout: float = 180):
+    """이전 실행에서 남은 주문을 포함해 체결 내역이 trade_history에 모두 적재될 때까지 기다린다."""
+    if bithumb_client.trade_journal is None:
+        return
+    bithumb_client.trade_journal.start()
+    if not bithumb_client.trade_journal.flush(timeout=timeout):
+        logger.warning(
+            "trade journal 적재가 끝나지 않았습니다. (spool에 보관 후 다음 실행 때 재시도)"
+        )
+
+
+def execute_rebalance(
+    cand_long: pd.DataFrame, cand_short: pd.DataFrame, except_cryptos: tuple
+) -> dict:
+    """SHORT TARGETs 매도와 LONG TARGETs 매수를 동시에 진행한다.
+
+    매도 주문을 동시에 제출하고, 체결로 확보된 KRW가 종목당 예산에 도달하는 대로 매수를 제출한다.
+    """
+    if cand_short.empty and len(cand_long) == 0:
+        logger.info("No LONG/SHORT targets.")
+        return {}
 
     account_df = get_account_df()
 
+    # 1) SHORT TARGETs 매도 대상
     sell_targets = account_df.merge(cand_short, on="symbol", how="inner")[
         ["market", "balance"]
     ].reset_index(drop=True)
+    sells = [
+        (market, balance)
+        for market, balance in zip(sell_targets["market"], sell_targets["balance"])
+        if market not in except_cryptos
+    ]
+    for market, balance in sells:
+        logger.info(f"SELL(ask) market(시장가) - {market}:{balance}")
 
-    for i in sell_targets.index:
-        _market, _balance = sell_targets.at[i, "market"], sell_targets.at[i, "balance"]
-        if _market in except_cryptos:
-            continue
-        logger.info(f"SELL(ask) market(시장가) - {_market}:{_balance}")
-
-        try:
-            bithumb_client.exceute_order(
-                type="sell", market=_market, volume=_balance, ord_type="market"
-            )
-        except Exception as e:
-            logger.error(f"Error executing sell order for {_market}: {e}")
+    # 2) LONG TARGETs 매수 대상, 예산은 매도 예상 대금을 포함해 측정
+    buys = [x for x in cand_long["market"] if x not in except_cryptos]
+    budget = float(account_df.loc[account_df["symbol"] == "KRW", "balance"].sum())
 
-
-def execute_buy_logic(cand_long: pd.DataFrame, except_cryptos: tuple):
-    # 2) SHORT TARGETs 매도 후, 정산 결과를 포함하여 예산 측정
-    if len(cand_long) == 0:
-        logger.info("No LONG targets to buy.")
-        exit(0)
-
-    account_df = get_account_df()
-    budget = int(account_df.loc[account_df["symbol"] == "KRW", "balance"].to_list()[0])
-
-    each_budget = budget / len(cand_long)
-    each_budget = int(each_budget / 1000) * 1000
-    logger.info(f"BUTGET: {each_budget} (total={budget})")
-    # 3) LONG TARGETs 매수
-    for _market in cand_long["market"]:
-        if _market in except_cryptos:
-            continue
-        logger.info(f"BUY(bid) price(시장가) - {_market}:{each_budget}")
-        try:
-            bithumb_client.exceute_order(
-                type="buy", market=_market, price=each_budget, ord_type="price"
-            )
-        except Exception as e:
-            logger.error(f"Error executing buy order for {_market}: {e}")
-    return 1
+    return order_engine.rebalance(sells=sells, buys=buys, krw_balance=budget)
 
 
 def sell_expired_crypto(target_date: datetime, expire_range: int):
-    target_date_str = target_date.strftime("%Y-%m-%d")
     # 기준일자 (40일 이전) 계산
     cutoff_date = target_date - timedelta(days=expire_range)
 
-    # BigQuery에서 거래 내역 조회 (매수/매도 포함), created_at은 타임존 고려해 변환
-    trade_log = bq_conn.query(f"""
-    DECLARE target_date DATETIME DEFAULT '{target_date_str}';
-    SELECT 
-        uuid,
-        type,
-        market,
-        SAFE_CAST(JSON_VALUE(data, '$.executed_volume') AS FLOAT64) AS executed_volume,
-        DATETIME(PARSE_TIMESTAMP('%Y-%m-%dT%H:%M:%S%Ez', JSON_VALUE(data, '$.created_at')), 'Asia/Seoul') AS created_at,
-        update_dt
-    FROM `proj-asset-allocation.crypto_fluxor.trade_history`
-    ORDER BY created_at ASC
-    """)
-
-    # datetime 타입으로 변환
-    trade_log["created_at"] = pd.to_datetime(trade_log["created_at"])
-    trade_log["update_dt"] = pd.to_datetime(trade_log["update_dt"])
-
-    # market별로 남은 매수 잔량을 기록할 dict (FIFO 기준)
-    holdings = defaultdict(dict)
-
-    # 거래 내역을 순회하며 holdings 계산
-    for _, row in trade_log.iterrows():
-        market = row["market"]
-        created_at = row["created_at"]
-        volume = row["executed_volume"]
-
-        if row["type"] == "buy":
-            # 매수 건은 그대로 보유량에 추가
-            holdings[market][created_at] = holdings[market].get(created_at, 0) + volume
-
-        elif row["type"] == "sell":
-            # 매도일 경우, 이전 매수 건에서 FIFO 방식으로 차감
-            remaining = volume
-            for buy_time in sorted(holdings[market].keys()):
-                if buy_time >= created_at:
-                    continue  # 미래 매수는 건너뜀
-
-                available = holdings[market][buy_time]
-                deduct = min(remaining, available)  # 차감할 수 있는 양 계산
-                holdings[market][buy_time] -= deduct
-                remaining -= deduct
-
-                if holdings[market][buy_time] == 0:
-                    # 0이 된 매수는 제거
-                    del holdings[market][buy_time]
-
-                if remaining <= 0:
-                    break  # 더 이상 차감할 필요 없음
-
-            # 해당 market에 남은 매수가 없으면 market 자체 삭제
-            if len(holdings[market]) == 0:
-                del holdings[market]
+    # 아직 적재되지 않은 체결 내역이 있으면 먼저 반영한다.
+    flush_trade_journal()
 
-    # 40일 이상 보유된 매수 내역만 티커별로 합산
-    filtered_holdings = defaultdict(float)
-    for market, buys in holdings.items():
-        for created_at, volume in buys.items():
-            if created_at < cutoff_date:
-                filtered_holdings[market] += volume
+    # 저장된 FIFO 원장에 지난 실행 이후 적재된 거래(매수/매도)만 반영
+    ledger = sync_lot_ledger(bq_conn)
 
-    filtered_holdings_df = pd.DataFrame(
-        [
-            {"market": market, "volume": volume}
-            for market, volume in filtered_holdings.items()
-        ]
-    )
+    # 40일 이상 보유된 매수 내역만 티커별로 합산
+    filtered_holdings_df = ledger.get_expired(cutoff_date)
 
     if filtered_holdings_df.empty:
         logger.info("No expired holdings to sell.")
@@ -175,12 +107,12 @@ def sell_expired_crypto(target_date: datetime, expire_range: int):
     merged["balance"] = merged["balance"].astype(float)
     merged["remain_volume"] = merged["balance"] - merged["sell_volume"]
 
-    for _, row in merged.loc[merged["remain_volume"] > 0].iterrows():
-        market = row["market"]
-        rebalance_vol = row["remain_volume"]
-        try:
-            bithumb_client.exceute_order(
-                type="sell", market=market, ord_type="market", volume=rebalance_vol
-            )
-        except Exception as e:
-            logging.error(f"Error executing sell order for {market}: {e}")
+    expired = merged.loc[merged["remain_volume"] > 0]
+    results = order_engine.submit_orders(
+        [
+            dict(type="sell", market=market, ord_type="market", volume=volume)
+            for market, volume in zip(expired["market"], expired["remain_volume"])
+        ]
+    )
+    # 정산된 KRW가 이후 리밸런싱 예산에 반영되도록 체결을 기다린다.
+    order_engine.wait_settled([x["uuid"] for x in results if x and "uuid" in x])
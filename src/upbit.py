@@ -35,10 +35,12 @@ import uuid
 from urllib.parse import unquote, urlencode
 
 import jwt
-import requests
 from dotenv import load_dotenv
 
+from src.config.env import UPBIT_API_URL
 from src.connection.bigquery import get_bq_conn
+from src.connection.http import EndpointPolicy, get_http_transport
+from src.metrics import get_metrics_registry
 
 load_dotenv()
 
@@ -46,10 +48,17 @@ logger = logging.getLogger(__name__)
 headers = {"accept": "application/json"}
 bq_conn = get_bq_conn()
 
-server_url = "https://api.upbit.com"
+server_url = UPBIT_API_URL
 access_key = os.environ["UPBIT_KEY"]
 secret_key = os.environ["UPBIT_SECRET"]
 
+# 주문/입금은 중복 처리를 막기 위해 재시도하지 않는다.
+http = get_http_transport()
+http.mount(server_url, pool_size=4)
+http.set_policy("upbit.accounts", EndpointPolicy(timeout=(3.05, 10), retries=2))
+http.set_policy("upbit.orders", EndpointPolicy(timeout=(3.05, 10), retries=0))
+http.set_policy("upbit.deposits.krw", EndpointPolicy(timeout=(3.05, 10), retries=0))
+
 
 def _make_auth_headers(payload: dict) -> dict:
     jwt_token = jwt.encode(payload, secret_key)
@@ -65,12 +74,14 @@ def _make_query_hash(params: dict) -> str:
 
 
 def get_accounts():
-    payload = {
-        "access_key": access_key,
-        "nonce": str(uuid.uuid4()),
-    }
-    headers = _make_auth_headers(payload)
-    res = requests.get(server_url + "/v1/accounts", headers=headers)
+    # 재시도하면 같은 nonce는 거부되므로 시도마다 새로 서명한다.
+    res = http.get(
+        server_url + "/v1/accounts",
+        endpoint="upbit.accounts",
+        auth=lambda: _make_auth_headers(
+            {"access_key": access_key, "nonce": str(uuid.uuid4())}
+        ),
+    )
     return res.json()
 
 
@@ -95,8 +106,18 @@ def post_order(
         "query_hash_alg": "SHA512",
     }
     headers = _make_auth_headers(payload)
-    res = requests.post(server_url + "/v1/orders", json=params, headers=headers)
-    return res.json()
+    res = http.post(
+        server_url + "/v1/orders", endpoint="upbit.orders", json=params, headers=headers
+    )
+    data = res.json()
+    if "error" in data:
+        get_metrics_registry().counter(
+            "exchange_order_errors_total",
+            "거래소 주문 오류 응답 수",
+            exchange="upbit",
+            name=data["error"].get("name"),
+        ).inc()
+    return data
 
 
 def post_market_buy_order(market: str, price: float):
@@ -128,5 +149,10 @@ def post_deposit_krw(amount: int, two_factor_type: str = "naver"):
         "query_hash_alg": "SHA512",
     }
     headers = _make_auth_headers(payload)
-    res = requests.post(server_url + "/v1/deposits/krw", json=params, headers=headers)
+    res = http.post(
+        server_url + "/v1/deposits/krw",
+        endpoint="upbit.deposits.krw",
+        json=params,
+        headers=headers,
+    )
     return res.json()
@@ -0,0 +1,245 @@
+import json
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+from src import backfill  # noqa: E402
+from src.backfill import BithumbBackfillEngine  # noqa: E402
+from src.bithumb import BithumbClient  # noqa: E402
+
+TARGET_DATE = date(2025, 3, 1)
+THRESHOLD = 30
+START_DATE = TARGET_DATE - timedelta(days=THRESHOLD)
+END_DATE = TARGET_DATE - timedelta(days=1)
+
+
+class FakeCandleClient:
+    """캔들 API stand-in. market별 상장일부터 end_date 미만의 캔들을 최신순으로 count개 준다.
+
+    - halted: 캔들이 없는 날짜 (거래 정지)
+    - failing: 조회가 실패하는 (market, end_date)
+    - empty: 빈 응답을 주는 (market, end_date)
+    - truncate: 최신 캔들 n개가 빠진 응답을 주는 {(market, end_date): n}
+    """
+
+    max_workers = 4
+    get_candle_data_bulk = BithumbClient.get_candle_data_bulk
+    format_candle_data = BithumbClient.format_candle_data
+
+    def __init__(self, listed_on: dict) -> None:
+        self.listed_on = listed_on
+        self.crypto_markets = pd.DataFrame({"market": list(listed_on)})
+        self.halted = {}
+        self.failing = set()
+        self.empty = set()
+        self.truncate = {}
+        self.pages = []
+
+    def get_candle_data(self, market: str, count: int, end_date: date) -> pd.DataFrame:
+        self.pages += [(market, count, end_date)]
+        if (market, end_date) in self.failing:
+            raise ConnectionError("candle request failed")
+        if (market, end_date) in self.empty:
+            return pd.DataFrame()
+        days = []
+        day = end_date - timedelta(days=1)
+        while len(days) < count and day >= self.listed_on[market]:
+            if day not in self.halted.get(market, ()):
+                days += [day]
+            day -= timedelta(days=1)
+        days = days[self.truncate.get((market, end_date), 0) :]
+        return pd.DataFrame(
+            [
+                {
+                    "market": market,
+                    "candle_date_time_utc": f"{x}T00:00:00",
+                    "candle_date_time_kst": f"{x}T09:00:00",
+                    "opening_price": 100.0,
+                    "high_price": 110.0,
+                    "low_price": 90.0,
+                    "trade_price": 105.0,
+                    "timestamp": 0,
+                    "candle_acc_trade_price": 1e6,
+                    "candle_acc_trade_volume": 1e4,
+                    "prev_closing_price": 100.0,
+                }
+                for x in days
+            ]
+        )
+
+
+class FakeCache:
+    def invalidate(self, table_id: str):
+        pass
+
+
+class FakeBigQueryConn:
+    """(market, reg_date) 행만 보관하는 bithumb_crypto_1d stand-in"""
+
+    project_id = "test"
+
+    def __init__(self, rows: set = ()) -> None:
+        self.rows = set(rows)
+        self.cache = FakeCache()
+
+    def query(self, sql: str) -> pd.DataFrame:
+        return pd.DataFrame(sorted(self.rows), columns=["market", "reg_date"])
+
+    def merge_upsert(self, df: pd.DataFrame, table_id, data_set, key_cols):
+        self.rows |= set(zip(df["market"], pd.to_datetime(df["reg_date"]).dt.date))
+
+
+def date_range(start: date, end: date) -> list:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """state 파일을 tmp_path에 두고, 같은 fake client/table을 쓰는 엔진을 만든다."""
+    monkeypatch.setattr(
+        BithumbBackfillEngine, "state_path", str(tmp_path / "backfill_state.json")
+    )
+    monkeypatch.setattr(BithumbBackfillEngine, "PAGE_SIZE", 10)
+
+    def make(
+        client: FakeCandleClient, table: FakeBigQueryConn
+    ) -> BithumbBackfillEngine:
+        monkeypatch.setattr(backfill, "get_bithumb_client", lambda: client)
+        monkeypatch.setattr(backfill, "get_bq_conn", lambda: table)
+        return BithumbBackfillEngine()
+
+    return make
+
+
+def run(engine: BithumbBackfillEngine, markets: list) -> pd.DataFrame:
+    return engine.run(markets, target_date=TARGET_DATE, threshold=THRESHOLD)
+
+
+def test_repeated_run_plans_no_pages(make_engine):
+    listed_on = {"KRW-OLD": date(2024, 1, 1), "KRW-NEW": END_DATE - timedelta(days=5)}
+    client = FakeCandleClient(listed_on)
+    client.halted = {"KRW-OLD": {START_DATE + timedelta(days=3)}}
+    table = FakeBigQueryConn()
+
+    result = run(make_engine(client, table), list(listed_on))
+    assert len(result) == (THRESHOLD - 1) + 6
+    assert ("KRW-OLD", START_DATE + timedelta(days=3)) not in table.rows
+
+    engine = make_engine(client, table)
+    assert engine.plan(list(listed_on), TARGET_DATE, THRESHOLD) == {}
+    client.pages = []
+    assert run(engine, list(listed_on)).empty
+    assert client.pages == []
+
+
+def test_short_page_records_first_candle(make_engine):
+    listed_on = {"KRW-NEW": END_DATE - timedelta(days=5)}
+    client = FakeCandleClient(listed_on)
+    engine = make_engine(client, FakeBigQueryConn())
+    run(engine, list(listed_on))
+    assert engine.first_candle["KRW-NEW"][0] == listed_on["KRW-NEW"]
+    assert engine.no_candle.get("KRW-NEW", {}) == {}
+
+
+def test_truncated_page_records_nothing(make_engine):
+    """최신 캔들이 빠진 짧은 응답은 온전하지 않으므로 첫 캔들 / 캔들 없음을 기록하지 않는다."""
+    listed_on = {"KRW-NEW": END_DATE - timedelta(days=5)}
+    client = FakeCandleClient(listed_on)
+    client.truncate = {("KRW-NEW", TARGET_DATE): 2}
+    table = FakeBigQueryConn()
+    engine = make_engine(client, table)
+    run(engine, list(listed_on))
+    # 이전 구간의 빈 페이지로 기록한 첫 캔들은 실제 상장일을 넘지 않는다.
+    assert engine.first_candle["KRW-NEW"][0] <= listed_on["KRW-NEW"]
+    assert engine.no_candle.get("KRW-NEW", {}) == {}
+
+    # 빠진 날짜는 다음 실행에서 다시 조회해 채운다.
+    client.truncate = {}
+    run(make_engine(client, table), list(listed_on))
+    assert {x for m, x in table.rows if m == "KRW-NEW"} == set(
+        date_range(listed_on["KRW-NEW"], END_DATE)
+    )
+
+
+def test_empty_page_before_listing_records_first_candle(make_engine):
+    # 첫 페이지(최근 10개)는 상장일에 딱 맞게 꽉 차고, 그 이전 페이지는 빈 응답
+    listed_on = {"KRW-NEW": END_DATE - timedelta(days=9)}
+    client = FakeCandleClient(listed_on)
+    engine = make_engine(client, FakeBigQueryConn())
+    run(engine, list(listed_on))
+    assert engine.first_candle["KRW-NEW"][0] == listed_on["KRW-NEW"]
+    assert engine.plan(list(listed_on), TARGET_DATE, THRESHOLD) == {}
+
+
+def test_transient_empty_page_is_not_trusted(make_engine):
+    """이전 캔들을 받은 market의 빈 페이지(일시적 빈 응답)는 첫 캔들로 기록하지 않는다."""
+    listed_on = {"KRW-OLD": date(2024, 1, 1)}
+    client = FakeCandleClient(listed_on)
+    client.empty = {("KRW-OLD", TARGET_DATE)}
+    table = FakeBigQueryConn()
+    engine = make_engine(client, table)
+    run(engine, list(listed_on))
+    assert "KRW-OLD" not in engine.first_candle
+    assert engine.no_candle.get("KRW-OLD", {}) == {}
+
+    plan = make_engine(client, table).plan(list(listed_on), TARGET_DATE, THRESHOLD)
+    assert plan == {"KRW-OLD": [(END_DATE - timedelta(days=9), END_DATE)]}
+
+
+def test_failed_page_confirms_nothing_for_market(make_engine):
+    listed_on = {"KRW-OLD": date(2024, 1, 1), "KRW-NEW": END_DATE - timedelta(days=5)}
+    client = FakeCandleClient(listed_on)
+    client.halted = {"KRW-OLD": {END_DATE - timedelta(days=2)}}
+    client.failing = {("KRW-OLD", END_DATE - timedelta(days=9))}
+    table = FakeBigQueryConn()
+    engine = make_engine(client, table)
+    run(engine, list(listed_on))
+    assert "KRW-OLD" not in engine.first_candle
+    assert "KRW-OLD" not in engine.no_candle
+    # 다른 market은 영향을 받지 않는다.
+    assert engine.first_candle["KRW-NEW"][0] == listed_on["KRW-NEW"]
+
+    client.failing = set()
+    client.pages = []
+    run(make_engine(client, table), list(listed_on))
+    assert {x[0] for x in client.pages} == {"KRW-OLD"}
+    assert {x for m, x in table.rows if m == "KRW-OLD"} == set(
+        date_range(START_DATE, END_DATE)
+    ) - {END_DATE - timedelta(days=2)}
+
+
+def test_markers_expire_after_ttl(make_engine):
+    listed_on = {"KRW-OLD": date(2024, 1, 1), "KRW-NEW": END_DATE - timedelta(days=5)}
+    client = FakeCandleClient(listed_on)
+    client.halted = {"KRW-OLD": {START_DATE + timedelta(days=3)}}
+    table = FakeBigQueryConn()
+    engine = make_engine(client, table)
+    run(engine, list(listed_on))
+
+    # 기록한 날을 MARKER_TTL_DAYS만큼 과거로 옮기면 다시 조회 대상이 된다.
+    with open(engine.state_path) as f:
+        state = json.load(f)
+    checked = str(date.today() - timedelta(days=BithumbBackfillEngine.MARKER_TTL_DAYS))
+    for market, (first_date, _) in state["first_candle"].items():
+        state["first_candle"][market] = [first_date, checked]
+    for dates in state["no_candle"].values():
+        for x in dates:
+            dates[x] = checked
+    with open(engine.state_path, "w") as f:
+        json.dump(state, f)
+
+    engine = make_engine(client, table)
+    assert engine.first_candle == {} and not any(engine.no_candle.values())
+    plan = engine.plan(list(listed_on), TARGET_DATE, THRESHOLD)
+    assert plan == {
+        "KRW-OLD": [(START_DATE + timedelta(days=3),) * 2],
+        "KRW-NEW": [(START_DATE, listed_on["KRW-NEW"] - timedelta(days=1))],
+    }
@@ -0,0 +1,63 @@
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+from src.backtest import FeatureMatrix  # noqa: E402
+
+TRAIN_DATE = date(2025, 3, 1)
+
+
+def make_features(dates: dict) -> pd.DataFrame:
+    """market별 날짜 목록으로 get_features 형식의 표를 만든다. (y는 같은 market 안에서 7행 뒤 종가)"""
+    frames = []
+    for market, days in dates.items():
+        days = pd.to_datetime(pd.Series(days))
+        frame = pd.DataFrame(
+            {
+                "reg_date": days,
+                "market": market,
+                "symbol": market.split("-")[-1],
+                "feature": np.arange(len(days), dtype=np.float32),
+                "y": np.float32(1.0),
+                "label_date": days.shift(-7),
+            }
+        )
+        frame.loc[frame["label_date"].isna(), "y"] = np.nan
+        frames += [frame]
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_train_rows_use_label_date_not_calendar_horizon():
+    days = [TRAIN_DATE - timedelta(days=i) for i in range(60, 0, -1)]
+    # KRW-BBB는 train_date 직전 10일이 거래 정지(행 없음)였다가 train_date 이후 다시 거래된다.
+    halted = [x for x in days if x < TRAIN_DATE - timedelta(days=10)]
+    halted += [TRAIN_DATE + timedelta(days=i) for i in range(10)]
+    matrix = FeatureMatrix.from_features(
+        make_features({"KRW-AAA": days, "KRW-BBB": halted})
+    )
+
+    rows = matrix.get_train_rows(TRAIN_DATE, train_size=365, symbols={"AAA", "BBB"})
+
+    assert len(rows) > 0
+    assert (matrix.label_date[rows] <= np.datetime64(TRAIN_DATE, "D")).all()
+    # 달력 기준(reg_date <= train_date - 7)으로는 들어가지만, y가 train_date 이후 종가인 행은 빠진다.
+    calendar = matrix.get_rows(
+        TRAIN_DATE - timedelta(days=366),
+        TRAIN_DATE - timedelta(days=7),
+        {"AAA", "BBB"},
+    )
+    calendar = calendar[matrix.complete[calendar]]
+    leaked = set(calendar) - set(rows)
+    assert leaked
+    assert (matrix.label_date[list(leaked)] > np.datetime64(TRAIN_DATE, "D")).all()
+    assert {matrix.meta["markets"][x] for x in matrix.market[list(leaked)]} == {
+        "KRW-BBB"
+    }
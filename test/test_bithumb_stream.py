@@ -0,0 +1,176 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+from websockets.asyncio.server import serve
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+from src.bithumb_stream import INTERVAL_MS, BithumbTradeStream, floor_ms, to_kst  # noqa: E402
+
+MARKET = "KRW-BTC"
+MINUTE = INTERVAL_MS["1m"]
+
+
+def trade(ts_ms: int, price: float, volume: float) -> str:
+    return json.dumps(
+        {
+            "type": "trade",
+            "code": MARKET,
+            "trade_timestamp": ts_ms,
+            "trade_price": price,
+            "trade_volume": volume,
+            "stream_type": "REALTIME",
+        }
+    )
+
+
+class FakeClient:
+    """REST 분봉 backfill용 가짜 BithumbClient"""
+
+    max_workers = 2
+
+    def __init__(self, candles: dict = None) -> None:
+        # 분봉 시작(ms) -> (open, high, low, close, volume)
+        self.candles = candles or {}
+        self.calls = []
+
+    def get_minute_candle_data(self, market, count, end_date):
+        self.calls.append((market, count, end_date))
+        rows = [
+            {
+                "candle_date_time_kst": to_kst(start).strftime("%Y-%m-%dT%H:%M:%S"),
+                "opening_price": o,
+                "high_price": h,
+                "low_price": lo,
+                "trade_price": c,
+                "candle_acc_trade_volume": v,
+                "candle_acc_trade_price": c * v,
+            }
+            for start, (o, h, lo, c, v) in self.candles.items()
+        ]
+        return pd.DataFrame(rows)
+
+
+async def run_stream(handler, stream_kwargs: dict, until, timeout: float = 10):
+    """가짜 WebSocket 서버에 stream을 붙이고, until(stream)이 참이 되면 멈춘다.
+
+    (stream, interval별로 적재된 봉) 반환
+    """
+    stored = {}
+
+    def sink(interval, df):
+        stored.setdefault(interval, []).append(df)
+
+    async with serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        stream = BithumbTradeStream(
+            [MARKET], url=f"ws://127.0.0.1:{port}", sink=sink, **stream_kwargs
+        )
+        stop = asyncio.Event()
+        task = asyncio.create_task(stream.run(stop))
+
+        async def wait_until():
+            while not until(stream):
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(wait_until(), timeout)
+        stop.set()
+        await asyncio.wait_for(task, timeout)
+    return stream, {k: pd.concat(v, ignore_index=True) for k, v in stored.items()}
+
+
+def test_aggregates_trades_into_minute_bars():
+    # 연결 직후 REST backfill이 현재 분까지 마감하므로, 체결은 다음 분부터 보낸다.
+    base = floor_ms(BithumbTradeStream.now_ms(), "1m") + MINUTE
+    subscriptions = []
+
+    async def handler(ws):
+        subscriptions.append(json.loads(await ws.recv()))
+        for ts, price, volume in [
+            (base + 1000, 100, 1),
+            (base + 30000, 110, 2),
+            (base + 20000, 90, 1),  # 순서가 바뀌어 도착한 체결
+            (base + MINUTE + 1000, 105, 1),  # 다음 분 체결 → base 분봉 마감
+        ]:
+            await ws.send(trade(ts, price, volume))
+        await ws.wait_closed()
+
+    _, stored = asyncio.run(
+        run_stream(
+            handler,
+            {"client": FakeClient()},
+            until=lambda s: s.aggregator.closed["1m"],
+        )
+    )
+
+    assert subscriptions[0][1] == {
+        "type": "trade",
+        "codes": [MARKET],
+        "isOnlyRealtime": True,
+    }
+    bar = stored["1m"].iloc[0]
+    assert bar["reg_date"] == to_kst(base)
+    assert (bar["open"], bar["close"], bar["high"], bar["low"]) == (100, 110, 110, 90)
+    assert bar["volume"] == 4
+    assert bar["acc_trade_sum"] == 100 + 220 + 90
+
+
+def test_backfills_minute_bars_from_rest_on_connect():
+    now = floor_ms(BithumbTradeStream.now_ms(), "1m")
+    rest_start = now - 3 * MINUTE
+    client = FakeClient({rest_start: (50, 60, 40, 55, 2)})
+
+    async def handler(ws):
+        await ws.recv()
+        await ws.wait_closed()
+
+    stream = BithumbTradeStream([MARKET], client=client)
+    assert stream.gap_start == floor_ms(stream.now_ms(), "1d")
+
+    _, stored = asyncio.run(
+        run_stream(
+            handler,
+            {"client": client},
+            until=lambda s: s.connected,
+        )
+    )
+
+    assert client.calls and {x[0] for x in client.calls} == {MARKET}
+    bar = stored["1m"].set_index("reg_date").loc[to_kst(rest_start)]
+    assert (bar["open"], bar["close"], bar["high"], bar["low"]) == (50, 55, 60, 40)
+    assert bar["volume"] == 2
+
+
+def test_reconnects_after_server_closes():
+    # 연결 직후 REST backfill이 현재 분까지 마감하므로, 체결은 다음 분부터 보낸다.
+    base = floor_ms(BithumbTradeStream.now_ms(), "1m") + MINUTE
+    connections = []
+
+    async def handler(ws):
+        connections.append(json.loads(await ws.recv()))
+        if len(connections) == 1:
+            await ws.send(trade(base + 1000, 100, 1))
+            return  # 서버가 연결을 끊음
+        await ws.send(trade(base + 2000, 120, 1))
+        await ws.send(trade(base + MINUTE + 1000, 105, 1))
+        await ws.wait_closed()
+
+    stream, stored = asyncio.run(
+        run_stream(
+            handler,
+            {"client": FakeClient()},
+            until=lambda s: s.aggregator.closed["1m"],
+        )
+    )
+
+    assert len(connections) == 2
+    # 재구독 메시지마다 새 ticket을 쓴다.
+    assert connections[0][0]["ticket"] != connections[1][0]["ticket"]
+    bar = stored["1m"].iloc[0]
+    assert (bar["open"], bar["close"], bar["volume"]) == (100, 120, 2)
@@ -0,0 +1,138 @@
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pytest
+import requests
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+from src.bithumb import BithumbClient  # noqa: E402
+from src.exchange_sim import SimulatedExchange, start_simulator  # noqa: E402
+from src.order_engine import OrderExecutionEngine  # noqa: E402
+
+CLOSES = {"KRW-AAA": 1_000.0, "KRW-BBB": 20_000.0, "KRW-CCC": 50.0, "KRW-DDD": 300.0}
+
+
+def make_candles(n_days: int = 3) -> pd.DataFrame:
+    rows = []
+    for i in range(n_days):
+        reg_date = date(2025, 1, 1) + timedelta(days=i)
+        for market, close in CLOSES.items():
+            rows += [
+                {
+                    "reg_date": reg_date,
+                    "market": market,
+                    "open": close,
+                    "high": close * 1.05,
+                    "low": close * 0.95,
+                    "close": close,
+                    "volume": 1e9 / close,
+                }
+            ]
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def simulator():
+    """일봉 3일치 위에서 도는 시뮬레이터와, 그 주소를 쓰는 BithumbClient"""
+    exchange = SimulatedExchange(
+        make_candles(),
+        balances={"KRW": 100_000.0, "AAA": 50.0, "BBB": 2.0},
+        fill_delay=0.05,
+    )
+    server = start_simulator(exchange)
+    client = BithumbClient(base_url=server.url, max_workers=4, journal=False)
+    client.bithumb_key = client.bithumb_key or "sim"
+    client.bithumb_secret = client.bithumb_secret or "sim"
+    yield exchange, server, client
+    server.stop()
+
+
+def test_rebalance_sells_then_buys(simulator):
+    exchange, _, client = simulator
+    engine = OrderExecutionEngine(client, max_workers=4, poll_interval=0.02)
+    krw = client.get_krw_balance()
+    assert krw == 100_000
+
+    summary = engine.rebalance(
+        sells=[("KRW-AAA", 50.0), ("KRW-BBB", 2.0)],
+        buys=["KRW-CCC", "KRW-DDD"],
+        krw_balance=krw,
+    )
+
+    assert summary["n_sell"] == 2
+    assert summary["n_buy"] == 2
+    # 매도 예상 대금(50 * 1,000 + 2 * 20,000)까지 종목당 예산에 잡힌다.
+    assert summary["each_budget"] > krw / 2
+    assert exchange.balances["AAA"] == pytest.approx(0)
+    assert exchange.balances["BBB"] == pytest.approx(0)
+    assert exchange.balances["CCC"] > 0
+    assert exchange.balances["DDD"] > 0
+    # 매수 대금이 잔고를 넘지 않았고, 묶인 잔고가 남지 않았다.
+    assert exchange.balances["KRW"] >= 0
+    assert all(abs(x) < 1e-6 for x in exchange.locked.values())
+    assert {x["closed"] for x in exchange.orders.values()} == {True}
+
+
+def test_accounts_reflect_fills(simulator):
+    exchange, _, client = simulator
+    engine = OrderExecutionEngine(client, max_workers=4, poll_interval=0.02)
+
+    results = engine.submit_orders(
+        [dict(type="buy", market="KRW-DDD", price=30_000, ord_type="price")]
+    )
+    settled = engine.wait_settled([x["uuid"] for x in results])
+
+    detail = settled[results[0]["uuid"]]
+    assert detail["state"] == "done"
+    paid = 30_000 + float(detail["paid_fee"])
+    account = client.get_account_info().set_index("currency")
+    assert float(account.loc["KRW", "balance"]) == pytest.approx(100_000 - paid)
+    assert float(account.loc["DDD", "balance"]) == pytest.approx(
+        float(detail["executed_volume"])
+    )
+    # 시장가 매수는 종가보다 높은 매도 호가에서 체결된다.
+    assert float(account.loc["DDD", "avg_buy_price"]) > CLOSES["KRW-DDD"]
+    assert client.get_krw_balance() == pytest.approx(exchange.balances["KRW"])
+
+
+def test_rate_limit_returns_429():
+    exchange = SimulatedExchange(make_candles())
+    server = start_simulator(exchange, public_rate=2, private_rate=2)
+    try:
+        url = f"{server.url}/v1/ticker"
+        responses = [
+            requests.get(url, params={"markets": "KRW-AAA"}, timeout=5)
+            for _ in range(4)
+        ]
+    finally:
+        server.stop()
+
+    assert [x.status_code for x in responses[:2]] == [200, 200]
+    assert 429 in [x.status_code for x in responses[2:]]
+    limited = next(x for x in responses if x.status_code == 429)
+    assert limited.json()["error"]["name"] == "too_many_requests"
+    assert server.stats["too_many_requests"] >= 1
+    assert server.stats["ticker"] == 4
+
+
+def test_retry_after_429_signs_a_new_nonce(simulator):
+    exchange, server, client = simulator
+    # Private API 토큰을 모두 써 두면 다음 계좌 조회는 한 번 429를 받고 재시도한다.
+    while server.private_limiter.try_acquire():
+        pass
+    n_nonces = len(server.nonces)
+
+    account = client.get_account_info()
+
+    assert server.stats["too_many_requests"] >= 1
+    assert server.stats["nonce_used"] == 0
+    # 429를 받은 요청과 재시도가 각각 다른 nonce로 서명되었다.
+    assert len(server.nonces) - n_nonces == server.stats["accounts"]
+    assert server.stats["accounts"] >= 2
+    assert float(account.set_index("currency").loc["KRW", "balance"]) == 100_000
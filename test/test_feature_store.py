@@ -0,0 +1,226 @@
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.preprocessing import StandardScaler
+from statsmodels.tsa.regime_switching.markov_regression import MarkovRegression
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+from src.feature_store import (  # noqa: E402
+    DEFAULT_FEATURES,
+    FeatureStoreByCrypto,
+    FeatureStoreByPanel,
+    IncrementalFeatureStore,
+    MarkovRegimeCache,
+    rolling_mean_abs_deviation,
+    rolling_moments,
+)
+
+
+def make_candles(market: str, n_days: int = 280, seed: int = 0) -> pd.DataFrame:
+    """국면이 바뀌는 합성 일봉 (중간에 가격이 멈춘 구간 포함)"""
+    rng = np.random.default_rng(seed)
+    scale = np.where(np.arange(n_days) % 80 < 40, 0.01, 0.05)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, scale)))
+    close[230:245] = close[229]  # 거래 정지: stochK 등이 결측이 되는 구간
+    high = close * (1 + rng.uniform(0, 0.03, n_days))
+    low = close * (1 - rng.uniform(0, 0.03, n_days))
+    return pd.DataFrame(
+        {
+            "reg_date": [date(2024, 1, 1) + timedelta(days=i) for i in range(n_days)],
+            "market": market,
+            "symbol": market.split("-")[-1],
+            "open": close,
+            "close": close,
+            "high": high,
+            "low": low,
+            "volume": rng.lognormal(10, 1, n_days),
+        }
+    )
+
+
+def baseline_regime(data: pd.DataFrame) -> pd.Series:
+    """기존 FeatureStoreByCrypto.set_markov_regime_switching (피처가 모두 있는 행만 적합)"""
+    df = data.copy()
+    df["returns"] = df["close"] / df["close"].shift(1)
+    df = df.dropna()
+    df["returns"] = StandardScaler().fit_transform(df[["returns"]])
+    model = MarkovRegression(df["returns"], k_regimes=2, switching_variance=True).fit()
+    result = pd.DataFrame(
+        model.smoothed_marginal_probabilities[0].rename("regime_prob")
+    )
+    cutoff = result["regime_prob"].mean()
+    result["regime"] = np.where(result["regime_prob"] >= cutoff, 0, 1)
+    return data.merge(
+        result[["regime"]], left_index=True, right_index=True, how="left"
+    )["regime"]
+
+
+def test_crypto_regime_matches_baseline():
+    store = FeatureStoreByCrypto(make_candles("KRW-AAA"), "reg_date")
+    store.set_momentum_oscillators()
+    store.set_SMA_indicators()
+    store.set_volume_indicators()
+    store.set_bollinger_based()
+    expected = baseline_regime(store.data)
+
+    store.set_markov_regime_switching()
+
+    # warm-up과 거래 정지 구간은 적합 표본에서 빠지고 regime도 결측이다.
+    assert expected.isna().sum() > 200
+    pd.testing.assert_series_equal(store.data["regime"], expected)
+
+
+def test_panel_regime_matches_crypto():
+    data = pd.concat(
+        [
+            make_candles("KRW-AAA"),
+            make_candles("KRW-BBB", n_days=260, seed=1),
+            make_candles("KRW-CCC", n_days=300, seed=2),
+        ]
+    )
+    expected = {}
+    for market, group in data.groupby("market"):
+        store = FeatureStoreByCrypto(group, "reg_date")
+        store.set_features()
+        expected[market] = store.data["regime"].to_numpy(dtype=float)
+
+    cache = MarkovRegimeCache()
+    # 적합(EM) 경로, 캐시된 파라미터 경로, regime만 요청한 경우 모두 같은 표본을 쓴다.
+    for features in (None, None, ["RSI", "regime"]):
+        panel = FeatureStoreByPanel(data, "reg_date")
+        panel.set_features(markov_cache=cache, max_workers=1, features=features)
+        for market, values in expected.items():
+            got = panel.data.loc[panel.data["market"] == market, "regime"]
+            np.testing.assert_array_equal(got.to_numpy(dtype=float), values)
+
+
+def assert_same_features(got: pd.DataFrame, expected: pd.DataFrame):
+    """결측 위치가 같고, 값은 rolling 누적합의 부동소수 오차 범위에서 같다."""
+    assert list(got.columns) == list(expected.columns)
+    got, expected = got.to_numpy(dtype=float), expected.to_numpy(dtype=float)
+    np.testing.assert_array_equal(np.isnan(got), np.isnan(expected))
+    np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_panel_features_match_crypto():
+    """regime을 뺀 DEFAULT_FEATURES가 market별 FeatureStoreByCrypto 결과와 같다."""
+    gapped = make_candles("KRW-DDD", n_days=240, seed=3)
+    gapped = gapped.drop(index=range(100, 112))  # 거래 정지: 캔들(행) 자체가 없는 구간
+    data = pd.concat(
+        [
+            make_candles("KRW-AAA"),
+            make_candles("KRW-BBB", n_days=260, seed=1),
+            make_candles("KRW-CCC", n_days=300, seed=2),
+            gapped,
+            # 늦게 상장해 SMA_200보다 짧은 이력
+            make_candles("KRW-EEE", seed=4).iloc[130:],
+        ]
+    )
+    features = [x for x in DEFAULT_FEATURES if x != "regime"]
+    panel = FeatureStoreByPanel(data, "reg_date")
+    panel.set_features(features=features)
+
+    for market, group in data.groupby("market"):
+        store = FeatureStoreByCrypto(group, "reg_date")
+        store.set_momentum_oscillators()
+        store.set_SMA_indicators()
+        store.set_volume_indicators()
+        store.set_bollinger_based()
+        got = panel.data.loc[panel.data["market"] == market, features]
+        assert got.index.equals(store.data.index)
+        assert_same_features(got, store.data[features])
+
+
+def test_incremental_matches_full_recompute():
+    data = pd.concat(
+        [
+            make_candles("KRW-AAA"),
+            make_candles("KRW-BBB", n_days=260, seed=1),
+            make_candles("KRW-CCC", n_days=300, seed=2),
+        ]
+    )
+    last = data["reg_date"].max()
+    # SMA_200보다 lookback이 짧은 피처도 앞 구간이 전체 계산과 같게 채워져야 한다.
+    for features in (
+        [x for x in DEFAULT_FEATURES if x != "regime"],
+        ["RSI", "SMA_3", "SMA_200"],
+    ):
+        store = IncrementalFeatureStore()
+        # 어제까지 → 하루 추가 → 구간이 하루 밀림(가장 오래된 날 제외)
+        for days in (data[data["reg_date"] < last], data, data.iloc[1:]):
+            panel = FeatureStoreByPanel(days, "reg_date")
+            panel.set_features(features=features, feature_cache=store)
+            expected = FeatureStoreByPanel(days, "reg_date")
+            expected.set_features(features=features)
+            assert_same_features(panel.data[features], expected.data[features])
+
+
+def test_rolling_mean_abs_deviation_matches_pandas():
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 5, 300)
+    values[[10, 150, 151]] = np.nan
+    panel = np.column_stack([values, rng.lognormal(3, 1, 300), np.full(300, 7.0)])
+
+    for window in (1, 3, 20, 299, 300, 301, 500):
+        for col in range(panel.shape[1]):
+            expected = (
+                pd.Series(panel[:, col])
+                .rolling(window)
+                .apply(lambda x: np.abs(x - x.mean()).mean(), raw=True)
+                .to_numpy()
+            )
+            np.testing.assert_allclose(
+                rolling_mean_abs_deviation(panel[:, col], window),
+                expected,
+                rtol=1e-12,
+                atol=1e-12,
+            )
+            # (date × market) 배열 전체와 작은 chunk로 나눈 계산도 같다.
+            np.testing.assert_allclose(
+                rolling_mean_abs_deviation(panel, window, chunk_size=7)[:, col],
+                expected,
+                rtol=1e-12,
+                atol=1e-12,
+            )
+
+
+def test_rolling_moments_match_pandas_on_long_high_level_series():
+    """1e8 수준 가격의 긴 시계열(NaN 구간 포함)에서도 rolling 평균/표준편차가 정확하다."""
+    rng = np.random.default_rng(0)
+    n_rows = 5000
+    price = 1e8 * np.exp(np.cumsum(rng.normal(0, 0.002, n_rows)))
+    price[1000:1030] = np.nan  # 결측 구간
+    price[3000] = np.nan
+    price[4000:4050] = price[3999]  # 가격이 고정된 구간 (표준편차 0)
+    volume = rng.lognormal(10, 1, n_rows)
+    volume[:300] = np.nan  # 늦게 들어온 market
+    panel = np.column_stack([price, volume])
+
+    mean_windows, std_windows = (3, 20, 200), (2, 20, 200)
+    result = rolling_moments(panel, mean_windows=mean_windows, std_windows=std_windows)
+
+    for col in range(panel.shape[1]):
+        series = pd.Series(panel[:, col])
+        expected = [series.rolling(w).mean() for w in mean_windows]
+        expected += [series.rolling(w).std(ddof=1) for w in std_windows]
+        scale = np.nanmax(np.abs(panel[:, col]))
+        for got, want in zip(result[:, :, col], expected):
+            want = want.to_numpy()
+            np.testing.assert_array_equal(np.isnan(got), np.isnan(want))
+            # pandas의 rolling std도 온라인 갱신이라 1e8 수준에서 값 수준의 ~1e-10만큼 오차가 있다.
+            np.testing.assert_allclose(got, want, rtol=1e-9, atol=scale * 1e-9)
+        # 표준편차는 window별 두 번 훑은 정확한 값과 값 수준의 1e-15 안에서 같다.
+        for got, window in zip(result[len(mean_windows) :, :, col], std_windows):
+            want = np.full(n_rows, np.nan)
+            want[window - 1 :] = sliding_window_view(panel[:, col], window).std(
+                ddof=1, axis=-1
+            )
+            np.testing.assert_allclose(got, want, rtol=1e-9, atol=scale * 1e-15)
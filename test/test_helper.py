@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+# root logger에 handler를 먼저 단 뒤 import해도 profile 로그가 JSON 한 줄로 남아야 한다.
+SCRIPT = """
+import logging
+import sys
+
+logging.basicConfig(stream=sys.stdout, format="ROOT %(message)s")
+logging.getLogger("src").addHandler(logging.StreamHandler(sys.stdout))
+
+from src.config.helper import log_method_call
+
+
+@log_method_call
+def work(x):
+    return x + 1
+
+
+work(1)
+"""
+
+
+def test_profile_log_is_emitted_when_ancestors_have_handlers():
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=project_root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    records = [json.loads(x) for x in result.stderr.splitlines() if x.startswith("{")]
+    assert [x["method"] for x in records] == ["work"]
+    assert records[0]["logger"] == "src.profile" and records[0]["status"] == "ok"
+    # 전파하지 않으므로 상위 handler에는 중복 출력되지 않는다.
+    assert "method_call" not in result.stdout
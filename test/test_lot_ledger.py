@@ -0,0 +1,122 @@
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+from src.lot_ledger import LotLedger  # noqa: E402
+
+MARKETS = ["KRW-AAA", "KRW-BBB", "KRW-CCC"]
+START = datetime(2025, 1, 1, 9)
+
+
+def make_trade_log(n_trades: int = 300, seed: int = 0) -> pd.DataFrame:
+    """uuid가 유일하고 created_at 순으로 정렬된 매수/매도 내역"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(n_trades):
+        created_at = START + timedelta(hours=int(rng.integers(0, 24 * 90)))
+        rows += [
+            {
+                "uuid": f"uuid-{i}",
+                "type": "buy" if rng.random() < 0.6 else "sell",
+                "market": MARKETS[int(rng.integers(len(MARKETS)))],
+                "executed_volume": float(rng.integers(1, 100)),
+                "created_at": created_at,
+                "update_dt": created_at + timedelta(minutes=5),
+            }
+        ]
+    trade_log = pd.DataFrame(rows)
+    return trade_log.sort_values("created_at", kind="stable").reset_index(drop=True)
+
+
+def replay_baseline(trade_log: pd.DataFrame, cutoff_date: datetime) -> dict:
+    """기존 sell_expired_crypto의 전체 이력 FIFO 재계산 (만료 수량을 market별 dict로)"""
+    holdings = defaultdict(dict)
+    for _, row in trade_log.iterrows():
+        market = row["market"]
+        created_at = row["created_at"]
+        volume = row["executed_volume"]
+
+        if row["type"] == "buy":
+            holdings[market][created_at] = holdings[market].get(created_at, 0) + volume
+
+        elif row["type"] == "sell":
+            remaining = volume
+            for buy_time in sorted(holdings[market].keys()):
+                if buy_time >= created_at:
+                    continue
+
+                available = holdings[market][buy_time]
+                deduct = min(remaining, available)
+                holdings[market][buy_time] -= deduct
+                remaining -= deduct
+
+                if holdings[market][buy_time] == 0:
+                    del holdings[market][buy_time]
+
+                if remaining <= 0:
+                    break
+
+            if len(holdings[market]) == 0:
+                del holdings[market]
+
+    expired = defaultdict(float)
+    for market, buys in holdings.items():
+        for created_at, volume in buys.items():
+            if created_at < cutoff_date:
+                expired[market] += volume
+    return dict(expired)
+
+
+def to_dict(expired: pd.DataFrame) -> dict:
+    if expired.empty:
+        return {}
+    return dict(zip(expired["market"], expired["volume"]))
+
+
+def test_ledger_matches_baseline_with_duplicates_and_shuffled_rows():
+    trade_log = make_trade_log()
+    cutoff_date = START + timedelta(days=50)
+    expected = replay_baseline(trade_log, cutoff_date)
+    assert expected
+
+    # 같은 uuid가 다시 적재되고(at-least-once) 적재 순서도 섞인 경우
+    duplicated = pd.concat([trade_log, trade_log.sample(frac=0.3, random_state=1)])
+    duplicated = duplicated.sample(frac=1.0, random_state=2)
+
+    ledger = LotLedger()
+    assert ledger.update(duplicated) == len(trade_log)
+    assert to_dict(ledger.get_expired(cutoff_date)) == expected
+
+
+def test_incremental_update_skips_duplicates_across_batches():
+    trade_log = make_trade_log()
+    cutoff_date = START + timedelta(days=50)
+    expected = replay_baseline(trade_log, cutoff_date)
+
+    first, second = trade_log.iloc[:150], trade_log.iloc[150:]
+    # 두 번째 배치: 앞 배치의 재전송 행과 배치 안 중복을 섞는다.
+    second = pd.concat([first.tail(20), second, second.head(10)]).sample(
+        frac=1.0, random_state=3
+    )
+
+    ledger = LotLedger()
+    assert ledger.update(first) == len(first)
+    assert ledger.update(second) == len(trade_log) - len(first)
+    assert to_dict(ledger.get_expired(cutoff_date)) == expected
+
+
+def test_late_trade_requests_rebuild():
+    trade_log = make_trade_log()
+    ledger = LotLedger()
+    ledger.update(trade_log.iloc[100:])
+    late = trade_log.iloc[:1]
+    assert ledger.update(late) is None
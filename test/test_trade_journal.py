@@ -0,0 +1,105 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# 현재 파일의 절대 경로를 기준으로 루트 디렉토리로 이동
+current_dir = Path(__file__).resolve()  # 현재 파일의 절대 경로
+project_root = current_dir.parent.parent  # 두 단계 위의 디렉토리(프로젝트 루트)
+sys.path.append(str(project_root))
+
+from src import trade_journal  # noqa: E402
+from src.connection.bigquery import StreamInsertRowError  # noqa: E402
+from src.trade_journal import TradeJournal  # noqa: E402
+
+
+class FakeBigQueryConn:
+    """trade_history stand-in. reject에 든 uuid 행은 거부하고, 함께 보낸 나머지 행은 stopped로 적재하지 않는다."""
+
+    def __init__(self) -> None:
+        self.rows = []
+        self.reject = set()
+        self.n_transport_errors = 0
+        self.calls = 0
+
+    def insert_using_stream(self, df, table_id, data_set) -> bool:
+        self.calls += 1
+        if self.n_transport_errors > 0:
+            self.n_transport_errors -= 1
+            raise ConnectionError("stream insert transport error")
+        rejected = [i for i, x in enumerate(df["uuid"]) if x in self.reject]
+        if rejected:
+            raise StreamInsertRowError(rejected, [{"reason": "invalid"}])
+        self.rows += df["uuid"].to_list()
+        return True
+
+
+def read_spool(path) -> list:
+    with open(path) as f:
+        return [json.loads(x) for x in f]
+
+
+@pytest.fixture
+def bq(monkeypatch):
+    conn = FakeBigQueryConn()
+    monkeypatch.setattr(trade_journal, "get_bq_conn", lambda: conn)
+    return conn
+
+
+def make_journal(tmp_path, fetch_order, **kwargs) -> TradeJournal:
+    options = dict(
+        spool_path=str(tmp_path / "trade_journal.jsonl"),
+        batch_size=10,
+        flush_interval=0.05,
+        poll_interval=0.01,
+        settle_timeout=0.3,
+    )
+    return TradeJournal(fetch_order=fetch_order, **{**options, **kwargs})
+
+
+def test_rejected_row_does_not_block_later_orders(tmp_path, bq):
+    bq.reject = {"bad"}
+    journal = make_journal(tmp_path, lambda x: {"uuid": x, "state": "done"})
+    for uuid in ("a", "bad", "b"):
+        journal.submit(uuid=uuid, type="buy", market="KRW-AAA")
+    assert journal.flush(timeout=5)
+
+    journal.submit(uuid="c", type="sell", market="KRW-AAA")
+    assert journal.flush(timeout=5)
+    journal.close()
+
+    assert sorted(bq.rows) == ["a", "b", "c"]
+    failed = [x for x in read_spool(journal.spool_path) if x["event"] == "failed"]
+    assert [x["uuid"] for x in failed] == ["bad"]
+    # 다시 시작해도 거부된 주문은 재적재하지 않는다.
+    assert journal.compact_spool() == []
+    assert [x["event"] for x in read_spool(journal.spool_path)] == ["failed"]
+
+
+def test_failing_lookup_settles_after_timeout(tmp_path, bq):
+    def fetch_order(uuid: str) -> dict:
+        raise ConnectionError("404 order not found")
+
+    journal = make_journal(tmp_path, fetch_order)
+    journal.submit(uuid="lost", type="buy", market="KRW-AAA")
+    strt_time = time.time()
+    assert journal.flush(timeout=5)
+    assert time.time() - strt_time < 2
+    journal.close()
+
+    assert bq.rows == []
+    failed = read_spool(journal.spool_path)[-1]
+    assert failed["event"] == "failed" and failed["uuid"] == "lost"
+    assert "404" in failed["reason"]
+
+
+def test_transport_error_retries_with_backoff(tmp_path, bq):
+    bq.n_transport_errors = 2
+    journal = make_journal(tmp_path, lambda x: {"uuid": x, "state": "done"})
+    journal.submit(uuid="a", type="buy", market="KRW-AAA")
+    assert journal.flush(timeout=5)
+    journal.close()
+    assert bq.rows == ["a"]
+    assert bq.calls == 3
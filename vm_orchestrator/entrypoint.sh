@@ -4,7 +4,7 @@
 # ------------------------------------------------
 # - 예약된 고정 IP를 항상 붙여서 유지 (화이트리스트용)
 # - 필요 시 Compute Engine VM 인스턴스를 시작/중지
-# - API 헬스 체크 후 /run 엔드포인트 호출
+# - API 헬스 체크 후 run job 제출(POST /jobs/run), 끝날 때까지 상태 polling
 # - IP를 "in-use" 상태로 유지하여 요금을 낮춤
 # ================================================================
 set -euo pipefail
@@ -16,7 +16,8 @@ ZONE="${ZONE:-asia-northeast3-a}"
 INSTANCE="${INSTANCE:-crypto-fluxor-vm}"              # 예: crypto-fluxor-vm
 STATIC_NAME="${STATIC_NAME:-crypto-fluxor-ip}"        # 예: crypto-fluxor-ip
 ACC_NAME="${ACC_NAME:-External NAT}"  # 기본 Access Config 이름
-TIMEOUT="${TIMEOUT:-1800}"            # VM 종료 대기 시간 (초 단위, 기본 30분)
+TIMEOUT="${TIMEOUT:-1800}"            # job 완료 대기 시간 (초 단위, 기본 30분)
+POLL_INTERVAL="${POLL_INTERVAL:-15}"  # job 상태 조회 간격 (초)
 ROOT_DIR="${ROOT_DIR:-/opt}"
 PORT="${PORT:-8000}"                  # FastAPI 포트
 echo "[job] start orchestration"
@@ -130,6 +131,32 @@ wait_for_health(){
   done
 }
 
+# job 상태 polling: succeeded/failed가 되면 단계별 소요 시간과 결과를 남기고 종료
+# 실패/타임아웃이면 1 반환
+wait_for_job(){
+  # 사용법: wait_for_job JOB_URL MAX_WAIT_SEC
+  local url="$1"; local deadline=$((SECONDS + ${2:-1800}))
+  local body status stage
+  log "job 완료 대기: $url (타임아웃 ${2:-1800}초)"
+  while :; do
+    body=$(curl -s "$url" --max-time 10 || true)
+    status=$(echo "$body" | jq -r '.status // empty' 2>/dev/null || true)
+    stage=$(echo "$body" | jq -r '.current_stage // "-"' 2>/dev/null || true)
+    if [[ "$status" == "succeeded" || "$status" == "failed" ]]; then
+      log "job $status ($(echo "$body" | jq -r '.elapsed_sec')초)"
+      echo "$body" | jq -r '.stages[] | "  - \(.stage): \(.status) \(.elapsed_sec)s"' || true
+      echo "[job] 결과: $(echo "$body" | jq -c '{result, error}')"
+      [[ "$status" == "succeeded" ]] && return 0 || return 1
+    fi
+    if [[ $SECONDS -ge $deadline ]]; then
+      echo "[err] job 대기 타임아웃 (마지막 상태=${status:-unknown}, 단계=$stage)" >&2
+      return 1
+    fi
+    log "job 진행 중... status=${status:-unknown}, stage=$stage"
+    sleep "$POLL_INTERVAL"
+  done
+}
+
 # 종료 시 실행되는 cleanup 핸들러
 # 스크립트가 시작한 VM만 중지시킴
 cleanup(){
@@ -148,7 +175,7 @@ trap cleanup EXIT ERR INT
 # 4) 인스턴스가 꺼져있으면 시작
 # 5) RUNNING 상태 될 때까지 대기
 # 6) API 헬스 체크
-# 7) /run 엔드포인트 호출
+# 7) run job 제출 후 succeeded/failed가 될 때까지 대기
 # 8) 인스턴스 중지 (IP는 계속 붙여둠)
 ensure_static_ip
 ensure_access_config
@@ -175,18 +202,19 @@ API_BASE_URL="http://$STATIC_IP:$PORT"
 HEALTHCHECK_URL="$API_BASE_URL/"
 wait_for_health "$HEALTHCHECK_URL" 600
 
-# /run 엔드포인트 호출
-RUN_URL="$API_BASE_URL/run"
-echo "[job] API URL: $RUN_URL"
+# run job 제출 (이미 실행 중인 run job이 있으면 그 job이 반환됨)
+SUBMIT_URL="$API_BASE_URL/jobs/run"
+echo "[job] API URL: $SUBMIT_URL"
 
-response=$(curl -s -X GET "$RUN_URL" \
-  -H "Content-Type: application/json" \
-  --max-time 30 || echo "curl_failed")
+response=$(curl -s -X POST "$SUBMIT_URL" --max-time 30 || echo "curl_failed")
+JOB_ID=$(echo "$response" | jq -r '.job_id // empty' 2>/dev/null || true)
 
-if [ "$response" = "curl_failed" ]; then
-  echo "[err] API 호출 실패"
+if [[ "$response" == "curl_failed" || -z "$JOB_ID" ]]; then
+  echo "[err] job 제출 실패: $response"
 else
-  echo "[job] API 응답: $response"
+  echo "[job] job 제출: $JOB_ID (created=$(echo "$response" | jq -r '.created'))"
+  # job이 끝날 때까지 대기 → 실행 도중에 VM을 내리지 않도록
+  wait_for_job "$API_BASE_URL/jobs/$JOB_ID" "$TIMEOUT" || true
 fi
 
 log "인스턴스 중지..."